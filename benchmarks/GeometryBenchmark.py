@@ -0,0 +1,55 @@
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pywalkgen.raycast import Point, LineSegment, Ray, Particle  # noqa: E402
+
+# number of timed calls per measurement
+NUMBER = 100000
+
+# number of segments the particle looks at
+NUMBER_OF_SEGMENTS = 20
+
+
+def report(name, seconds, number):
+    print(f"{name:<40}{number / seconds:>15,.0f} ops/s")
+
+
+def construction_benchmark():
+    point1 = Point(x=1.0, y=2.0)
+    point2 = Point(x=3.0, y=4.0)
+    report("Point()", timeit.timeit(lambda: Point(x=1.0, y=2.0), number=NUMBER), NUMBER)
+    report("LineSegment()",
+           timeit.timeit(lambda: LineSegment(point1=point1, point2=point2, description="wall"), number=NUMBER),
+           NUMBER)
+    report("Ray()", timeit.timeit(lambda: Ray(origin=point1, angle=45), number=NUMBER), NUMBER)
+
+
+def intersection_benchmark():
+    ray = Ray(origin=Point(x=0.0, y=0.0), angle=45)
+    hit = LineSegment(point1=Point(x=10.0, y=0.0), point2=Point(x=0.0, y=10.0))
+    miss = LineSegment(point1=Point(x=-10.0, y=0.0), point2=Point(x=-10.0, y=10.0))
+    report("Ray.cast() hit", timeit.timeit(lambda: ray.cast(hit), number=NUMBER), NUMBER)
+    report("Ray.cast() miss", timeit.timeit(lambda: ray.cast(miss), number=NUMBER), NUMBER)
+    report("Ray.intersect() hit", timeit.timeit(lambda: ray.intersect(hit), number=NUMBER), NUMBER)
+    report("Ray.intersect() miss", timeit.timeit(lambda: ray.intersect(miss), number=NUMBER), NUMBER)
+
+
+def look_benchmark(number=20):
+    random.seed(0)
+    segments = [LineSegment(point1=Point(x=random.uniform(0, 100), y=random.uniform(0, 100)),
+                            point2=Point(x=random.uniform(0, 100), y=random.uniform(0, 100)))
+                for _ in range(NUMBER_OF_SEGMENTS)]
+    particle = Particle(particle_id=1, x=50, y=50)
+    seconds = timeit.timeit(lambda: particle.look(segments=segments), number=number)
+    report(f"Particle.look() {NUMBER_OF_SEGMENTS} segments", seconds, number)
+    report("  ray-segment tests", seconds, number * len(particle.rays) * NUMBER_OF_SEGMENTS)
+
+
+if __name__ == "__main__":
+    construction_benchmark()
+    intersection_benchmark()
+    look_benchmark()
@@ -0,0 +1,385 @@
+"""Benchmarks of the hot paths of the walk generator on synthetic maps. No broker is needed.
+
+    python benchmarks/WalkgenBenchmark.py [--benchmarks ray_cast ranging ...] [--segments 16 128] [--rays 36 360]
+                                          [--walkers 1 16] [--areas 4 100] [--engines vectorized grid] [--format csv]
+
+One record per measurement is printed to stdout, as a JSON object per line (default) or as CSV. A record holds the
+benchmark, its sweep parameters, the number of operations per call (e.g. ray-segment tests) and the best and mean
+time per call over the repeats.
+"""
+import os
+import sys
+import copy
+import json
+import math
+import random
+import asyncio
+import logging
+import argparse
+import timeit
+
+import yaml
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pywalkgen.raycast import Point, Ray, Particle, get_static_map, clear_static_maps  # noqa: E402
+from pywalkgen.walkgen import (WalkPatternGenerator, WalkFleet, DataAggregator, AreaIndex, ViewEncoder,  # noqa: E402
+                                clear_area_indexes)
+from pywalkgen.walkgen.WalkGenerator import PARTICLE_ENGINES  # noqa: E402
+from pywalkgen.walk_model import WalkAngleGenerator  # noqa: E402
+from pywalkgen.imu import IMU  # noqa: E402
+from pywalkgen.outliergen import OutlierGenerator  # noqa: E402
+from pywalkgen.pub_sub.Codec import CODECS, get_codec  # noqa: E402
+from pywalkgen.random_stream import RandomStream, seed_sequence  # noqa: E402
+from pywalkgen.cli import group_walkers_by_map, batch_ranging  # noqa: E402
+
+# edge length of the square synthetic map
+MAP_SIZE = 200.0
+
+# the synthetic maps, walkers and random streams are seeded, every run measures the same work
+SEED = 0
+
+# time step of the simulated walkers in seconds
+TDELTA = 0.1
+
+RECORD_FIELDS = ('benchmark', 'engine', 'codec', 'encoding', 'segments', 'rays', 'walkers', 'areas',
+                 'operations', 'number', 'repeat', 'best', 'mean', 'best_per_operation')
+
+VIEW_ENCODINGS = ('full', 'packed', 'none')
+
+
+def read_config(yaml_file, rootkey):
+    """Parse the given Configuration File"""
+    if os.path.exists(yaml_file):
+        with open(yaml_file, 'r') as config_file:
+            yaml_as_dict = yaml.load(config_file, Loader=yaml.FullLoader)
+        return yaml_as_dict[rootkey]
+    else:
+        raise FileNotFoundError
+
+
+def synthetic_map(segments, areas=4):
+    """
+    map configuration with the four boundary walls of a square map and segments - 4 random walls inside it. The
+    areas of the data aggregators divide the map into a grid of about the given number of cells.
+    :param segments: number of obstacle segments, at least 4
+    :param areas: number of areas
+    :return: map configuration, see the maps of config.yaml
+    """
+    rng = random.Random(SEED)
+    corners = [[0.0, 0.0], [MAP_SIZE, 0.0], [MAP_SIZE, MAP_SIZE], [0.0, MAP_SIZE]]
+    walls = [[corners[index], corners[(index + 1) % 4]] for index in range(4)]
+    for _ in range(max(0, segments - 4)):
+        x = rng.uniform(10, MAP_SIZE - 10)
+        y = rng.uniform(10, MAP_SIZE - 10)
+        angle = rng.uniform(0, 2 * math.pi)
+        length = rng.uniform(2, 10)
+        walls.append([[x, y], [x + (length * math.cos(angle)), y + (length * math.sin(angle))]])
+    obstacles = [{"id": str(index + 1),
+                  "description": f"wall-{index + 1}",
+                  "render": {"type": "static", "color": [0, 0, 0], "shape": "line"},
+                  "points": wall} for index, wall in enumerate(walls)]
+
+    side = max(1, round(math.sqrt(areas)))
+    size = MAP_SIZE / side
+    area_division = [{"id": (row * side) + column + 1,
+                      "boundary": {"coordinates": [[column * size, row * size], [(column + 1) * size, row * size],
+                                                   [(column + 1) * size, (row + 1) * size],
+                                                   [column * size, (row + 1) * size]]}}
+                     for row in range(side) for column in range(side)]
+    return {"id": f"synthetic-{segments}-{areas}",
+            "obstacles": obstacles,
+            "robots": [],
+            "area_division": area_division}
+
+
+def synthetic_walkers(template, eventloop, walkers, segments, rays, engine, areas=4):
+    """
+    walkers at random positions of a synthetic map, without publishers and subscribers
+    :param template: personnel configuration the walkers are derived from, see config.yaml
+    :param eventloop: event loop
+    :param walkers: number of walkers
+    :param segments: number of obstacle segments of the map
+    :param rays: number of rays of every walker
+    :param engine: ray casting engine
+    :param areas: number of areas of the map
+    :return: list of WalkPatternGenerator
+    """
+    rng = random.Random(SEED)
+    map_config = synthetic_map(segments=segments, areas=areas)
+    result = []
+    for index in range(walkers):
+        config = copy.deepcopy(template)
+        config["id"] = str(index + 1)
+        config["map"] = map_config
+        config["start_coordinates"] = {"x": rng.uniform(20, MAP_SIZE - 20), "y": rng.uniform(20, MAP_SIZE - 20),
+                                       "z": 0}
+        config["attribute"]["collision"] = dict(config["attribute"]["collision"], engine=engine, rays=rays)
+        config["attribute"]["collision"].pop("sensing", None)
+        config["protocol"] = {"publishers": None, "subscribers": None}
+        walker = WalkPatternGenerator(eventloop=eventloop, config_file=config, seed=SEED)
+        walker.clock_ns = lambda: 0
+        result.append(walker)
+    return result
+
+
+def synthetic_scene(segments):
+    """shared static map of a synthetic map"""
+    return get_static_map(config_file=synthetic_map(segments=segments))
+
+
+def stream(*names):
+    """seeded random stream"""
+    return RandomStream(seed_sequence=seed_sequence(SEED, *names))
+
+
+# ========================================= BENCHMARKS ===============================================================
+# every benchmark yields (parameters, function, operations): the function is timed, operations is the number of
+# operations, e.g. ray-segment tests, done by one call
+
+def ray_cast_benchmark(args, template):
+    for segments in args.segments:
+        scene = synthetic_scene(segments=segments)
+        segment_list = scene.get_segments()
+        ray = Ray(origin=Point(x=MAP_SIZE / 2, y=MAP_SIZE / 2), angle=45)
+
+        def cast_all(ray=ray, segment_list=segment_list):
+            for segment in segment_list:
+                ray.cast(segment)
+        yield {'segments': len(segment_list)}, cast_all, len(segment_list)
+
+
+def particle_look_benchmark(args, template):
+    for segments in args.segments:
+        segment_list = synthetic_scene(segments=segments).get_segments()
+        for rays in args.rays:
+            particle = Particle(particle_id=1, x=MAP_SIZE / 2, y=MAP_SIZE / 2, num_of_rays=rays)
+            yield {'segments': len(segment_list), 'rays': rays}, \
+                (lambda particle=particle, segment_list=segment_list: particle.look(segments=segment_list)), \
+                rays * len(segment_list)
+
+
+def ranging_benchmark(args, template):
+    for engine in args.engines:
+        for segments in args.segments:
+            for rays in args.rays:
+                walker = synthetic_walkers(template=template, eventloop=args.eventloop, walkers=1,
+                                           segments=segments, rays=rays, engine=engine)[0]
+                collision = walker.collision
+                yield {'engine': engine, 'segments': segments, 'rays': rays}, \
+                    (lambda collision=collision: collision.ranging(heading=0)), rays * segments
+
+
+def walk_angle_benchmark(args, template):
+    walk = template["attribute"]["walk"]
+    generator = WalkAngleGenerator(mid_point=walk["sigmoid_attributes"]["mid_point"],
+                                   steepness=walk["sigmoid_attributes"]["steepness"],
+                                   max_value=math.radians(walk["sigmoid_attributes"]["min_angle"]),
+                                   level_shift=math.radians(walk["sigmoid_attributes"]["max_angle"]),
+                                   walk_direction_factor=walk["direction_factor"],
+                                   walk_angle_deviation_factor=walk["angle_deviation_factor"],
+                                   random_stream=stream("walk_angle"))
+    for segments in args.segments:
+        for rays in args.rays:
+            walker = synthetic_walkers(template=template, eventloop=args.eventloop, walkers=1, segments=segments,
+                                       rays=rays, engine=args.engines[0])[0]
+            ranging, _ = walker.collision.ranging(heading=0)
+            yield {'segments': segments, 'rays': rays}, \
+                (lambda ranging=ranging: generator.get_walk_angle(angle=0, ranging=ranging, velocity=1.0)), 1
+
+
+def imu_update_benchmark(args, template):
+    imu = IMU(config_file=template, random_streams={axis: stream("imu", axis) for axis in ('x', 'y', 'z')})
+    position = {'x_ref_pos': template["start_coordinates"]["x"] + 1.0,
+                'y_ref_pos': template["start_coordinates"]["y"] + 1.0,
+                'z_ref_pos': 0.0}
+    out = dict()
+    yield {}, lambda: imu.update(cur_position=position, tdelta=TDELTA, out=out), 1
+
+
+def imu_update_batch_benchmark(args, template, samples=1024):
+    imu = IMU(config_file=template, random_streams={axis: stream("imu", axis) for axis in ('x', 'y', 'z')})
+    rng = np.random.default_rng(SEED)
+    positions = np.cumsum(rng.normal(size=(samples, 3)), axis=0)
+    yield {}, lambda: imu.update_batch(positions=positions, tdelta=TDELTA), samples
+
+
+def outlier_generate_benchmark(args, template):
+    outliers = template["attribute"]["motion"]["acceleration"]["outliers"]["x"]
+    generator = OutlierGenerator(mean=outliers["mean"],
+                                 standard_deviation=outliers["standard_deviation"],
+                                 number_of_outliers=outliers["number_of_outlier"],
+                                 sample_size=outliers["sample_size"],
+                                 random_stream=stream("outliers"))
+    yield {}, generator.generate, 1
+
+
+def area_locate_benchmark(args, template, points=1000):
+    rng = random.Random(SEED)
+    positions = [[rng.uniform(0, MAP_SIZE), rng.uniform(0, MAP_SIZE)] for _ in range(points)]
+    for areas in args.areas:
+        data_aggregators = [DataAggregator(area_config=area)
+                            for area in synthetic_map(segments=4, areas=areas)["area_division"]]
+        area_index = AreaIndex(data_aggregators=data_aggregators)
+
+        def locate_linear(data_aggregators=data_aggregators):
+            for position in positions:
+                for data_aggregator in data_aggregators:
+                    if data_aggregator.locate(point=position):
+                        break
+
+        def locate_indexed(area_index=area_index):
+            area = None
+            for position in positions:
+                area = area_index.locate(x=position[0], y=position[1], previous=area)
+        yield {'engine': 'linear', 'areas': len(data_aggregators)}, locate_linear, points
+        yield {'engine': 'index', 'areas': len(data_aggregators)}, locate_indexed, points
+
+
+def update3d_benchmark(args, template):
+    for engine in args.engines:
+        for segments in args.segments:
+            for rays in args.rays:
+                for walkers in args.walkers:
+                    fleet = synthetic_walkers(template=template, eventloop=args.eventloop, walkers=walkers,
+                                              segments=segments, rays=rays, engine=engine)
+                    walker_groups = group_walkers_by_map(fleet)
+
+                    async def tick(fleet=fleet, walker_groups=walker_groups):
+                        views = batch_ranging(walker_groups)
+                        for walker in fleet:
+                            await walker._update3d(tdelta=TDELTA, views=views.get(walker))
+                    yield {'engine': engine, 'segments': segments, 'rays': rays, 'walkers': walkers}, \
+                        (lambda tick=tick: args.eventloop.run_until_complete(tick())), walkers
+
+
+def fleet_step_benchmark(args, template):
+    for engine in args.engines:
+        for segments in args.segments:
+            for rays in args.rays:
+                for walkers in args.walkers:
+                    fleet = WalkFleet(walkers=synthetic_walkers(template=template, eventloop=args.eventloop,
+                                                                walkers=walkers, segments=segments, rays=rays,
+                                                                engine=engine))
+                    outbox = []
+                    outboxes = {walker: outbox for walker in fleet.walkers}
+
+                    async def tick(fleet=fleet, outbox=outbox, outboxes=outboxes):
+                        await fleet.step(outboxes=outboxes, tdelta=TDELTA)
+                        outbox.clear()
+                    yield {'engine': engine, 'segments': segments, 'rays': rays, 'walkers': walkers}, \
+                        (lambda tick=tick: args.eventloop.run_until_complete(tick())), walkers
+
+
+def serialization_benchmark(args, template):
+    for rays in args.rays:
+        walker = synthetic_walkers(template=template, eventloop=args.eventloop, walkers=1, segments=args.segments[0],
+                                   rays=rays, engine=args.engines[0])[0]
+        msg, _ = args.eventloop.run_until_complete(walker._update3d(tdelta=TDELTA))
+        for encoding in VIEW_ENCODINGS:
+            encoded = dict(msg)
+            view = ViewEncoder(config={"encoding": encoding}).encode(msg["view"])
+            if view is None:
+                del encoded["view"]
+            else:
+                encoded["view"] = view
+            for codec_name in CODECS:
+                try:
+                    codec = get_codec(codec_name)
+                except ImportError:
+                    # optional codec dependency not installed
+                    continue
+                yield {'codec': codec_name, 'encoding': encoding, 'rays': rays}, \
+                    (lambda codec=codec, encoded=encoded: codec.encode(encoded)), 1
+
+
+BENCHMARKS = {
+    'ray_cast': ray_cast_benchmark,
+    'particle_look': particle_look_benchmark,
+    'ranging': ranging_benchmark,
+    'walk_angle': walk_angle_benchmark,
+    'imu_update': imu_update_benchmark,
+    'imu_update_batch': imu_update_batch_benchmark,
+    'outlier_generate': outlier_generate_benchmark,
+    'area_locate': area_locate_benchmark,
+    'update3d': update3d_benchmark,
+    'fleet_step': fleet_step_benchmark,
+    'serialization': serialization_benchmark
+}
+
+
+def measure(function, repeat, min_time):
+    """
+    time a function
+    :param function: function without arguments
+    :param repeat: number of measurements
+    :param min_time: smallest duration in seconds of one measurement, the function is called as often as needed
+    :return: number of calls per measurement, best and mean time per call in seconds
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        seconds = timer.timeit(number=number)
+        if seconds >= min_time:
+            break
+        number = max(number * 2, math.ceil(number * min_time / max(seconds, 1e-9)))
+    times = [seconds / number] + [timer.timeit(number=number) / number for _ in range(repeat - 1)]
+    return number, min(times), sum(times) / len(times)
+
+
+def run(args):
+    """run the selected benchmarks and print one record per measurement"""
+    template = read_config(yaml_file=args.config, rootkey='walk_generator')["personnels"][0]
+    writer = None
+    if args.format == 'csv':
+        import csv
+        writer = csv.DictWriter(sys.stdout, fieldnames=RECORD_FIELDS)
+        writer.writeheader()
+    for name in args.benchmarks:
+        for parameters, function, operations in BENCHMARKS[name](args, template):
+            number, best, mean = measure(function=function, repeat=args.repeat, min_time=args.min_time)
+            record = dict.fromkeys(RECORD_FIELDS)
+            record.update(parameters)
+            record.update({'benchmark': name, 'operations': operations, 'number': number, 'repeat': args.repeat,
+                           'best': best, 'mean': mean, 'best_per_operation': best / operations})
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                print(json.dumps({key: value for key, value in record.items() if value is not None}))
+            sys.stdout.flush()
+        # the synthetic maps of a benchmark are not used by the next one
+        clear_static_maps()
+        clear_area_indexes()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmarks of the walk generator on synthetic maps')
+    parser.add_argument('--benchmarks', nargs='+', choices=tuple(BENCHMARKS.keys()), default=tuple(BENCHMARKS.keys()),
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--segments', nargs='+', type=int, default=(16, 128),
+                        help='numbers of obstacle segments of the synthetic maps')
+    parser.add_argument('--rays', nargs='+', type=int, default=(36, 360), help='numbers of rays per walker')
+    parser.add_argument('--walkers', nargs='+', type=int, default=(1, 16), help='numbers of walkers per map')
+    parser.add_argument('--areas', nargs='+', type=int, default=(4, 100),
+                        help='numbers of areas of the data aggregators')
+    parser.add_argument('--engines', nargs='+', choices=tuple(PARTICLE_ENGINES.keys()),
+                        default=tuple(PARTICLE_ENGINES.keys()), help='ray casting engines')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='smallest duration in seconds of one measurement')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json',
+                        help='one JSON object per line or CSV with a header')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                                         'config.yaml'),
+                        help='configuration the attributes of the synthetic walkers are taken from')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    # the walkers log every update on debug level
+    logging.disable(logging.INFO)
+    arguments = parse_arguments()
+    arguments.eventloop = asyncio.new_event_loop()
+    asyncio.set_event_loop(arguments.eventloop)
+    run(arguments)
@@ -1,42 +1,230 @@
 import argparse
 import asyncio
 import logging
+import math
 import os
 import sys
+import time
 import signal
 import functools
 import yaml
-from pywalkgen.walkgen import WalkPatternGenerator
+import numpy as np
+from pywalkgen.walkgen import WalkPatternGenerator, TickScheduler, ViewEncoder, WalkFleet, clear_area_indexes
+from pywalkgen.walkgen.WalkFleet import FLEET_WALK_DIMENSIONS
+from pywalkgen.export import DatasetWriter, EXPORT_FORMATS
+from pywalkgen.imu import DeferredIMU
+from pywalkgen.collision_detection import CollisionDetection
+from pywalkgen.raycast import clear_static_maps
+from pywalkgen.pub_sub import close_connection_pools
+from pywalkgen.supervisor import Supervisor, shard_personnels
+from pywalkgen.metrics import get_metrics, enable_metrics, MetricsServer
 
 logging.basicConfig(level=logging.WARNING, format='%(levelname)-8s [%(filename)s:%(lineno)d] %(message)s')
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 handler = logging.FileHandler('/tmp/walkgen.log')
-handler.setLevel(logging.ERROR)
+# the run seed is logged on info level
+handler.setLevel(logging.INFO)
 formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 is_sighup_received = False
+is_stop_received = False
 
 
 def parse_arguments():
     """Arguments to run the script"""
     parser = argparse.ArgumentParser(description='Walk Generator')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'generate'],
+                        help="'run' publishes to the broker in real time (default), "
+                             "'generate' writes a dataset on simulated time without a broker")
     parser.add_argument('--config', '-c', required=True, help='YAML Configuration File for Walk Generator with path')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Number of worker processes sharing the personnels (default: workers key or 1)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Run seed of the random streams of all personnels (default: seed key, random if omitted)')
+    parser.add_argument('--steps', type=int, default=None, help='generate: number of ticks to simulate')
+    parser.add_argument('--duration', type=float, default=None, help='generate: simulated time in seconds')
+    parser.add_argument('--output', '-o', default='walkgen-dataset', help='generate: output directory')
+    parser.add_argument('--format', default='both', choices=['csv', 'npz', 'both'],
+                        help='generate: file format of the streams (default: both)')
+    parser.add_argument('--start-time', type=float, default=0,
+                        help='generate: simulated UNIX time in seconds of the first sample (default: 0)')
     return parser.parse_args()
 
 
 def signal_handler(name):
-    global is_sighup_received
-    is_sighup_received = True
+    global is_sighup_received, is_stop_received
+    if name == 'SIGHUP':
+        is_sighup_received = True
+    else:
+        is_stop_received = True
+
+
+def group_walkers_by_map(walkers):
+    """
+    group walkers walking in the same map with the same rays and range
+    :param walkers: list of walk pattern generators
+    :return: list of walker groups which contain more than one walker
+    """
+    groups = dict()
+    for walker in walkers:
+        # heading-focused sensing casts different rays for every walker and is not batched
+        if walker.collision.sensing is not None:
+            continue
+        particle = walker.collision.particle
+        groups.setdefault((walker.map_id, particle.num_of_rays, particle.max_range), []).append(walker)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def batch_ranging(walker_groups):
+    """
+    range all walkers of each group in one vectorized pass over the shared map
+    :param walker_groups: list of walker groups, see group_walkers_by_map
+    :return: dictionary of views per walker
+    """
+    views = dict()
+    metrics = get_metrics()
+    for group in walker_groups:
+        if metrics is not None:
+            started = time.perf_counter()
+        group_views = CollisionDetection.batch_views(detections=[walker.collision for walker in group])
+        if metrics is not None:
+            metrics.observe('batch_ranging', started)
+        for walker, walker_views in zip(group, group_views):
+            views[walker] = walker_views
+    return views
+
+
+def group_walkers_by_batch(walkers):
+    """
+    group walkers whose messages are published together in batch messages
+    :param walkers: list of walk pattern generators
+    :return: list of walker groups
+    """
+    groups = dict()
+    for walker in walkers:
+        batch_key = walker.get_batch_key(exchange_name='generator_personnel')
+        if batch_key is not None:
+            groups.setdefault(batch_key, []).append(walker)
+    return list(groups.values())
+
+
+def tick_interval(walk_config, walkers):
+    """
+    period of the shared clock of all walkers
+    :param walk_config: walk_generator configuration, the 'tick_interval' key sets the period
+    :param walkers: list of walk pattern generators
+    :return: period in seconds, the smallest positive walker interval if not configured
+    """
+    if walk_config.get("tick_interval") is not None:
+        return walk_config["tick_interval"]
+    intervals = [walker.interval for walker in walkers if walker.interval > 0]
+    return min(intervals) if len(intervals) > 0 else 0
+
+
+def tick_divisors(walkers, interval):
+    """
+    number of ticks between the updates of each walker
+    :param walkers: list of walk pattern generators
+    :param interval: tick period in seconds
+    :return: dictionary of divisors per walker, every walker is updated at least every tick
+    """
+    divisors = dict()
+    for walker in walkers:
+        if interval > 0 and walker.interval > 0:
+            divisors[walker] = max(1, round(walker.interval / interval))
+        else:
+            divisors[walker] = 1
+    return divisors
 
 
-async def app(eventloop, config):
-    """Main application for Personnel Generator"""
+def group_walkers_by_fleet(walkers, divisors):
+    """
+    group walkers advanced together by a WalkFleet, they walk in the same map with the same rays, range and
+    update rate
+    :param walkers: list of walk pattern generators
+    :param divisors: dictionary of divisors per walker, see tick_divisors
+    :return: list of (fleet, divisor) tuples for the groups which contain more than one walker
+    """
+    groups = dict()
+    for walker in walkers:
+        # heading-focused sensing casts different rays for every walker
+        particle = walker.collision.particle
+        if walker.collision.sensing is not None or walker.interval < 0 or \
+                walker.walk_dimension not in FLEET_WALK_DIMENSIONS:
+            continue
+        groups.setdefault((walker.map_id, particle.num_of_rays, particle.max_range, divisors[walker]),
+                          []).append(walker)
+    return [(WalkFleet(walkers=group), key[3]) for key, group in groups.items() if len(group) > 1]
+
+
+def split_fleets(walk_config, walkers, divisors):
+    """
+    fleets of the walkers if enabled, see group_walkers_by_fleet
+    :param walk_config: walk_generator configuration, the 'fleet' key enables the fleets
+    :param walkers: list of walk pattern generators
+    :param divisors: dictionary of divisors per walker, see tick_divisors
+    :return: list of (fleet, divisor) tuples and list of the walkers which are not in a fleet
+    """
+    if not walk_config.get("fleet", False):
+        return [], walkers
+    fleets = group_walkers_by_fleet(walkers=walkers, divisors=divisors)
+    in_fleet = set(walker for fleet, _ in fleets for walker in fleet.walkers)
+    return fleets, [walker for walker in walkers if walker not in in_fleet]
+
+
+def due_steps(index, walkers, walker_groups, divisors, last_ticks, interval, outboxes, fleets=()):
+    """
+    step coroutines of the walkers and fleets due in a tick, walkers sharing a map are ranged together first
+    :param index: tick index
+    :param walkers: list of walk pattern generators which are not in a fleet
+    :param walker_groups: walker groups, see group_walkers_by_map
+    :param divisors: dictionary of divisors per walker, see tick_divisors
+    :param last_ticks: dictionary of the last tick index per walker and fleet, updated for the due ones
+    :param interval: tick period in seconds
+    :param outboxes: dictionary of outboxes per walker, see group_walkers_by_batch
+    :param fleets: list of (fleet, divisor) tuples, see group_walkers_by_fleet (optional)
+    :return: list of coroutines
+    """
+    steps = []
+    for fleet, divisor in fleets:
+        if index % divisor == 0:
+            tdelta = -1
+            if interval > 0 and fleet in last_ticks:
+                tdelta = (index - last_ticks[fleet]) * interval
+            last_ticks[fleet] = index
+            steps.append(fleet.step(outboxes=outboxes, tdelta=tdelta))
+
+    due = [walker for walker in walkers if index % divisors[walker] == 0]
+    due_walkers = set(due)
+    due_groups = [[walker for walker in group if walker in due_walkers] for group in walker_groups]
+    views = batch_ranging([group for group in due_groups if len(group) > 1])
+    for walker in due:
+        # the time step is the scheduled time since the last update of the walker, skipped ticks included
+        tdelta = -1
+        if interval > 0 and walker in last_ticks:
+            tdelta = (index - last_ticks[walker]) * interval
+        last_ticks[walker] = index
+        steps.append(walker.step(views=views.get(walker), outbox=outboxes.get(walker), tdelta=tdelta))
+    return steps
+
+
+# time in seconds between the metrics reports of a worker to the supervisor
+METRICS_INTERVAL = 5
+
+
+async def app(eventloop, config, shard_index=0, shard_count=1, metrics=None, seed=None):
+    """Main application for Personnel Generator
+    - shard_index, shard_count: the application runs the personnels of shard shard_index of shard_count
+    - metrics: function called with the metrics of the worker every METRICS_INTERVAL seconds (default: None)
+    - seed: run seed of the random streams of the personnels (default: seed key of the configuration)
+    """
     walkers_in_map = []
-    global is_sighup_received
+    metrics_server = None
+    global is_sighup_received, is_stop_received
 
     while True:
         # Read configuration
@@ -48,30 +236,183 @@ async def app(eventloop, config):
 
         logger.debug("Personnel Generator Version: %s", walk_config['version'])
 
+        # stage timings are measured by the walkers created after the metrics are enabled, set up at start
+        metrics_config = walk_config.get("metrics")
+        if metrics_config is not None and metrics_server is None:
+            port = metrics_config.get("port")
+            metrics_server = MetricsServer(metrics=enable_metrics(),
+                                           host=metrics_config.get("host", "127.0.0.1"),
+                                           port=None if port is None else port + shard_index,
+                                           report_interval=metrics_config.get("report_interval"))
+            await metrics_server.start()
+
         # Personnel instantiation
-        for each_walker in walk_config["personnels"]:
+        for each_walker in shard_personnels(walk_config["personnels"], shard_index, shard_count):
             # check for protocol key
             if "protocol" not in each_walker:
                 logger.critical("no 'protocol' key found.")
                 sys.exit(-1)
 
             # create walker
-            walker = WalkPatternGenerator(eventloop=eventloop, config_file=each_walker)
+            walker = WalkPatternGenerator(eventloop=eventloop, config_file=each_walker,
+                                          seed=seed if seed is not None else walk_config.get("seed"))
             await walker.connect()
             walkers_in_map.append(walker)
 
+        # messages of walkers publishing in batches are collected per tick
+        batch_groups = group_walkers_by_batch(walkers_in_map)
+        outboxes = dict()
+        for group in batch_groups:
+            outbox = []
+            for walker in group:
+                outboxes[walker] = outbox
+
+        # all walkers are updated on one fixed rate clock
+        scheduler = TickScheduler(interval=tick_interval(walk_config=walk_config, walkers=walkers_in_map))
+        divisors = tick_divisors(walkers=walkers_in_map, interval=scheduler.interval)
+
+        # walkers sharing a map and rate are advanced together by fleets if enabled, the others sharing a map
+        # are ranged together
+        fleets, single_walkers = split_fleets(walk_config=walk_config, walkers=walkers_in_map, divisors=divisors)
+        walker_groups = group_walkers_by_map(single_walkers)
+        last_ticks = dict()
+        last_metrics = [eventloop.time()]
+        tick_metrics = get_metrics()
+        if tick_metrics is not None:
+            tick_metrics.set_collector('scheduler', scheduler.get_stats)
+
+        async def tick(index):
+            if tick_metrics is not None:
+                started = time.perf_counter()
+            await asyncio.gather(*due_steps(index=index,
+                                            walkers=single_walkers,
+                                            walker_groups=walker_groups,
+                                            divisors=divisors,
+                                            last_ticks=last_ticks,
+                                            interval=scheduler.interval,
+                                            outboxes=outboxes,
+                                            fleets=fleets))
+            for group in batch_groups:
+                outbox = outboxes[group[0]]
+                if len(outbox) > 0:
+                    await group[0].publish_batch(exchange_name='generator_personnel', msgs=outbox)
+                    outbox.clear()
+            if tick_metrics is not None:
+                tick_metrics.observe('tick', started)
+            if metrics is not None and eventloop.time() - last_metrics[0] >= METRICS_INTERVAL:
+                last_metrics[0] = eventloop.time()
+                worker_metrics = {"worker": shard_index, "walkers": len(walkers_in_map)}
+                worker_metrics.update(scheduler.get_stats())
+                metrics(worker_metrics)
+
         # continuously monitor signal handle and update walker
-        while not is_sighup_received:
-            for each_walker in walkers_in_map:
-                await each_walker.update()
+        await scheduler.run(tick=tick, is_running=lambda: not (is_sighup_received or is_stop_received))
+        logger.debug(f'Tick scheduler: {scheduler.get_stats()}')
 
-        # If SIGHUP Occurs, Delete the instances
+        # If SIGHUP Occurs, Delete the instances. The shared maps are dropped only once the telemetry subscribers
+        # of all replaced walkers are cancelled, so none of them updates the maps built for the new configuration
         for entry in walkers_in_map:
-            del entry
+            await entry.terminate()
+        walkers_in_map.clear()
+        clear_static_maps()
+        clear_area_indexes()
+        if is_stop_received:
+            break
 
         # reset sighup handler flag
         is_sighup_received = False
 
+    # SIGTERM or SIGINT: the connections to the broker are closed
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await close_connection_pools()
+
+
+async def generate(eventloop, config, output, steps=None, duration=None, formats=EXPORT_FORMATS, start_time=0,
+                   seed=None, imu_batch=1024):
+    """Offline generation: runs all personnels on simulated time as fast as possible, without a broker, and writes
+    their reference, UWB and IMU streams to files, see DatasetWriter
+    - steps: number of ticks to simulate
+    - duration: simulated time in seconds, used if steps is not given
+    - formats: export formats, 'csv' and/or 'npz'
+    - start_time: simulated UNIX time in seconds of the first tick
+    - seed: run seed of the random streams of the personnels (default: seed key of the configuration)
+    - imu_batch: number of ticks whose IMU channels are computed in one pass, see DeferredIMU
+    Returns the number of exported samples
+    """
+    walk_config = read_config(yaml_file=config, rootkey='walk_generator')
+    # stage timings are logged once at the end
+    metrics = enable_metrics() if walk_config.get("metrics") is not None else None
+    walkers = []
+    for each_walker in walk_config["personnels"]:
+        walker = WalkPatternGenerator(eventloop=eventloop, config_file=each_walker,
+                                      seed=seed if seed is not None else walk_config.get("seed"))
+        # views are not exported
+        walker.view_encoder = ViewEncoder(config={"encoding": "none"})
+        # IMU channels are computed in batches of imu_batch ticks
+        walker.imu_tag = DeferredIMU(imu=walker.imu_tag)
+        walkers.append(walker)
+
+    interval = tick_interval(walk_config=walk_config, walkers=walkers)
+    if interval <= 0:
+        logger.error("offline generation needs a positive tick interval")
+        raise AssertionError("offline generation needs a positive tick interval")
+    if steps is None:
+        if duration is None:
+            logger.error("number of steps or duration must be given")
+            raise AssertionError("number of steps or duration must be given")
+        steps = math.ceil(duration / interval)
+
+    # all walkers read the simulated clock
+    clock = [round(start_time * 1e9)]
+    for walker in walkers:
+        walker.clock_ns = lambda: clock[0]
+
+    divisors = tick_divisors(walkers=walkers, interval=interval)
+    fleets, single_walkers = split_fleets(walk_config=walk_config, walkers=walkers, divisors=divisors)
+    walker_groups = group_walkers_by_map(single_walkers)
+    # the first step of a walker spans one period of the walker, the wall clock is never read
+    last_ticks = {walker: -divisors[walker] for walker in single_walkers}
+    last_ticks.update({fleet: -divisor for fleet, divisor in fleets})
+    outbox = []
+    outboxes = {walker: outbox for walker in walkers}
+    writer = DatasetWriter(output=output, formats=formats)
+    samples = 0
+
+    def flush():
+        if metrics is not None:
+            started = time.perf_counter()
+        for walker in walkers:
+            walker.imu_tag.flush()
+        if metrics is not None:
+            metrics.observe('imu_batch', started)
+        for msg in outbox:
+            writer.write(msg)
+        outbox.clear()
+
+    try:
+        for index in range(steps):
+            clock[0] = round((start_time + (index * interval)) * 1e9)
+            for step in due_steps(index=index,
+                                  walkers=single_walkers,
+                                  walker_groups=walker_groups,
+                                  divisors=divisors,
+                                  last_ticks=last_ticks,
+                                  interval=interval,
+                                  outboxes=outboxes,
+                                  fleets=fleets):
+                await step
+            if (index + 1) % imu_batch == 0:
+                samples += len(outbox)
+                flush()
+        samples += len(outbox)
+        flush()
+    finally:
+        writer.close()
+    if metrics is not None:
+        metrics.log_report()
+    return samples
+
 
 def read_config(yaml_file, rootkey):
     """Parse the given Configuration File"""
@@ -84,6 +425,18 @@ def read_config(yaml_file, rootkey):
         logger.error('YAML Configuration File not Found.')
 
 
+def run_worker(config, shard_index, shard_count, metrics_queue, seed=None):
+    """Entry point of a worker process started by the Supervisor"""
+    # the supervisor stops the workers, an interrupt of the terminal must not reach them directly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    event_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(event_loop)
+    event_loop.add_signal_handler(signal.SIGHUP, functools.partial(signal_handler, name='SIGHUP'))
+    event_loop.add_signal_handler(signal.SIGTERM, functools.partial(signal_handler, name='SIGTERM'))
+    event_loop.run_until_complete(app(event_loop, config, shard_index=shard_index, shard_count=shard_count,
+                                      metrics=metrics_queue.put_nowait, seed=seed))
+
+
 def main():
     """Initialization"""
     args = parse_arguments()
@@ -91,9 +444,39 @@ def main():
         logger.error("configuration file not readable. Check path to configuration file")
         sys.exit(-1)
 
+    walk_config = read_config(yaml_file=args.config, rootkey='walk_generator')
+
+    # one run seed for all personnels and workers, logged so the run can be repeated
+    seed = args.seed if args.seed is not None else walk_config.get("seed")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    logger.info(f'Run seed: {seed}')
+
+    if args.command == 'generate':
+        formats = EXPORT_FORMATS if args.format == 'both' else (args.format,)
+        event_loop = asyncio.get_event_loop()
+        samples = event_loop.run_until_complete(generate(event_loop, args.config,
+                                                         output=args.output,
+                                                         steps=args.steps,
+                                                         duration=args.duration,
+                                                         formats=formats,
+                                                         start_time=args.start_time,
+                                                         seed=seed))
+        logger.debug(f'Generated {samples} samples in {args.output}')
+        return
+
+    workers = args.workers
+    if workers is None:
+        workers = walk_config.get("workers", 1)
+    if workers > 1:
+        Supervisor(target=functools.partial(run_worker, seed=seed), config=args.config, workers=workers).run()
+        return
+
     event_loop = asyncio.get_event_loop()
     event_loop.add_signal_handler(signal.SIGHUP, functools.partial(signal_handler, name='SIGHUP'))
-    event_loop.run_until_complete(app(event_loop, args.config))
+    event_loop.add_signal_handler(signal.SIGTERM, functools.partial(signal_handler, name='SIGTERM'))
+    event_loop.add_signal_handler(signal.SIGINT, functools.partial(signal_handler, name='SIGINT'))
+    event_loop.run_until_complete(app(event_loop, args.config, seed=seed))
 
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
-from pywalkgen.raycast import Point, LineSegment
+import numpy as np
+from pywalkgen.raycast import Point, LineSegment, View
+from pywalkgen.raycast.VectorParticle import scan_batch
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,19 +13,24 @@ logger.addHandler(handler)
 
 
 class CollisionDetection:
-    def __init__(self, scene, particle, env_collision_distance, robot_collision_distance):
+    def __init__(self, scene, particle, env_collision_distance, robot_collision_distance, sensing=None):
         """
         Initializes collision detection
         :param scene: scene object
         :param particle: particle object
         :param env_collision_distance: environment obstacle collision distance
         :param robot_collision_distance: robot (obstacle) collision distance
+        :param sensing: heading-focused sensing attributes 'sector' and 'coarse_step' (optional),
+                        all rays are cast if not given
         """
         self.scene = scene
         self.particle = particle
         self.views = None
         self.env_collision_distance = env_collision_distance
         self.robot_collision_distance = robot_collision_distance
+        self.sensing = sensing
+        self.robot_descriptions = None
+        self.robot_ids = None
 
     def update_particles(self, x, y):
         """
@@ -62,49 +69,89 @@ class CollisionDetection:
                               corner_points=corner_points,
                               shape=shape)
 
-    def ranging(self):
+    @staticmethod
+    def batch_views(detections):
         """
-        range (measure distances) from the obstacles
-        :return:
+        look around for every particle of the given collision detections in one vectorized pass.
+        All detections must share the same map, the segments of the first scene are used for all of them.
+        :param detections: list of collision detection objects
+        :return: list of View, one per collision detection, to be handed to ranging()
         """
-        result = []
-        robot_control_msg = []
+        if len(detections) == 0:
+            return []
+        scene = detections[0].scene
+        return scan_batch(particles=[detection.particle for detection in detections],
+                          segments=scene.get_segments(),
+                          packed_segments=scene.get_packed_segments(),
+                          descriptions=scene.get_descriptions())
 
-        self.views = self.particle.look(self.scene.get_segments())
-
-        for item in self.views:
-            if item['distance'] is not None:
-                if item['distance'] > self.env_collision_distance:
-                    result.append(item)
+    def _get_robot_ids(self, descriptions):
+        """
+        robot id per obstacle index, computed once per descriptions table
+        :param descriptions: list of obstacle descriptions
+        :return: list of robot ids, None for obstacles which are not robot arms
+        """
+        if descriptions is not self.robot_descriptions:
+            self.robot_ids = []
+            for description in descriptions:
+                view_substring = description.split("_")
+                if ("shoulder" in view_substring) or \
+                        ("elbow" in view_substring) or \
+                        ("wrist" in view_substring):
+                    self.robot_ids.append(view_substring[1])
+                else:
+                    self.robot_ids.append(None)
+            self.robot_descriptions = descriptions
+        return self.robot_ids
 
-        for item in self.views:
-            if item['distance'] is not None:
-                if item['distance'] < self.robot_collision_distance:
-                    view_substring = item['obstacle'].split("_")
-                    if ("shoulder" in view_substring) or \
-                            ("elbow" in view_substring) or \
-                            ("wrist" in view_substring):
-                        robot_control_msg.append({"id": view_substring[1], "control": "stop"})
-        return result, robot_control_msg
+    def ranging(self, views=None, heading=None):
+        """
+        range (measure distances) from the obstacles
+        :param views: View precomputed by batch_views (optional), the particle looks around itself otherwise
+        :param heading: walk angle in degrees the sensing sector is centered on (optional)
+        :return: View of the rays which are free of obstacles and list of robot control messages
+        """
+        if views is None and self.sensing is not None and heading is not None:
+            self.views = self.particle.scan_adaptive(scene=self.scene,
+                                                     heading=heading,
+                                                     sector=self.sensing["sector"],
+                                                     coarse_step=self.sensing["coarse_step"],
+                                                     refine_distance=max(self.env_collision_distance,
+                                                                         self.robot_collision_distance))
+        elif views is None:
+            self.views = self.particle.scan_scene(self.scene)
+        else:
+            self.views = views
+        return self.avoidance()
 
     def avoidance(self):
         """
         Obstacle avoidance
-        :return:
+        :return: View of the rays which are free of obstacles and list of robot control messages
         """
-        result = []
-        robot_control_msg = []
+        view = self.views
+        distance = view.distance
+        with np.errstate(invalid='ignore'):
+            free = distance > self.env_collision_distance
+            near = distance < self.robot_collision_distance
 
-        for item in self.views:
-            if item['distance'] is not None:
-                if item['distance'] > self.env_collision_distance:
-                    result.append(item)
+        max_range = self.particle.max_range
+        if max_range is not None and max_range > self.env_collision_distance:
+            # nothing within the sensing range, the direction is free up to the range
+            unseen = np.isnan(distance)
+            free |= unseen
+            distance = np.where(unseen, max_range, distance)
 
-        for item in self.views:
-            if item['distance'] < self.robot_collision_distance:
-                view_substring = item['obstacle'].split("_")
-                if ("shoulder" in view_substring) or \
-                        ("elbow" in view_substring) or \
-                        ("wrist" in view_substring):
-                    robot_control_msg.append({"id": view_substring[1], "control": "stop"})
+        result = View(angle=view.angle[free],
+                      distance=distance[free],
+                      obstacle=view.obstacle[free],
+                      contact_x=view.contact_x[free],
+                      contact_y=view.contact_y[free],
+                      descriptions=view.descriptions)
+
+        robot_control_msg = []
+        robot_ids = self._get_robot_ids(view.descriptions)
+        for idx in view.obstacle[near].tolist():
+            if robot_ids[idx] is not None:
+                robot_control_msg.append({"id": robot_ids[idx], "control": "stop"})
         return result, robot_control_msg
@@ -0,0 +1,135 @@
+import os
+import csv
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+EXPORT_FORMATS = ('csv', 'npz')
+
+# columns of the exported streams, taken from the walk message, see WalkPatternGenerator._update3d
+STREAMS = {
+    "reference": (("id", str), ("time", np.int64), ("data_aggregator_id", str), ("walk_angle", np.float64),
+                  ("x_step_length", np.float64), ("y_step_length", np.float64), ("z_step_length", np.float64),
+                  ("x_ref_pos", np.float64), ("y_ref_pos", np.float64), ("z_ref_pos", np.float64),
+                  ("x_ref_vel", np.float64), ("y_ref_vel", np.float64), ("z_ref_vel", np.float64),
+                  ("x_ref_acc", np.float64), ("y_ref_acc", np.float64), ("z_ref_acc", np.float64),
+                  ("ref_roll", np.float64), ("ref_pitch", np.float64), ("ref_yaw", np.float64)),
+    "uwb": (("id", str), ("time", np.int64),
+            ("x_uwb_pos", np.float64), ("y_uwb_pos", np.float64), ("z_uwb_pos", np.float64)),
+    "imu": (("id", str), ("time", np.int64),
+            ("x_imu_vel", np.float64), ("y_imu_vel", np.float64), ("z_imu_vel", np.float64),
+            ("x_imu_acc", np.float64), ("y_imu_acc", np.float64), ("z_imu_acc", np.float64),
+            ("imu_roll", np.float64), ("imu_pitch", np.float64), ("imu_yaw", np.float64))
+}
+
+
+class StreamWriter:
+    """Writes the samples of one stream column by column. Rows are buffered in chunks, each full chunk is
+    appended to the CSV file and kept as arrays for the .npz file written on close.
+    """
+
+    def __init__(self, path, columns, formats=EXPORT_FORMATS, chunk_size=65536):
+        """
+        Initializes the stream writer
+        :param path: path of the output files without extension
+        :param columns: tuple of (name, type) pairs, str columns are exported as unicode arrays
+        :param formats: export formats, 'csv' and/or 'npz'
+        :param chunk_size: number of rows buffered before they are written
+        """
+        for export_format in formats:
+            if export_format not in EXPORT_FORMATS:
+                logger.error(f"Unknown export format: {export_format}")
+                raise AssertionError(f"Unknown export format: {export_format}")
+        self.path = path
+        self.columns = columns
+        self.formats = formats
+        self.chunk_size = chunk_size
+        self.buffer = [[] for _ in columns]
+        self.chunks = [[] for _ in columns]
+        self.rows = 0
+        self.csv_file = None
+        self.csv_writer = None
+        if 'csv' in formats:
+            self.csv_file = open(path + '.csv', 'w', newline='')
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow([name for name, _ in columns])
+
+    def append(self, sample):
+        """
+        add one row
+        :param sample: dict with a value for every column, None is written as an empty string or nan
+        """
+        for column, (name, _) in zip(self.buffer, self.columns):
+            column.append(sample.get(name))
+        self.rows += 1
+        if len(self.buffer[0]) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if len(self.buffer[0]) == 0:
+            return
+        if self.csv_writer is not None:
+            self.csv_writer.writerows(zip(*[['' if value is None else value for value in column]
+                                            for column in self.buffer]))
+        if 'npz' in self.formats:
+            for chunks, column, (_, column_type) in zip(self.chunks, self.buffer, self.columns):
+                if column_type is str:
+                    chunks.append(np.array(['' if value is None else str(value) for value in column]))
+                elif column_type is np.float64:
+                    chunks.append(np.array([np.nan if value is None else value for value in column],
+                                           dtype=np.float64))
+                else:
+                    chunks.append(np.array(column, dtype=column_type))
+        self.buffer = [[] for _ in self.columns]
+
+    def close(self):
+        """write the buffered rows and the .npz file"""
+        self._flush()
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+        if 'npz' in self.formats:
+            arrays = dict()
+            for chunks, (name, column_type) in zip(self.chunks, self.columns):
+                arrays[name] = np.concatenate(chunks) if len(chunks) > 0 else \
+                    np.empty(0, dtype=np.str_ if column_type is str else column_type)
+            np.savez_compressed(self.path + '.npz', **arrays)
+            self.chunks = [[] for _ in self.columns]
+
+
+class DatasetWriter:
+    """Writes the reference, UWB and IMU streams of walk messages to <output>/<stream>.csv and .npz"""
+
+    def __init__(self, output, formats=EXPORT_FORMATS, chunk_size=65536):
+        """
+        Initializes the dataset writer
+        :param output: output directory, created if it does not exist
+        :param formats: export formats, 'csv' and/or 'npz'
+        :param chunk_size: number of rows buffered per stream before they are written
+        """
+        os.makedirs(output, exist_ok=True)
+        self.writers = {stream: StreamWriter(path=os.path.join(output, stream),
+                                             columns=columns,
+                                             formats=formats,
+                                             chunk_size=chunk_size) for stream, columns in STREAMS.items()}
+
+    def write(self, msg):
+        """
+        add the samples of one walk message to all streams
+        :param msg: walk message
+        """
+        for writer in self.writers.values():
+            writer.append(msg)
+
+    def close(self):
+        """write all buffered samples"""
+        for writer in self.writers.values():
+            writer.close()
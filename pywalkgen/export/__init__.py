@@ -0,0 +1,11 @@
+from __future__ import generator_stop
+from __future__ import annotations
+
+from .StreamWriter import StreamWriter, DatasetWriter, STREAMS, EXPORT_FORMATS
+
+__all__ = [
+    'StreamWriter',
+    'DatasetWriter',
+    'STREAMS',
+    'EXPORT_FORMATS'
+]
@@ -1,6 +1,7 @@
 import sys
 import math
 import logging
+import numpy as np
 from pywalkgen.outliergen import OutlierGenerator
 
 logger = logging.getLogger(__name__)
@@ -11,26 +12,39 @@ formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(messa
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# rows of IMU.state
+POSITION, VELOCITY, ACCELERATION, ORIENTATION = range(4)
+
+# channels of an IMU update, in message order
+IMU_CHANNELS = ('x_ref_vel', 'y_ref_vel', 'z_ref_vel', 'x_ref_acc', 'y_ref_acc', 'z_ref_acc',
+                'ref_roll', 'ref_pitch', 'ref_yaw',
+                'x_imu_vel', 'y_imu_vel', 'z_imu_vel', 'x_imu_acc', 'y_imu_acc', 'z_imu_acc',
+                'imu_roll', 'imu_pitch', 'imu_yaw')
+
 
 class IMU:
-    def __init__(self, config_file):
+    def __init__(self, config_file, random_streams=None):
         """
         Initializes IMU
         :param config_file: configuration file
+        :param random_streams: dict of the random streams of the acceleration outliers per axis x, y and z (optional)
         """
         try:
+            if random_streams is None:
+                random_streams = dict()
             attribute = config_file["attribute"]['motion']
             initial_acc = attribute["acceleration"]["initial"]
             initial_vel = attribute["velocity"]["initial"]
             initial_ori = attribute["orientation"]["initial"]
 
-            self.prev_position = {'x': config_file["start_coordinates"]["x"],
-                                  'y': config_file["start_coordinates"]["y"],
-                                  'z': config_file["start_coordinates"]["z"]}
-
-            self.acceleration = {'x': initial_acc['x'], 'y': initial_acc['y'], 'z': initial_acc['z']}
-            self.velocity = {'x': initial_vel['x'], 'y': initial_vel['y'], 'z': initial_vel['z']}
-            self.orientation = {'roll': initial_ori['roll'], 'pitch': initial_ori['pitch'], 'yaw': initial_ori['yaw']}
+            # state rows: position, velocity, acceleration and orientation (roll, pitch, yaw)
+            self.state = np.zeros((4, 3), dtype=np.float64)
+            self.state[POSITION] = (config_file["start_coordinates"]["x"],
+                                    config_file["start_coordinates"]["y"],
+                                    config_file["start_coordinates"]["z"])
+            self.state[VELOCITY] = (initial_vel['x'], initial_vel['y'], initial_vel['z'])
+            self.state[ACCELERATION] = (initial_acc['x'], initial_acc['y'], initial_acc['z'])
+            self.state[ORIENTATION] = (initial_ori['roll'], initial_ori['pitch'], initial_ori['yaw'])
             self.time_now = 0
             self.time_past = 0
             self.outlier_gen = dict()
@@ -42,7 +56,8 @@ class IMU:
                                                            attribute["acceleration"]["outliers"]["x"][
                                                                "number_of_outlier"],
                                                            sample_size=attribute["acceleration"]["outliers"]["x"][
-                                                               "sample_size"])})
+                                                               "sample_size"],
+                                                           random_stream=random_streams.get("x"))})
 
             self.outlier_gen.update({'y': OutlierGenerator(mean=attribute["acceleration"]["outliers"]["y"]["mean"],
                                                            standard_deviation=
@@ -52,7 +67,8 @@ class IMU:
                                                            attribute["acceleration"]["outliers"]["y"][
                                                                "number_of_outlier"],
                                                            sample_size=attribute["acceleration"]["outliers"]["y"][
-                                                               "sample_size"])})
+                                                               "sample_size"],
+                                                           random_stream=random_streams.get("y"))})
 
             self.outlier_gen.update({'z': OutlierGenerator(mean=attribute["acceleration"]["outliers"]["z"]["mean"],
                                                            standard_deviation=
@@ -62,86 +78,194 @@ class IMU:
                                                            attribute["acceleration"]["outliers"]["z"][
                                                                "number_of_outlier"],
                                                            sample_size=attribute["acceleration"]["outliers"]["z"][
-                                                               "sample_size"])})
+                                                               "sample_size"],
+                                                           random_stream=random_streams.get("z"))})
 
         except Exception as e:
             logger.critical("unhandled exception", e)
             sys.exit(-1)
 
-    def update(self, cur_position, tdelta=-1):
+    def update(self, cur_position, tdelta=-1, out=None):
         """
         update IMU generator.
         Note This function need to be called in a loop every update cycle
         :param cur_position: current position
         :param tdelta: time delta
-        :return:
+        :param out: dict the IMU channels are written to, a new dict if not given
+        :return: dict with the IMU channels, see IMU_CHANNELS
         """
         try:
             # calculate loop time
             if tdelta < 0:
                 raise RuntimeError("timedelta cannot be negative value")
-            timedelta = tdelta
-
-            noisy_velocity = {'x': 0, 'y': 0, 'z': 0}
-            noisy_acceleration = {'x': 0, 'y': 0, 'z': 0}
-            noisy_orientation = {'roll': 0, 'pitch': 0, 'yaw': 0}
 
-            self.acceleration['x'] = (cur_position['x_ref_pos'] - self.prev_position['x']) / (timedelta**2)
-            self.acceleration['y'] = (cur_position['y_ref_pos'] - self.prev_position['y']) / (timedelta**2)
-            self.acceleration['z'] = (cur_position['y_ref_pos'] - self.prev_position['y']) / (timedelta**2)
+            x = cur_position['x_ref_pos']
+            y = cur_position['y_ref_pos']
+            z = cur_position['z_ref_pos']
+            prev_x, prev_y, _ = self.state[POSITION].tolist()
 
-            self.velocity['x'] = (cur_position['x_ref_pos'] - self.prev_position['x']) / timedelta
-            self.velocity['y'] = (cur_position['y_ref_pos'] - self.prev_position['y']) / timedelta
-            self.velocity['z'] = (cur_position['y_ref_pos'] - self.prev_position['y']) / timedelta
+            # same arithmetic as update_batch, element by element: math.atan2 and numpy.arctan2 may differ in the
+            # last bit of the orientation, all other channels are equal
+            td_squared = tdelta * tdelta
+            vel_x = (x - prev_x) / tdelta
+            vel_y = (y - prev_y) / tdelta
+            acc_x = (x - prev_x) / td_squared
+            acc_y = (y - prev_y) / td_squared
+            # the z axis follows the displacement of the y axis
+            vel_z = vel_y
+            acc_z = acc_y
+            acc_xx = acc_x * acc_x
+            acc_yy = acc_y * acc_y
+            acc_zz = acc_z * acc_z
+            roll = math.atan2(acc_y, math.sqrt(acc_xx + acc_zz))
+            pitch = math.atan2(acc_x, math.sqrt(acc_yy + acc_zz))
+            yaw = math.atan2(math.sqrt(acc_xx + acc_yy), acc_z)
 
-            self.prev_position['x'] = cur_position['x_ref_pos']
-            self.prev_position['y'] = cur_position['y_ref_pos']
-            self.prev_position['z'] = cur_position['z_ref_pos']
+            self.state[:] = ((x, y, z), (vel_x, vel_y, vel_z), (acc_x, acc_y, acc_z), (roll, pitch, yaw))
 
-            self.orientation['roll'] = math.atan2(self.acceleration['y'],
-                                                  math.sqrt((self.acceleration['x'] ** 2) +
-                                                            (self.acceleration['z'] ** 2)))
-
-            self.orientation['pitch'] = math.atan2(self.acceleration['x'],
-                                                   math.sqrt((self.acceleration['y'] ** 2) +
-                                                             (self.acceleration['z'] ** 2)))
+            if out is None:
+                out = dict()
+            out['x_ref_vel'] = vel_x
+            out['y_ref_vel'] = vel_y
+            out['z_ref_vel'] = vel_z
+            out['x_ref_acc'] = acc_x
+            out['y_ref_acc'] = acc_y
+            out['z_ref_acc'] = acc_z
+            out['ref_roll'] = roll
+            out['ref_pitch'] = pitch
+            out['ref_yaw'] = yaw
+            # outliers are added to the velocity only, acceleration and orientation are reported as measured
+            out['x_imu_vel'] = vel_x + self.outlier_gen['x'].generate()
+            out['y_imu_vel'] = vel_y + self.outlier_gen['y'].generate()
+            out['z_imu_vel'] = vel_z + self.outlier_gen['z'].generate()
+            out['x_imu_acc'] = acc_x
+            out['y_imu_acc'] = acc_y
+            out['z_imu_acc'] = acc_z
+            out['imu_roll'] = roll
+            out['imu_pitch'] = pitch
+            out['imu_yaw'] = yaw
+            return out
+        except Exception as e:
+            logger.critical("unhandled exception", e)
+            sys.exit(-1)
 
-            self.orientation['yaw'] = math.atan2(math.sqrt((self.acceleration['x'] ** 2) +
-                                                           (self.acceleration['y'] ** 2)),
-                                                 self.acceleration['z'])
+    def update_batch(self, positions, tdelta):
+        """
+        update IMU generator with a whole trajectory at once, equivalent to calling update for every position
+        :param positions: array of shape (n, 3) with the x, y and z reference positions
+        :param tdelta: time delta before every position, scalar or array of shape (n,)
+        :return: dict with an array of shape (n,) per IMU channel, see IMU_CHANNELS
+        """
+        try:
+            positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+            count = len(positions)
+            tdelta = np.broadcast_to(np.asarray(tdelta, dtype=np.float64), (count,))
+            if (tdelta < 0).any():
+                raise RuntimeError("timedelta cannot be negative value")
+            if count == 0:
+                return {channel: np.empty(0, dtype=np.float64) for channel in IMU_CHANNELS}
 
-            for i in ['x', 'y', 'z']:
-                noisy_acceleration[i] = self.acceleration[i]
-                noisy_velocity[i] = self.velocity[i] + self.outlier_gen[i].generate()
+            displacement = np.diff(positions[:, :2], axis=0, prepend=self.state[POSITION, :2].reshape(1, 2))
+            td_squared = tdelta * tdelta
+            vel_x = displacement[:, 0] / tdelta
+            vel_y = displacement[:, 1] / tdelta
+            acc_x = displacement[:, 0] / td_squared
+            acc_y = displacement[:, 1] / td_squared
+            # the z axis follows the displacement of the y axis
+            vel_z = vel_y
+            acc_z = acc_y
+            acc_xx = acc_x * acc_x
+            acc_yy = acc_y * acc_y
+            acc_zz = acc_z * acc_z
+            roll = np.arctan2(acc_y, np.sqrt(acc_xx + acc_zz))
+            pitch = np.arctan2(acc_x, np.sqrt(acc_yy + acc_zz))
+            yaw = np.arctan2(np.sqrt(acc_xx + acc_yy), acc_z)
 
-            noisy_orientation['roll'] = math.atan2(noisy_acceleration['y'], math.sqrt(
-                (noisy_acceleration['x'] ** 2) + (noisy_acceleration['z'] ** 2)))
-            noisy_orientation['pitch'] = math.atan2(noisy_acceleration['x'], math.sqrt(
-                (noisy_acceleration['y'] ** 2) + (noisy_acceleration['z'] ** 2)))
-            noisy_orientation['yaw'] = math.atan2(
-                math.sqrt((noisy_acceleration['x'] ** 2) + (noisy_acceleration['y'] ** 2)), noisy_acceleration['z'])
+            self.state[POSITION] = positions[-1]
+            self.state[VELOCITY] = (vel_x[-1], vel_y[-1], vel_z[-1])
+            self.state[ACCELERATION] = (acc_x[-1], acc_y[-1], acc_z[-1])
+            self.state[ORIENTATION] = (roll[-1], pitch[-1], yaw[-1])
 
             return {
-                'x_ref_vel': self.velocity['x'],
-                'y_ref_vel': self.velocity['y'],
-                'z_ref_vel': self.velocity['z'],
-                'x_ref_acc': self.acceleration['x'],
-                'y_ref_acc': self.acceleration['y'],
-                'z_ref_acc': self.acceleration['z'],
-                'ref_roll': self.orientation['roll'],
-                'ref_pitch': self.orientation['pitch'],
-                'ref_yaw': self.orientation['yaw'],
-                'x_imu_vel': noisy_velocity['x'],
-                'y_imu_vel': noisy_velocity['y'],
-                'z_imu_vel': noisy_velocity['z'],
-                'x_imu_acc': noisy_acceleration['x'],
-                'y_imu_acc': noisy_acceleration['y'],
-                'z_imu_acc': noisy_acceleration['z'],
-                'imu_roll': self.orientation['roll'],
-                'imu_pitch': self.orientation['pitch'],
-                'imu_yaw': self.orientation['yaw']
+                'x_ref_vel': vel_x,
+                'y_ref_vel': vel_y,
+                'z_ref_vel': vel_z.copy(),
+                'x_ref_acc': acc_x,
+                'y_ref_acc': acc_y,
+                'z_ref_acc': acc_z.copy(),
+                'ref_roll': roll,
+                'ref_pitch': pitch,
+                'ref_yaw': yaw,
+                'x_imu_vel': vel_x + self.outlier_gen['x'].generate_batch(count),
+                'y_imu_vel': vel_y + self.outlier_gen['y'].generate_batch(count),
+                'z_imu_vel': vel_z + self.outlier_gen['z'].generate_batch(count),
+                'x_imu_acc': acc_x.copy(),
+                'y_imu_acc': acc_y.copy(),
+                'z_imu_acc': acc_z.copy(),
+                'imu_roll': roll.copy(),
+                'imu_pitch': pitch.copy(),
+                'imu_yaw': yaw.copy()
             }
         except Exception as e:
             logger.critical("unhandled exception", e)
             sys.exit(-1)
 
+    def update_trajectory(self, positions, timestamps, previous_time=None):
+        """
+        update IMU generator with a trajectory of timestamped positions, see update_batch
+        :param positions: array of shape (n, 3) with the x, y and z reference positions
+        :param timestamps: array of shape (n,) with the time of every position in seconds
+        :param previous_time: time of the last update in seconds, the first interval is repeated if not given
+        :return: dict with an array of shape (n,) per IMU channel, see IMU_CHANNELS
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if previous_time is None:
+            if len(timestamps) < 2:
+                logger.error("previous time is needed for less than two timestamps")
+                raise AssertionError("previous time is needed for less than two timestamps")
+            previous_time = timestamps[0] - (timestamps[1] - timestamps[0])
+        return self.update_batch(positions=positions, tdelta=np.diff(timestamps, prepend=previous_time))
+
+
+class DeferredIMU:
+    """Stands in for the IMU of a walker and defers its updates: the positions of the walk messages are recorded
+    and their IMU channels are filled in by one update_batch call on flush. Used by the offline generation.
+    """
+
+    def __init__(self, imu):
+        """
+        Initializes the deferred IMU
+        :param imu: IMU the updates are deferred to
+        """
+        self.imu = imu
+        self.messages = []
+        self.positions = []
+        self.tdeltas = []
+
+    def update(self, cur_position, tdelta=-1, out=None):
+        """
+        record one update, the IMU channels of out are None until flush
+        :param cur_position: current position
+        :param tdelta: time delta
+        :param out: dict the IMU channels are written to on flush, a new dict if not given
+        :return: out
+        """
+        if out is None:
+            out = dict()
+        out.update(dict.fromkeys(IMU_CHANNELS))
+        self.messages.append(out)
+        self.positions.append((cur_position['x_ref_pos'], cur_position['y_ref_pos'], cur_position['z_ref_pos']))
+        self.tdeltas.append(tdelta)
+        return out
+
+    def flush(self):
+        """fill in the IMU channels of all recorded updates"""
+        if len(self.messages) == 0:
+            return
+        channels = self.imu.update_batch(positions=self.positions, tdelta=self.tdeltas)
+        columns = [channels[channel].tolist() for channel in IMU_CHANNELS]
+        for msg, values in zip(self.messages, zip(*columns)):
+            msg.update(zip(IMU_CHANNELS, values))
+        self.messages.clear()
+        self.positions.clear()
+        self.tdeltas.clear()
@@ -1,8 +1,10 @@
 from __future__ import generator_stop
 from __future__ import annotations
 
-from .IMU import IMU
+from .IMU import IMU, DeferredIMU, IMU_CHANNELS
 
 __all__ = [
-    'IMU'
+    'IMU',
+    'DeferredIMU',
+    'IMU_CHANNELS'
 ]
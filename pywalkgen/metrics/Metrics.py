@@ -0,0 +1,236 @@
+import math
+import time
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+# the periodic summary lines are logged on info level
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, math.inf)
+
+# metrics of this process, None while disabled
+_metrics = None
+
+
+def get_metrics():
+    """
+    metrics of this process. Instrumented code keeps the result and only measures if it is not None,
+    which keeps the cost of disabled metrics to one comparison per stage
+    :return: Metrics, None if metrics are disabled
+    """
+    return _metrics
+
+
+def enable_metrics():
+    """
+    enable the metrics of this process, code instrumented afterwards reports to them
+    :return: Metrics
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def disable_metrics():
+    """disable the metrics of this process, instrumented code keeps the metrics it already holds"""
+    global _metrics
+    _metrics = None
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, exported as a Prometheus histogram"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        """
+        Initializes an empty histogram
+        :param bounds: ascending upper bounds of the buckets, the last one must be infinite
+        """
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """
+        :return: tuple of the bucket counts, count and sum, see quantile
+        """
+        return list(self.counts), self.count, self.sum
+
+    def quantile(self, q, since=None):
+        """
+        upper bound of the bucket holding the q-quantile
+        :param q: quantile between 0 and 1
+        :param since: snapshot, only the values observed after it are taken (optional)
+        :return: upper bound in seconds, None if nothing was observed
+        """
+        counts = self.counts if since is None else [now - then for now, then in zip(self.counts, since[0])]
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.bounds, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.bounds[-1]
+
+
+class Metrics:
+    """Timings of the stages of the walker updates, samples per walker and the statistics of registered collectors,
+    e.g. the tick scheduler and the publish pipelines. Exported in the Prometheus text format, see render, and as a
+    summary line, see report.
+
+    Stages are timed by the instrumented code:
+        started = time.perf_counter()
+        ...
+        started = metrics.observe('ranging', started)
+    """
+
+    def __init__(self):
+        self.stages = dict()
+        self.samples = dict()
+        self.collectors = dict()
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.last_snapshots = dict()
+        self.last_samples = 0
+
+    def observe(self, stage, started):
+        """
+        record the duration of a stage
+        :param stage: name of the stage
+        :param started: time.perf_counter() at the start of the stage
+        :return: time.perf_counter() at the end of the stage, the start of the next one
+        """
+        now = time.perf_counter()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(now - started)
+        return now
+
+    def count_sample(self, walker_id):
+        """
+        count one sample of a walker
+        :param walker_id: id of the walker
+        """
+        self.samples[walker_id] = self.samples.get(walker_id, 0) + 1
+
+    def set_collector(self, name, collect, labels=None):
+        """
+        register a collector, replacing the one registered under the same name and labels
+        :param name: name of the collector, e.g. 'scheduler'
+        :param collect: function returning a dict of numeric statistics, exported as walkgen_<name>_<key>
+        :param labels: dict of the labels of the exported statistics, e.g. the exchange of a publisher (optional)
+        """
+        self.collectors[(name, tuple(sorted((labels or dict()).items())))] = collect
+
+    def remove_collector(self, name, labels=None):
+        self.collectors.pop((name, tuple(sorted((labels or dict()).items()))), None)
+
+    def _collect(self):
+        """
+        :return: list of (name, labels, statistics) tuples, statistics holds the numeric values only
+        """
+        values = []
+        for (name, labels), collect in list(self.collectors.items()):
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.error(f'metrics collector {name} failed: {e}')
+                continue
+            if stats is not None:
+                values.append((name, labels, {key: value for key, value in stats.items()
+                                              if isinstance(value, (int, float)) and not isinstance(value, bool)}))
+        return values
+
+    def render(self):
+        """
+        :return: metrics in the Prometheus text exposition format
+        """
+        lines = ['# HELP walkgen_stage_duration_seconds duration of the stages of the walker updates',
+                 '# TYPE walkgen_stage_duration_seconds histogram']
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                le = '+Inf' if math.isinf(bound) else repr(bound)
+                lines.append(f'walkgen_stage_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'walkgen_stage_duration_seconds_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'walkgen_stage_duration_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+        elapsed = time.monotonic() - self.started
+        lines += ['# HELP walkgen_walker_samples_total samples generated per walker',
+                  '# TYPE walkgen_walker_samples_total counter']
+        lines += [f'walkgen_walker_samples_total{{walker="{walker_id}"}} {count}'
+                  for walker_id, count in sorted(self.samples.items(), key=lambda item: str(item[0]))]
+        lines += ['# HELP walkgen_walker_achieved_rate samples per second per walker since the metrics were enabled',
+                  '# TYPE walkgen_walker_achieved_rate gauge']
+        lines += [f'walkgen_walker_achieved_rate{{walker="{walker_id}"}} {count / elapsed if elapsed > 0 else 0!r}'
+                  for walker_id, count in sorted(self.samples.items(), key=lambda item: str(item[0]))]
+
+        gauges = dict()
+        for name, labels, stats in self._collect():
+            label_text = ','.join(f'{label}="{value}"' for label, value in labels)
+            for key, value in stats.items():
+                gauges.setdefault(f'walkgen_{name}_{key}', []).append(
+                    (label_text, '+Inf' if math.isinf(value) else repr(value)))
+        for metric, samples in sorted(gauges.items()):
+            lines.append(f'# TYPE {metric} gauge')
+            lines += [f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}'
+                      for label_text, value in samples]
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        """
+        one line summary of the time since the last report: per stage the number of measurements, mean and 99th
+        percentile (upper bound of its bucket), the samples per second of all walkers and the collected statistics,
+        summed over the collectors of the same name
+        :return: summary line
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_report
+        parts = []
+        for stage, histogram in sorted(self.stages.items()):
+            snapshot = self.last_snapshots.get(stage, ([0] * len(histogram.bounds), 0, 0.0))
+            count = histogram.count - snapshot[1]
+            if count == 0:
+                continue
+            mean = (histogram.sum - snapshot[2]) / count
+            p99 = histogram.quantile(0.99, since=snapshot)
+            parts.append(f'{stage} n={count} mean={mean * 1000:.3f}ms p99<={p99 * 1000:.3f}ms')
+            self.last_snapshots[stage] = histogram.snapshot()
+        samples = sum(self.samples.values())
+        rate = (samples - self.last_samples) / elapsed if elapsed > 0 else 0
+        parts.append(f'walkers={len(self.samples)} samples/s={rate:.1f}')
+        self.last_samples = samples
+        # statistics of collectors with the same name, e.g. of all publish pipelines, are summed up
+        totals = dict()
+        for name, _, stats in self._collect():
+            total = totals.setdefault(name, dict())
+            for key, value in stats.items():
+                total[key] = total.get(key, 0) + value
+        for name, total in sorted(totals.items()):
+            parts.append(name + ' ' + ' '.join(f'{key}={value:.4g}' if isinstance(value, float) else f'{key}={value}'
+                                               for key, value in sorted(total.items())))
+        self.last_report = now
+        return f'Metrics over {elapsed:.1f} s: ' + ' | '.join(parts)
+
+    def log_report(self):
+        """log the summary line, see report"""
+        logger.info(self.report())
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+# the periodic summary lines are logged on info level
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsServer:
+    """Serves metrics in the Prometheus text format on http://<host>:<port>/metrics and logs their summary line
+    every report_interval seconds, both from the event loop of the walkers.
+    """
+
+    def __init__(self, metrics, host='127.0.0.1', port=None, report_interval=None):
+        """
+        Initializes the metrics server, it is started with start
+        :param metrics: Metrics to export
+        :param host: address the HTTP endpoint listens on
+        :param port: port of the HTTP endpoint, not served if not given
+        :param report_interval: time in seconds between the summary log lines, not logged if not given
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.report_interval = report_interval
+        self.server = None
+        self.task = None
+
+    async def start(self):
+        """start the HTTP endpoint and the periodic summary, must be called from the running event loop"""
+        if self.port is not None and self.server is None:
+            self.server = await asyncio.start_server(self._handle, host=self.host, port=self.port)
+            logger.info(f'Metrics served on http://{self.host}:{self.port}/metrics')
+        if self.report_interval is not None and self.task is None:
+            if self.report_interval <= 0:
+                raise ValueError("metrics report interval must be positive")
+            self.task = asyncio.ensure_future(self._report())
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.metrics.log_report()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            # the request headers are not used
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            if len(request_line) >= 2 and request_line[0] == 'GET' and request_line[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = self.metrics.render().encode()
+            else:
+                status = '404 Not Found'
+                body = b'not found\n'
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\n'
+                         f'Connection: close\r\n\r\n'.encode() + body)
+            await writer.drain()
+        except Exception as e:
+            logger.error(f'metrics request failed: {e}')
+        finally:
+            writer.close()
+
+    async def stop(self):
+        """stop the HTTP endpoint and the periodic summary"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
@@ -0,0 +1,14 @@
+from __future__ import generator_stop
+from __future__ import annotations
+
+from .Metrics import Metrics, Histogram, get_metrics, enable_metrics, disable_metrics
+from .MetricsServer import MetricsServer
+
+__all__ = [
+    'Metrics',
+    'Histogram',
+    'get_metrics',
+    'enable_metrics',
+    'disable_metrics',
+    'MetricsServer'
+]
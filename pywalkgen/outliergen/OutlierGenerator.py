@@ -1,17 +1,24 @@
 import numpy as np
 import logging
+from pywalkgen.random_stream import RandomStream
 
 logging.basicConfig(level=logging.WARNING, format='%(levelname)-8s [%(filename)s:%(lineno)d] %(message)s')
 
 
 class OutlierGenerator:
-    def __init__(self, mean, standard_deviation, number_of_outliers, sample_size):
+    """Outliers of a Gaussian distribution at random positions of every window of sample_size samples.
+    The values of a whole window are drawn at once when the window starts, generate hands them out one at a
+    time and generate_batch as arrays.
+    """
+
+    def __init__(self, mean, standard_deviation, number_of_outliers, sample_size, random_stream=None):
         """
         Initialize Outlier Generator
         :param mean: mean value of Gaussian distribution 
         :param standard_deviation: standard deviation of Gaussian distribution
         :param number_of_outliers: Number of outlier to be generated for sample size equals to sample_size
         :param sample_size: sample size with in which outliers are distributed
+        :param random_stream: stream of the random draws, unseeded if not given
         """
         try:
             # verify the parameters
@@ -32,8 +39,11 @@ class OutlierGenerator:
             self.number_of_outliers = number_of_outliers
             self.outlier_distribution_sample_size = sample_size
             self.sample_counter = 0
+            self.random_stream = random_stream if random_stream is not None else RandomStream(block_size=32)
             self.outlier_position = []
-            self._generate_outlier_position()
+            self.window = None
+            self.window_values = []
+            self._generate_window()
         except ValueError as e:
             logging.critical(e)
             exit()
@@ -47,13 +57,33 @@ class OutlierGenerator:
         :return: NA
         """
         try:
-            self.outlier_position = np.random.choice(range(0,self.outlier_distribution_sample_size), self.number_of_outliers)
+            # positions drawn uniformly with replacement, as numpy.random.choice does
+            positions = self.random_stream.uniforms(self.number_of_outliers) * self.outlier_distribution_sample_size
+            self.outlier_position = np.minimum(positions.astype(int), self.outlier_distribution_sample_size - 1)
             # sort outlier position in increasing order, fastens the generate
             self.outlier_position.sort()
         except Exception as e:
             logging.critical(e)
             exit()
 
+    def _generate_window(self):
+        """
+        Generate the values of a window, outliers at the outlier positions and zero elsewhere
+        :return: NA
+        """
+        try:
+            self._generate_outlier_position()
+            # a position drawn more than once holds one outlier, the values are drawn in the order of the positions
+            is_outlier = np.zeros(self.outlier_distribution_sample_size, dtype=bool)
+            is_outlier[self.outlier_position] = True
+            self.window = np.zeros(self.outlier_distribution_sample_size, dtype=np.float64)
+            self.window[is_outlier] = self.mean + (self.standard_deviation *
+                                                   self.random_stream.normals(int(np.count_nonzero(is_outlier))))
+            self.window_values = self.window.tolist()
+        except Exception as e:
+            logging.critical(e)
+            exit()
+
     def generate(self, repeat=True):
         """
         Generate outliers at positions generated by "generate_outlier_position" function
@@ -61,12 +91,9 @@ class OutlierGenerator:
         :return: outlier value (dtype = float)
         """
         try:
-            # check if outlier position matches the location counter
-            if self.sample_counter in self.outlier_position:
-                # generate random value with specified mean and standard deviation
-                ret_val = np.random.normal(loc=self.mean, scale=self.standard_deviation)
-            else:
-                ret_val = 0
+            ret_val = 0.0
+            if self.sample_counter < self.outlier_distribution_sample_size:
+                ret_val = self.window_values[self.sample_counter]
 
             # increment location counter, so to keep track
             self.sample_counter = self.sample_counter + 1
@@ -74,11 +101,36 @@ class OutlierGenerator:
             # generate new outliers if sample counter is greater or equal to distribution sample size
             if repeat:
                 if self.sample_counter >= self.outlier_distribution_sample_size:
-                    self._generate_outlier_position()
+                    self._generate_window()
                     self.sample_counter = 0
 
-            return float(ret_val)
+            return ret_val
         except Exception as e:
             logging.critical(e)
             exit()
 
+    def generate_batch(self, size, repeat=True):
+        """
+        Generate the values of the next samples at once, the same values as calling generate size times
+        :param size: number of samples
+        :param repeat: repeats outlier position generation every time sample size is exhausted, default value is True
+        :return: array of outlier values
+        """
+        try:
+            values = np.zeros(size, dtype=np.float64)
+            filled = 0
+            while filled < size and self.sample_counter < self.outlier_distribution_sample_size:
+                count = min(size - filled, self.outlier_distribution_sample_size - self.sample_counter)
+                values[filled:filled + count] = self.window[self.sample_counter:self.sample_counter + count]
+                filled += count
+                self.sample_counter += count
+                if repeat and self.sample_counter >= self.outlier_distribution_sample_size:
+                    self._generate_window()
+                    self.sample_counter = 0
+
+            # without repeat the samples after the last window are zero
+            self.sample_counter += size - filled
+            return values
+        except Exception as e:
+            logging.critical(e)
+            exit()
@@ -1,7 +1,13 @@
 import sys
-from aio_pika import connect_robust,Message,DeliveryMode,ExchangeType,IncomingMessage
+import time
+from aio_pika import Message,DeliveryMode,ExchangeType,IncomingMessage
 from aio_pika import exceptions as aio_pika_exception
 import logging
+from .Codec import CODEC_HEADER, get_codec
+from .ConnectionPool import get_connection_pool
+from .Batch import BATCH_HEADER, DEFAULT_MAX_BATCH_BYTES, pack_batches, unpack_batch
+from .Pipeline import DEFAULT_STOP_TIMEOUT, PublishPipeline
+from pywalkgen.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
@@ -20,6 +26,11 @@ class PubSubAMQP:
         - binding_suffix: Binding Suffix necessary for Publishing on dedicated routing key
         - mode: Publish/Subscribe (default: 'publisher')
         - app_callback: Callback function  (default: None)
+        - codec: read from config_file["codec"], encoding of published messages (default: 'json')
+        - batch: read from config_file["batch"], batch publishing with keys 'max_bytes' and 'binding_suffix'
+                 (default: None, not batched)
+        - pipeline: read from config_file["pipeline"], queued publishing with keys 'queue_size', 'policy',
+                    'in_flight' and 'stop_timeout' (default: None, published inline)
         """
         try:
             self.broker_info = config_file["broker"]
@@ -31,10 +42,30 @@ class PubSubAMQP:
 
             self.binding_suffix = binding_suffix
             self.eventloop = eventloop
-            self.connection = None
+            self.pool = None
             self.channel = None
             self.exchange = None
+            self.queue = None
+            self.consumer_tag = None
             self.app_callback = app_callback
+            self.codec = get_codec(config_file.get("codec", "json"))
+            self.decoders = dict()
+            batch = config_file.get("batch")
+            self.batching = batch is not None
+            self.batch_max_bytes = DEFAULT_MAX_BATCH_BYTES if batch is None else batch.get("max_bytes",
+                                                                                          DEFAULT_MAX_BATCH_BYTES)
+            self.batch_suffix = "batch" if batch is None else batch.get("binding_suffix", "batch")
+            pipeline = config_file.get("pipeline")
+            self.pipeline = None
+            if pipeline is not None:
+                self.pipeline = PublishPipeline(send=self._send,
+                                                queue_size=pipeline.get("queue_size", 1024),
+                                                policy=pipeline.get("policy", "drop_oldest"),
+                                                in_flight=pipeline.get("in_flight", 64))
+                self.pipeline_stop_timeout = pipeline.get("stop_timeout", DEFAULT_STOP_TIMEOUT)
+
+            # publish timings, None while metrics are disabled
+            self.metrics = get_metrics()
 
             logger.debug('RabbitMQ Exchange: %s', self.exchange_name)
             logger.debug('Binding Suffix: %s', self.binding_suffix)
@@ -45,17 +76,18 @@ class PubSubAMQP:
             sys.exit(-1)
 
     async def connect(self, mode="publisher"):
-        """connect: Connect to the Message Broker"""
+        """connect: Borrow a channel from the process wide connection pool of the Message Broker"""
         try:
-            logger.debug('Connecting the Broker: amqp://%s %s', self.broker_info["address"], self.broker_info["port"])
-            self.connection = await connect_robust(
-                login=self.credential_info["username"],
-                password=self.credential_info["password"],
-                host=self.broker_info["address"],
-                port=self.broker_info["port"],
-                loop=self.eventloop
+            self.pool = get_connection_pool(
+                eventloop=self.eventloop,
+                broker_info=self.broker_info,
+                credential_info=self.credential_info
             )
-            self.channel = await self.connection.channel()
+            self.channel = await self.pool.acquire()
+            if self.pipeline is not None and mode == "publisher":
+                self.pipeline.start()
+                if self.metrics is not None:
+                    self.metrics.set_collector('pipeline', self.pipeline.get_stats, labels=self._metric_labels())
             if mode == "subscriber":
                 await self._sub_connect()
         except aio_pika_exception.AMQPException as e:
@@ -64,14 +96,14 @@ class PubSubAMQP:
             sys.exit(-1)
 
     async def _sub_connect(self):
-        """_sub_connect: private method for subscribing data to Broker. Setup dedicated channel, exchange"""
+        """_sub_connect: private method for subscribing data to Broker. Setup qos, exchange and queue on the channel"""
         try:
             await self.channel.set_qos(prefetch_count=1)
-            self.exchange = await self.channel.declare_exchange(self.exchange_name, ExchangeType.FANOUT)
-            queue = await self.channel.declare_queue(exclusive=True)
+            self.exchange = await self.pool.declare_exchange(self.channel, self.exchange_name, ExchangeType.FANOUT)
+            self.queue = await self.channel.declare_queue(exclusive=True)
             for binding in self.binding_keys:
-                await queue.bind(exchange=self.exchange, routing_key=binding + self.binding_suffix)
-            await queue.consume(self._sub_on_message)
+                await self.queue.bind(exchange=self.exchange, routing_key=binding + self.binding_suffix)
+            self.consumer_tag = await self.queue.consume(self._sub_on_message)
         except Exception as e:
             logger.error('_sub_connect: Exception during setup of sub channel, exchange')
             logger.error(e)
@@ -83,33 +115,69 @@ class PubSubAMQP:
 
         async with message.process():
             logger.debug(f"msg received: Exchange {message.exchange}, Routing {message.routing_key}")
-            if self.app_callback is not None:
-                self.app_callback(
-                    exchange_name=message.exchange,
-                    binding_name=message.routing_key,
-                    message_body=message.body
-                )
+            # messages delivered before the consumer was cancelled by terminate are dropped
+            if self.app_callback is not None and self.consumer_tag is not None:
+                try:
+                    message_bodies = self._decode(message)
+                except Exception as e:
+                    logger.error(f'_sub_on_message: can not decode message from {message.routing_key}')
+                    logger.error(e)
+                    return
+                for message_body in message_bodies:
+                    self.app_callback(
+                        exchange_name=message.exchange,
+                        binding_name=message.routing_key,
+                        message_body=message_body
+                    )
+
+    def _decode(self, message: IncomingMessage):
+        """_decode: private method to decode a message with the codec named in its header, JSON if there is none.
+        Returns the list of messages, batch messages are split into the messages they carry"""
+        headers = message.headers or {}
+        name = headers.get(CODEC_HEADER, "json")
+        if isinstance(name, bytes):
+            name = name.decode()
+        if name not in self.decoders:
+            self.decoders[name] = get_codec(name)
+        if BATCH_HEADER in headers:
+            return [self.decoders[name].decode(body) for body in unpack_batch(message.body)]
+        return [self.decoders[name].decode(message.body)]
 
     async def publish(self, message_content, priority=0, external_binding_suffix=None):
         """publish: Produce Message to Message Broker
-        - message_content: payload of message to be published
+        - message_content: payload of message to be published, encoded with the codec unless it is bytes
         - priority: message priority
         """
         try:
-            self.exchange = await self.channel.declare_exchange(self.exchange_name, ExchangeType.FANOUT)
+            if self.metrics is not None:
+                started = time.perf_counter()
+            if isinstance(message_content, bytes):
+                body = message_content
+                headers = None
+                content_type = None
+            else:
+                body = self.codec.encode(message_content)
+                if self.metrics is not None:
+                    started = self.metrics.observe('serialization', started)
+                headers = {CODEC_HEADER: self.codec.name}
+                content_type = self.codec.content_type
+            binding_suffix = self.binding_suffix if external_binding_suffix is None else external_binding_suffix
+            outgoing = []
             for binding_key in self.binding_keys:
                 message = Message(
-                    body=message_content,
+                    body=body,
+                    headers=headers,
+                    content_type=content_type,
                     delivery_mode=DeliveryMode.NOT_PERSISTENT,
                     priority=priority
                 )
                 # logger.debug(
-                #     f'msg Publish: Exchange: {self.exchange_name}, Routing:{binding_key + self.binding_suffix}'
+                #     f'msg Publish: Exchange: {self.exchange_name}, Routing:{binding_key + binding_suffix}'
                 # )
-                if external_binding_suffix is not None:
-                    await self.exchange.publish(message, routing_key=binding_key + external_binding_suffix)
-                else:
-                    await self.exchange.publish(message, routing_key=binding_key + self.binding_suffix)
+                outgoing.append((message, binding_key + binding_suffix))
+            await self._enqueue(outgoing)
+            if self.metrics is not None:
+                self.metrics.observe('publish', started)
         except aio_pika_exception.AMQPException as e:
             logger.error(e)
             await self.terminate()
@@ -120,9 +188,100 @@ class PubSubAMQP:
             await self.terminate()
             sys.exit(-1)
 
+    async def publish_batch(self, messages, priority=0):
+        """publish_batch: Produce the messages of one tick framed into as few batch messages as max_bytes allows.
+        Batch messages are routed to <binding_key><batch binding_suffix>, see Batch.py for the frame format
+        - messages: list of payloads, encoded with the codec unless they are bytes
+        - priority: message priority
+        """
+        if len(messages) == 0:
+            return
+        try:
+            if self.metrics is not None:
+                started = time.perf_counter()
+            bodies = [message if isinstance(message, bytes) else self.codec.encode(message) for message in messages]
+            if self.metrics is not None:
+                started = self.metrics.observe('serialization', started)
+            for count, frame in pack_batches(bodies, max_bytes=self.batch_max_bytes):
+                outgoing = []
+                for binding_key in self.binding_keys:
+                    message = Message(
+                        body=frame,
+                        headers={CODEC_HEADER: self.codec.name, BATCH_HEADER: count},
+                        content_type="application/octet-stream",
+                        delivery_mode=DeliveryMode.NOT_PERSISTENT,
+                        priority=priority
+                    )
+                    outgoing.append((message, binding_key + self.batch_suffix))
+                await self._enqueue(outgoing)
+            if self.metrics is not None:
+                self.metrics.observe('publish', started)
+        except aio_pika_exception.AMQPException as e:
+            logger.error(e)
+            await self.terminate()
+            sys.exit(-1)
+        except Exception as e:
+            logger.error('Exception during Publishing Batch to Broker')
+            logger.error(e)
+            await self.terminate()
+            sys.exit(-1)
+
+    async def _enqueue(self, outgoing):
+        """_enqueue: private method to send messages inline or hand them to the publish pipeline
+        - outgoing: list of (message, routing key) tuples
+        """
+        if self.pipeline is not None:
+            await self.pipeline.put(outgoing)
+        else:
+            await self._send(outgoing)
+
+    async def _send(self, outgoing):
+        """_send: private method to publish messages on the exchange
+        - outgoing: list of (message, routing key) tuples
+        """
+        if self.exchange is None:
+            self.exchange = await self.pool.declare_exchange(self.channel, self.exchange_name, ExchangeType.FANOUT)
+        for message, routing_key in outgoing:
+            if self.metrics is not None:
+                started = time.perf_counter()
+            # awaits the publisher confirm of the broker
+            await self.exchange.publish(message, routing_key=routing_key)
+            if self.metrics is not None:
+                self.metrics.observe('broker_round_trip', started)
+
+    def get_pipeline_stats(self):
+        """get_pipeline_stats: counters of the publish pipeline, None if messages are published inline"""
+        if self.pipeline is None:
+            return None
+        return self.pipeline.get_stats()
+
+    def _metric_labels(self):
+        """_metric_labels: labels of the exported statistics of this publisher"""
+        return {"exchange": self.exchange_name, "binding_suffix": self.binding_suffix}
+
     async def terminate(self):
-        """terminate: close the connection to the broker"""
-        await self.connection.close()
+        """terminate: cancel the consumer, delete the queue of a subscriber and give the channel back to the
+        connection pool, the pooled connections stay open until close_connection_pools"""
+        if self.queue is not None:
+            consumer_tag = self.consumer_tag
+            self.consumer_tag = None
+            try:
+                if consumer_tag is not None:
+                    await self.queue.cancel(consumer_tag)
+                await self.queue.delete(if_unused=False, if_empty=False)
+            except Exception as e:
+                logger.error('terminate: Exception while cancelling the consumer and deleting the queue')
+                logger.error(e)
+            self.queue = None
+        if self.pipeline is not None:
+            # queued messages are still published, the ones not sent within the timeout are counted as dropped
+            await self.pipeline.stop(flush=True, timeout=self.pipeline_stop_timeout)
+            if self.metrics is not None:
+                self.metrics.remove_collector('pipeline', labels=self._metric_labels())
+        if self.pool is not None and self.channel is not None:
+            await self.pool.release(self.channel)
+            self.channel = None
+            self.exchange = None
 
 
 
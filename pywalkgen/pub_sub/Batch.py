@@ -0,0 +1,81 @@
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# message header carrying the number of messages of a batch, messages without it are not batched
+BATCH_HEADER = "batch"
+
+# Frame format of a batch message, all integers little endian:
+#   magic       3 bytes  b'WGB'
+#   version     uint8    1
+#   count       uint32   number of messages
+#   count times:
+#     length    uint32   length of the message body
+#     body      length bytes, encoded with the codec named in the codec header of the batch message
+BATCH_MAGIC = b'WGB'
+BATCH_VERSION = 1
+BATCH_PREFIX = struct.Struct('<3sBI')
+BATCH_LENGTH = struct.Struct('<I')
+DEFAULT_MAX_BATCH_BYTES = 128 * 1024
+
+
+def pack_batches(bodies, max_bytes=DEFAULT_MAX_BATCH_BYTES):
+    """
+    frame message bodies into batch messages
+    :param bodies: list of encoded message bodies
+    :param max_bytes: maximum size of a batch message, a larger body is sent alone in its own batch
+    :return: list of (number of messages, batch message) tuples
+    """
+    batches = []
+    parts = []
+    size = BATCH_PREFIX.size
+    for body in bodies:
+        entry_size = BATCH_LENGTH.size + len(body)
+        if len(parts) > 0 and size + entry_size > max_bytes:
+            batches.append(_frame(parts))
+            parts = []
+            size = BATCH_PREFIX.size
+        parts.append(body)
+        size += entry_size
+    if len(parts) > 0:
+        batches.append(_frame(parts))
+    return batches
+
+
+def _frame(bodies):
+    frame = [BATCH_PREFIX.pack(BATCH_MAGIC, BATCH_VERSION, len(bodies))]
+    for body in bodies:
+        frame.append(BATCH_LENGTH.pack(len(body)))
+        frame.append(body)
+    return len(bodies), b''.join(frame)
+
+
+def unpack_batch(frame):
+    """
+    split a batch message into the message bodies
+    :param frame: batch message
+    :return: list of encoded message bodies
+    """
+    frame = bytes(frame)
+    magic, version, count = BATCH_PREFIX.unpack_from(frame, 0)
+    if magic != BATCH_MAGIC:
+        raise ValueError("not a batch message")
+    if version != BATCH_VERSION:
+        raise ValueError(f"unsupported batch frame version {version}")
+    offset = BATCH_PREFIX.size
+    bodies = []
+    for _ in range(count):
+        length = BATCH_LENGTH.unpack_from(frame, offset)[0]
+        offset += BATCH_LENGTH.size
+        if offset + length > len(frame):
+            raise ValueError("truncated batch message")
+        bodies.append(frame[offset:offset + length])
+        offset += length
+    return bodies
@@ -0,0 +1,274 @@
+import json
+import struct
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# message header naming the codec of the body, bodies without it are JSON
+CODEC_HEADER = "codec"
+
+
+class JSONCodec:
+    """JSON with the standard library, the original message format"""
+    name = "json"
+    content_type = "application/json"
+
+    def encode(self, message):
+        return json.dumps(message).encode()
+
+    def decode(self, body):
+        return json.loads(body)
+
+
+class FastJSONCodec:
+    """Compact JSON. Uses orjson when it is installed, the standard library encoder without
+    whitespace and circular reference checks otherwise. NaN is encoded as null by orjson, numpy scalars and
+    arrays are encoded as numbers and lists.
+    """
+    name = "fast_json"
+    content_type = "application/json"
+
+    def __init__(self):
+        self.encoder = json.JSONEncoder(check_circular=False, separators=(',', ':'))
+
+    def encode(self, message):
+        if orjson is not None:
+            return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY)
+        return self.encoder.encode(message).encode()
+
+    def decode(self, body):
+        if orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+
+
+# binary schema: magic, version, then one tagged value (msgpack style)
+BINARY_MAGIC = b'WG'
+BINARY_VERSION = 1
+
+TAG_NONE = 0x00
+TAG_FALSE = 0x01
+TAG_TRUE = 0x02
+TAG_INT8 = 0x03
+TAG_INT32 = 0x04
+TAG_INT64 = 0x05
+TAG_FLOAT64 = 0x06
+TAG_STR = 0x07
+TAG_BYTES = 0x08
+TAG_LIST = 0x09
+TAG_DICT = 0x0A
+
+# dict keys of version 1 are sent as one byte index into this table, other keys as KEY_STR + string.
+# The table is append only, a new version is needed to change or remove entries
+KEY_STR = 0xFF
+KEYS_V1 = (
+    # walk message
+    "measurement", "time", "id", "data_aggregator_id", "walk_angle",
+    "x_step_length", "y_step_length", "z_step_length",
+    "x_ref_pos", "y_ref_pos", "z_ref_pos", "x_uwb_pos", "y_uwb_pos", "z_uwb_pos",
+    "view", "ref_heading", "start", "end",
+    "x_ref_vel", "y_ref_vel", "z_ref_vel", "x_ref_acc", "y_ref_acc", "z_ref_acc",
+    "ref_roll", "ref_pitch", "ref_yaw",
+    "x_imu_vel", "y_imu_vel", "z_imu_vel", "x_imu_acc", "y_imu_acc", "z_imu_acc",
+    "imu_roll", "imu_pitch", "imu_yaw", "timestamp",
+    # view
+    "contact_point", "angle", "obstacle", "distance", "encoding", "obstacles",
+    # robot telemetry and control
+    "base", "shoulder", "elbow", "wrist", "control"
+)
+KEY_INDEX_V1 = {key: idx for idx, key in enumerate(KEYS_V1)}
+
+# tag and value packed in one call
+TAGGED_INT8 = struct.Struct('<Bb')
+TAGGED_INT32 = struct.Struct('<Bi')
+TAGGED_INT64 = struct.Struct('<Bq')
+TAGGED_FLOAT64 = struct.Struct('<Bd')
+TAGGED_LENGTH = struct.Struct('<BI')
+INT8 = struct.Struct('<b')
+INT32 = struct.Struct('<i')
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+UINT32 = struct.Struct('<I')
+
+NONE = bytes((TAG_NONE,))
+FALSE = bytes((TAG_FALSE,))
+TRUE = bytes((TAG_TRUE,))
+KEYS_V1_ENCODED = {key: bytes((idx,)) for key, idx in KEY_INDEX_V1.items()}
+
+
+class BinaryCodec:
+    """Compact versioned binary schema. A body is the magic b'WG', the schema version byte and one tagged
+    value: None, booleans, integers (1, 4 or 8 bytes), float64, strings, bytes, lists and dicts, all little
+    endian with uint32 lengths. Dict keys known to the schema version take one byte.
+    """
+    name = "binary"
+    content_type = "application/octet-stream"
+
+    def __init__(self):
+        self.encoders = {
+            type(None): self._encode_none,
+            bool: self._encode_bool,
+            int: self._encode_int,
+            float: self._encode_float,
+            str: self._encode_str,
+            bytes: self._encode_bytes,
+            bytearray: self._encode_bytes,
+            list: self._encode_list,
+            tuple: self._encode_list,
+            dict: self._encode_dict
+        }
+
+    def encode(self, message):
+        parts = [BINARY_MAGIC, bytes((BINARY_VERSION,))]
+        self._encode_value(message, parts)
+        return b''.join(parts)
+
+    def _encode_value(self, value, parts):
+        encoder = self.encoders.get(type(value))
+        if encoder is None:
+            # subclasses, e.g. numpy float64
+            for value_type, candidate in self.encoders.items():
+                if isinstance(value, value_type):
+                    encoder = candidate
+                    break
+            else:
+                raise TypeError(f"type {type(value).__name__} can not be encoded")
+        encoder(value, parts)
+
+    @staticmethod
+    def _encode_none(value, parts):
+        parts.append(NONE)
+
+    @staticmethod
+    def _encode_bool(value, parts):
+        parts.append(TRUE if value else FALSE)
+
+    @staticmethod
+    def _encode_int(value, parts):
+        if -128 <= value < 128:
+            parts.append(TAGGED_INT8.pack(TAG_INT8, value))
+        elif -2147483648 <= value < 2147483648:
+            parts.append(TAGGED_INT32.pack(TAG_INT32, value))
+        else:
+            parts.append(TAGGED_INT64.pack(TAG_INT64, value))
+
+    @staticmethod
+    def _encode_float(value, parts):
+        parts.append(TAGGED_FLOAT64.pack(TAG_FLOAT64, value))
+
+    @staticmethod
+    def _encode_str(value, parts):
+        encoded = value.encode()
+        parts.append(TAGGED_LENGTH.pack(TAG_STR, len(encoded)))
+        parts.append(encoded)
+
+    @staticmethod
+    def _encode_bytes(value, parts):
+        parts.append(TAGGED_LENGTH.pack(TAG_BYTES, len(value)))
+        parts.append(bytes(value))
+
+    def _encode_list(self, value, parts):
+        parts.append(TAGGED_LENGTH.pack(TAG_LIST, len(value)))
+        encode = self._encode_value
+        for item in value:
+            encode(item, parts)
+
+    def _encode_dict(self, value, parts):
+        parts.append(TAGGED_LENGTH.pack(TAG_DICT, len(value)))
+        encode = self._encode_value
+        for key, item in value.items():
+            encoded_key = KEYS_V1_ENCODED.get(key)
+            if encoded_key is None:
+                encoded = str(key).encode()
+                encoded_key = TAGGED_LENGTH.pack(KEY_STR, len(encoded)) + encoded
+            parts.append(encoded_key)
+            encode(item, parts)
+
+    def decode(self, body):
+        body = bytes(body)
+        if body[:2] != BINARY_MAGIC:
+            raise ValueError("not a binary walk generator message")
+        if body[2] != BINARY_VERSION:
+            raise ValueError(f"unsupported binary schema version {body[2]}")
+        value, _ = self._decode_value(body, 3)
+        return value
+
+    def _decode_value(self, body, offset):
+        tag = body[offset]
+        offset += 1
+        if tag == TAG_FLOAT64:
+            return FLOAT64.unpack_from(body, offset)[0], offset + 8
+        if tag == TAG_STR:
+            length = UINT32.unpack_from(body, offset)[0]
+            offset += 4
+            return body[offset:offset + length].decode(), offset + length
+        if tag == TAG_DICT:
+            length = UINT32.unpack_from(body, offset)[0]
+            offset += 4
+            value = dict()
+            for _ in range(length):
+                idx = body[offset]
+                offset += 1
+                if idx == KEY_STR:
+                    key_length = UINT32.unpack_from(body, offset)[0]
+                    offset += 4
+                    key = body[offset:offset + key_length].decode()
+                    offset += key_length
+                else:
+                    key = KEYS_V1[idx]
+                value[key], offset = self._decode_value(body, offset)
+            return value, offset
+        if tag == TAG_LIST:
+            length = UINT32.unpack_from(body, offset)[0]
+            offset += 4
+            value = []
+            for _ in range(length):
+                item, offset = self._decode_value(body, offset)
+                value.append(item)
+            return value, offset
+        if tag == TAG_NONE:
+            return None, offset
+        if tag == TAG_FALSE:
+            return False, offset
+        if tag == TAG_TRUE:
+            return True, offset
+        if tag == TAG_INT8:
+            return INT8.unpack_from(body, offset)[0], offset + 1
+        if tag == TAG_INT32:
+            return INT32.unpack_from(body, offset)[0], offset + 4
+        if tag == TAG_INT64:
+            return INT64.unpack_from(body, offset)[0], offset + 8
+        if tag == TAG_BYTES:
+            length = UINT32.unpack_from(body, offset)[0]
+            offset += 4
+            return body[offset:offset + length], offset + length
+        raise ValueError(f"unknown tag {tag}")
+
+
+CODECS = {
+    JSONCodec.name: JSONCodec,
+    FastJSONCodec.name: FastJSONCodec,
+    BinaryCodec.name: BinaryCodec
+}
+
+
+def get_codec(name):
+    """
+    codec by name
+    :param name: name of the codec, 'json', 'fast_json' or 'binary'
+    :return: codec instance
+    """
+    if name not in CODECS:
+        raise ValueError(f"unknown codec: {name}")
+    return CODECS[name]()
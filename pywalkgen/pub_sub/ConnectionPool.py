@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from aio_pika import connect_robust
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+DEFAULT_MAX_CONNECTIONS = 1
+DEFAULT_MAX_CHANNELS = 8
+
+# one pool per broker, user and event loop in this process
+_pools = dict()
+
+
+def get_connection_pool(eventloop, broker_info, credential_info):
+    """
+    process wide connection pool of a broker
+    :param eventloop: AsyncIO EventLoop
+    :param broker_info: broker attribute with keys 'address', 'port' and optionally 'max_connections' and
+                        'max_channels'
+    :param credential_info: credential attribute with keys 'username' and 'password'
+    :return: ConnectionPool
+    """
+    key = (broker_info["address"], broker_info["port"], credential_info["username"], id(eventloop))
+    if key not in _pools:
+        _pools[key] = ConnectionPool(eventloop=eventloop,
+                                     broker_info=broker_info,
+                                     credential_info=credential_info,
+                                     max_connections=broker_info.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+                                     max_channels=broker_info.get("max_channels", DEFAULT_MAX_CHANNELS))
+    return _pools[key]
+
+
+async def close_connection_pools():
+    """close the connections of all pools"""
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
+
+
+class ConnectionPool:
+    """Robust connections to one broker with a bounded set of channels shared by the PubSubAMQP instances.
+    Channels are opened on demand, spread over the connections, until max_channels are open. Then the least
+    borrowed channel is handed out. Exchanges are declared once per channel and cached.
+    """
+
+    def __init__(self, eventloop, broker_info, credential_info, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_channels=DEFAULT_MAX_CHANNELS):
+        """
+        Initializes the connection pool, connections are opened on the first acquire
+        :param eventloop: AsyncIO EventLoop
+        :param broker_info: broker attribute with keys 'address' and 'port'
+        :param credential_info: credential attribute with keys 'username' and 'password'
+        :param max_connections: maximum number of connections to the broker
+        :param max_channels: maximum number of channels over all connections
+        """
+        if max_connections <= 0 or max_channels <= 0:
+            raise ValueError("maximum number of connections and channels must be positive")
+        self.eventloop = eventloop
+        self.broker_info = broker_info
+        self.credential_info = credential_info
+        self.max_connections = max_connections
+        self.max_channels = max(max_channels, max_connections)
+        self.connections = []
+        # open channels with their number of borrowers and their connection
+        self.channels = []
+        self.borrowers = dict()
+        self.channel_connection = dict()
+        self.exchanges = dict()
+        self.lock = asyncio.Lock()
+
+    async def _connect(self):
+        logger.debug('Connecting the Broker: amqp://%s %s', self.broker_info["address"], self.broker_info["port"])
+        connection = await connect_robust(
+            login=self.credential_info["username"],
+            password=self.credential_info["password"],
+            host=self.broker_info["address"],
+            port=self.broker_info["port"],
+            loop=self.eventloop
+        )
+        self.connections.append(connection)
+        return connection
+
+    async def acquire(self):
+        """
+        borrow a channel, it must be given back with release
+        :return: robust channel
+        """
+        async with self.lock:
+            if len(self.channels) < self.max_channels:
+                if len(self.connections) < self.max_connections:
+                    connection = await self._connect()
+                else:
+                    # connection with the fewest channels
+                    connection = min(self.connections,
+                                     key=lambda c: sum(1 for ch in self.channels if self.channel_connection[ch] is c))
+                channel = await connection.channel()
+                self.channels.append(channel)
+                self.borrowers[channel] = 0
+                self.channel_connection[channel] = connection
+            else:
+                channel = min(self.channels, key=lambda ch: self.borrowers[ch])
+            self.borrowers[channel] += 1
+            return channel
+
+    async def release(self, channel):
+        """
+        give back a borrowed channel, channels and connections stay open for the next borrower
+        :param channel: channel returned by acquire
+        """
+        async with self.lock:
+            if channel in self.borrowers and self.borrowers[channel] > 0:
+                self.borrowers[channel] -= 1
+
+    async def declare_exchange(self, channel, name, exchange_type):
+        """
+        declare an exchange on a channel once
+        :param channel: channel returned by acquire
+        :param name: exchange name
+        :param exchange_type: aio_pika ExchangeType
+        :return: exchange
+        """
+        key = (id(channel), name)
+        if key not in self.exchanges:
+            self.exchanges[key] = await channel.declare_exchange(name, exchange_type)
+        return self.exchanges[key]
+
+    async def close(self):
+        """close all connections of the pool"""
+        async with self.lock:
+            for connection in self.connections:
+                await connection.close()
+            self.connections.clear()
+            self.channels.clear()
+            self.borrowers.clear()
+            self.channel_connection.clear()
+            self.exchanges.clear()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# what put does when the queue is full:
+#   block:       wait until the queue has room
+#   drop_oldest: drop the oldest queued message to make room
+#   drop_newest: drop the message being put
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+# seconds stop waits for the queued items to be sent
+DEFAULT_STOP_TIMEOUT = 5.0
+
+
+class PublishPipeline:
+    """Bounded queue between the simulation and the broker. A background task drains the queue and sends up to
+    in_flight messages concurrently, each send awaiting its publisher confirm. Failed sends are logged and
+    counted, they do not stop the simulation.
+    """
+
+    def __init__(self, send, queue_size=1024, policy='drop_oldest', in_flight=64):
+        """
+        Initializes the publish pipeline, the background task is started with start
+        :param send: coroutine function sending one queued item
+        :param queue_size: maximum number of queued items
+        :param policy: overflow policy, 'block', 'drop_oldest' or 'drop_newest'
+        :param in_flight: maximum number of concurrent sends
+        """
+        if policy not in OVERFLOW_POLICIES:
+            logger.error(f"Unknown overflow policy: {policy}")
+            raise AssertionError(f"Unknown overflow policy: {policy}")
+        if queue_size <= 0 or in_flight <= 0:
+            raise ValueError("queue size and number of messages in flight must be positive")
+        self.send = send
+        self.queue_size = queue_size
+        self.policy = policy
+        self.in_flight = in_flight
+        self.queue = deque()
+        self.condition = None
+        self.slots = None
+        self.pending = set()
+        self.task = None
+
+        # counters
+        self.enqueued = 0
+        self.published = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+
+    def start(self):
+        """start the background task, must be called from the running event loop"""
+        if self.task is None:
+            self.condition = asyncio.Condition()
+            self.slots = asyncio.Semaphore(self.in_flight)
+            self.task = asyncio.ensure_future(self._drain())
+
+    async def put(self, item):
+        """
+        queue an item for sending
+        :param item: item passed to send
+        :return: True if the item was queued, False if it was dropped
+        """
+        async with self.condition:
+            if len(self.queue) >= self.queue_size:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    self.queue.popleft()
+                    self.dropped += 1
+                else:
+                    await self.condition.wait_for(lambda: len(self.queue) < self.queue_size)
+            self.queue.append(item)
+            self.enqueued += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self.queue))
+            self.condition.notify_all()
+            return True
+
+    async def _drain(self):
+        while True:
+            await self.slots.acquire()
+            async with self.condition:
+                await self.condition.wait_for(lambda: len(self.queue) > 0)
+                item = self.queue.popleft()
+                self.condition.notify_all()
+            task = asyncio.ensure_future(self._send(item))
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+
+    async def _send(self, item):
+        try:
+            await self.send(item)
+            self.published += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error('Exception during pipelined publishing')
+            logger.error(e)
+        finally:
+            self.slots.release()
+
+    async def flush(self):
+        """wait until all queued items are sent"""
+        if self.task is None:
+            return
+        async with self.condition:
+            await self.condition.wait_for(lambda: len(self.queue) == 0)
+        if len(self.pending) > 0:
+            await asyncio.wait(list(self.pending))
+
+    async def stop(self, flush=True, timeout=DEFAULT_STOP_TIMEOUT):
+        """
+        stop the background task, items which are not sent are counted as dropped
+        :param flush: send the queued items first, they are discarded otherwise
+        :param timeout: seconds to wait for the queued items to be sent, None waits until all are sent
+        """
+        if self.task is None:
+            return
+        if flush:
+            try:
+                await asyncio.wait_for(self.flush(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f'stop: {len(self.queue) + len(self.pending)} items not sent within {timeout} s')
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        pending = list(self.pending)
+        for task in pending:
+            task.cancel()
+        if len(pending) > 0:
+            await asyncio.wait(pending)
+        # cancelled sends are neither published nor failed
+        self.dropped += len(self.queue) + sum(1 for task in pending if task.cancelled())
+        self.queue.clear()
+
+    def get_stats(self):
+        """
+        pipeline counters
+        :return: dict with queue depth, maximum queue depth, sends in flight and the number of enqueued, published,
+                 dropped and failed items
+        """
+        return {
+            "queue_depth": len(self.queue),
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": len(self.pending),
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
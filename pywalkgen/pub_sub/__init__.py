@@ -2,7 +2,23 @@ from __future__ import generator_stop
 from __future__ import annotations
 
 from .AMQP import PubSubAMQP
+from .ConnectionPool import ConnectionPool, get_connection_pool, close_connection_pools
+from .Batch import pack_batches, unpack_batch
+from .Pipeline import PublishPipeline, OVERFLOW_POLICIES
+from .Codec import JSONCodec, FastJSONCodec, BinaryCodec, CODECS, get_codec
 
 __all__ = [
-    'PubSubAMQP'
+    'PubSubAMQP',
+    'ConnectionPool',
+    'get_connection_pool',
+    'close_connection_pools',
+    'pack_batches',
+    'PublishPipeline',
+    'OVERFLOW_POLICIES',
+    'unpack_batch',
+    'JSONCodec',
+    'FastJSONCodec',
+    'BinaryCodec',
+    'CODECS',
+    'get_codec'
 ]
@@ -0,0 +1,105 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+def seed_sequence(seed, *names):
+    """
+    seed sequence of a named random stream derived from the run seed
+    :param seed: run seed, fresh entropy is used if None
+    :param names: names of the stream, e.g. the walker id and the purpose of the stream
+    :return: numpy SeedSequence
+    """
+    # the length of every name is part of the key, so no two lists of names give the same key
+    spawn_key = []
+    for name in names:
+        data = str(name).encode('utf-8')
+        spawn_key.append(len(data))
+        spawn_key.extend(data)
+    return np.random.SeedSequence(entropy=seed, spawn_key=tuple(spawn_key))
+
+
+class RandomStream:
+    """Uniform and normal draws of a seeded numpy Generator, taken from buffered blocks.
+    Uniform and normal values come from separate generators, so the n-th uniform and the n-th normal
+    value of a stream are the same whichever block size is used and however the draws are mixed.
+    Single values and blocks of values can be taken in any order.
+    """
+
+    def __init__(self, seed_sequence=None, block_size=256):
+        """
+        Initializes the random stream
+        :param seed_sequence: numpy SeedSequence, see seed_sequence. Fresh entropy is used if not given
+        :param block_size: number of values drawn at once per kind
+        """
+        if seed_sequence is None:
+            seed_sequence = np.random.SeedSequence()
+        uniform_seed, normal_seed = seed_sequence.spawn(2)
+        self.uniform_generator = np.random.default_rng(uniform_seed)
+        self.normal_generator = np.random.default_rng(normal_seed)
+        self.block_size = block_size
+        self.uniform_block = []
+        self.uniform_index = 0
+        self.normal_block = []
+        self.normal_index = 0
+
+    def uniform(self, low=0.0, high=1.0):
+        """
+        next uniform value, computed as random.uniform does
+        :param low: lower bound
+        :param high: upper bound
+        :return: float in [low, high)
+        """
+        if self.uniform_index >= len(self.uniform_block):
+            self.uniform_block = self.uniform_generator.random(self.block_size).tolist()
+            self.uniform_index = 0
+        value = self.uniform_block[self.uniform_index]
+        self.uniform_index += 1
+        return low + ((high - low) * value)
+
+    def normal(self, loc=0.0, scale=1.0):
+        """
+        next normal value, computed as numpy Generator.normal does
+        :param loc: mean
+        :param scale: standard deviation
+        :return: float
+        """
+        if self.normal_index >= len(self.normal_block):
+            self.normal_block = self.normal_generator.standard_normal(self.block_size).tolist()
+            self.normal_index = 0
+        value = self.normal_block[self.normal_index]
+        self.normal_index += 1
+        return loc + (scale * value)
+
+    def uniforms(self, size):
+        """
+        next uniform values in [0, 1), the buffered ones first
+        :param size: number of values
+        :return: array of values
+        """
+        values = np.empty(size, dtype=np.float64)
+        taken = self.uniform_block[self.uniform_index:self.uniform_index + size]
+        values[:len(taken)] = taken
+        self.uniform_index += len(taken)
+        values[len(taken):] = self.uniform_generator.random(size - len(taken))
+        return values
+
+    def normals(self, size):
+        """
+        next standard normal values, the buffered ones first
+        :param size: number of values
+        :return: array of values
+        """
+        values = np.empty(size, dtype=np.float64)
+        taken = self.normal_block[self.normal_index:self.normal_index + size]
+        values[:len(taken)] = taken
+        self.normal_index += len(taken)
+        values[len(taken):] = self.normal_generator.standard_normal(size - len(taken))
+        return values
@@ -0,0 +1,9 @@
+from __future__ import generator_stop
+from __future__ import annotations
+
+from .RandomStream import RandomStream, seed_sequence
+
+__all__ = [
+    'RandomStream',
+    'seed_sequence'
+]
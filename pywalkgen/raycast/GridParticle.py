@@ -0,0 +1,45 @@
+import math
+import logging
+import numpy as np
+from .Particle import Particle
+from .View import View
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+class GridParticle(Particle):
+    """Particle which casts its rays through the uniform grid of the scene,
+    testing only the segments in the cells a ray crosses.
+    """
+
+    def scan_scene(self, scene, indices=None):
+        rays = self.rays if indices is None else [self.rays[idx] for idx in indices]
+        distances = []
+        closest = []
+        contact_xs = []
+        contact_ys = []
+        for ray in rays:
+            hit = scene.grid.cast(ray, max_distance=self.max_range)
+            if hit is None:
+                distances.append(math.nan)
+                closest.append(-1)
+                contact_xs.append(math.nan)
+                contact_ys.append(math.nan)
+            else:
+                rank, contact_x, contact_y, distance = hit
+                distances.append(distance)
+                closest.append(scene.segment_index(rank))
+                contact_xs.append(contact_x)
+                contact_ys.append(contact_y)
+        return View(angle=self.angles if indices is None else self.angles[indices],
+                    distance=np.array(distances, dtype=np.float64),
+                    obstacle=np.array(closest, dtype=np.intp),
+                    contact_x=np.array(contact_xs, dtype=np.float64),
+                    contact_y=np.array(contact_ys, dtype=np.float64),
+                    descriptions=scene.get_descriptions())
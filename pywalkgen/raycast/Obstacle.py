@@ -1,7 +1,7 @@
 import logging
 import sys
 import traceback
-from .Point import LineSegment, Dot
+from .Point import Point, LineSegment, Dot
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -16,6 +16,7 @@ class Obstacle:
     def __init__(self,id,corner_points,obstacle_shape,obstacle_type,description=""):
         try:
             assert type(corner_points) == tuple,"Corner point list must be a list of Points"
+            assert all(type(point) == Point for point in corner_points),"Corner points must be of class Point"
             self.id = id
             self.num_of_points = len(corner_points)
             self.corner_points = corner_points
@@ -55,19 +56,30 @@ class Obstacle:
     def update(self,corner_points,shape=None):
         try:
             assert type(corner_points) == tuple,"Corner point list must be a list of Points"
+            assert all(type(point) == Point for point in corner_points),"Corner points must be of class Point"
             self.corner_points = corner_points
             self.num_of_points = len(corner_points)
             if shape is not None:
                 self.shape = shape
-            self.line_segments.clear()
             if self.shape == 'polygon':
-                for i in range(0,self.num_of_points - 1):
-                    self.line_segments.append(LineSegment(point1=corner_points[i],point2=corner_points[i + 1]))
-                self.line_segments.append(LineSegment(point1=corner_points[self.num_of_points - 1],point2=corner_points[0],description=self.description))
-            elif self.shape == 'line':
-                self.line_segments.append(LineSegment(point1=corner_points[0],point2=corner_points[1],description=self.description))
+                num_of_segments = self.num_of_points
             else:
-                self.line_segments.append(LineSegment(point1=corner_points[0],point2=corner_points[0],description=self.description))
+                num_of_segments = 1
+            # the line segments are reused and overwritten in place, so updates do not allocate new segments
+            del self.line_segments[num_of_segments:]
+            while len(self.line_segments) < num_of_segments:
+                self.line_segments.append(LineSegment(point1=corner_points[0], point2=corner_points[0],
+                                                      description=self.description))
+            for idx,segment in enumerate(self.line_segments):
+                if self.shape == 'polygon':
+                    segment.a = corner_points[idx]
+                    segment.b = corner_points[(idx + 1) % self.num_of_points]
+                elif self.shape == 'line':
+                    segment.a = corner_points[0]
+                    segment.b = corner_points[1]
+                else:
+                    segment.a = corner_points[0]
+                    segment.b = corner_points[0]
         except AssertionError as e:
             logging.critical(e)
             exc_type,exc_value,exc_traceback = sys.exc_info()
@@ -1,7 +1,9 @@
 import math
 import logging
+import numpy as np
 from .Point import Point
 from .Ray import Ray
+from .View import View
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -12,66 +14,215 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+def ray_angles(num_of_rays):
+    """
+    angles of rays evenly spread around a particle
+    :param num_of_rays: number of rays
+    :return: list of angles in degrees, integral if 360 is a multiple of the number of rays
+    """
+    if 360 % num_of_rays == 0:
+        return [i * (360 // num_of_rays) for i in range(0,num_of_rays)]
+    return [i * 360 / num_of_rays for i in range(0,num_of_rays)]
+
+
+# ray tables shared by all particles, by number of rays
+_ray_tables = dict()
+
+
+def ray_table(num_of_rays):
+    """
+    angles and directions of rays evenly spread around a particle, shared by all particles with the same number
+    of rays. Directions are computed like Ray computes them, so all engines see the same rays bit for bit
+    :param num_of_rays: number of rays
+    :return: tuple of read only angle, direction x and direction y arrays and the list of direction Points
+    """
+    if num_of_rays not in _ray_tables:
+        angles = ray_angles(num_of_rays)
+        directions = [Point(x=math.cos(math.radians(angle)),y=math.sin(math.radians(angle))) for angle in angles]
+        table = (np.array(angles),
+                 np.array([direction.x for direction in directions],dtype=np.float64),
+                 np.array([direction.y for direction in directions],dtype=np.float64))
+        for array in table:
+            array.flags.writeable = False
+        _ray_tables[num_of_rays] = table + (directions,)
+    return _ray_tables[num_of_rays]
+
+
 class Particle:
-    def __init__(self,particle_id,x,y,size_in_pixel=1):
+    def __init__(self,particle_id,x,y,size_in_pixel=1,num_of_rays=360,max_range=None):
+        if num_of_rays <= 0:
+            raise ValueError("number of rays must be positive")
+        if max_range is not None and max_range <= 0:
+            raise ValueError("maximum range must be positive")
         self.id = particle_id
+        self.max_range = max_range
         self.pos = Point(x=x,y=y)
         self.size_in_pixel = size_in_pixel
-        self.rays = []
-        for i in range(0,360):
-            self.rays.append(Ray(origin=self.pos,angle=i))
+        self.num_of_rays = num_of_rays
+        self.resolution = 360 / num_of_rays
+        # the ray table is shared, a particle keeps only its position and, once used, its rays
+        self.angles, self.dir_x, self.dir_y, self.directions = ray_table(num_of_rays)
+        self._rays = None
+
+    @property
+    def rays(self):
+        """
+        rays starting at the particle position, created on first use
+        :return: list of Ray
+        """
+        if self._rays is None:
+            self._rays = [Ray(origin=self.pos,angle=angle,direction=direction)
+                          for angle,direction in zip(self.angles.tolist(),self.directions)]
+        return self._rays
 
     def update(self,x,y):
         self.pos.x = x
         self.pos.y = y
 
+    def look_scene(self,scene,indices=None):
+        """
+        look around in a scene
+        :param scene: StaticMap
+        :param indices: indices of the rays to be cast (optional), all rays are cast if not given
+        :return: list of views
+        """
+        return self.scan_scene(scene,indices=indices).to_list()
+
+    def scan_scene(self,scene,indices=None):
+        """
+        look around in a scene, engines override this to use the acceleration structures of the scene
+        :param scene: StaticMap
+        :param indices: indices of the rays to be cast (optional), all rays are cast if not given
+        :return: View, obstacle indices refer to the segments of the scene
+        """
+        return self.scan(segments=scene.get_segments(),indices=indices,descriptions=scene.get_descriptions())
+
+    def look_adaptive(self,scene,heading,sector,coarse_step,refine_distance):
+        """
+        look densely in a sector around the heading and coarsely elsewhere, see scan_adaptive
+        :return: list of views ordered by angle, covering only the rays which were cast
+        """
+        return self.scan_adaptive(scene=scene,heading=heading,sector=sector,coarse_step=coarse_step,
+                                  refine_distance=refine_distance).to_list()
+
+    def scan_adaptive(self,scene,heading,sector,coarse_step,refine_distance):
+        """
+        look densely in a sector around the heading and coarsely elsewhere. The gaps of the coarse sweep
+        next to hits closer than refine_distance are filled with the remaining rays
+        :param scene: StaticMap
+        :param heading: angle in degrees the sector is centered on
+        :param sector: width of the densely sampled sector in degrees
+        :param coarse_step: one out of coarse_step rays is cast outside the sector
+        :param refine_distance: distance below which coarse hits are refined
+        :return: View ordered by angle, covering only the rays which were cast
+        """
+        num_of_rays = self.num_of_rays
+        center = round(heading / self.resolution)
+        half_width = int((sector / 2) / self.resolution)
+        dense = set((center + offset) % num_of_rays for offset in range(-half_width,half_width + 1))
+        coarse = [idx for idx in range(0,num_of_rays,coarse_step) if idx not in dense]
+        indices = np.array(sorted(dense) + coarse,dtype=np.intp)
+        view = self.scan_scene(scene,indices=indices)
+
+        cast = set(indices.tolist())
+        refine = set()
+        with np.errstate(invalid='ignore'):
+            near = view.distance[len(dense):] < refine_distance
+        for idx in indices[len(dense):][near].tolist():
+            for offset in range(1 - coarse_step,coarse_step):
+                neighbour = (idx + offset) % num_of_rays
+                if neighbour not in cast:
+                    refine.add(neighbour)
+        if len(refine) > 0:
+            refined = np.array(sorted(refine),dtype=np.intp)
+            return view.merge(self.scan_scene(scene,indices=refined),
+                              order=np.argsort(np.concatenate((indices,refined))))
+        return view.select(np.argsort(indices))
+
     def look(self,segments):
+        return self.scan(segments=segments).to_list()
+
+    def segments_in_range(self,segments):
+        """
+        segments whose bounding box reaches into the range circle of the particle
+        :param segments: list of line segments
+        :return: list of segment indices, all indices if the range is unlimited
+        """
+        if self.max_range is None:
+            return range(0,len(segments))
+        x = self.pos.x
+        y = self.pos.y
+        limit = self.max_range ** 2
         result = []
-        for ray in self.rays:
-            closest_obstacle = None
-            closest_distance = None
-            contact_point = None
-            for obstacle in segments:
-                pt = ray.cast(obstacle)
-                if pt is not None:
-                    distance = abs(math.sqrt(((self.pos.x - pt.x) ** 2) + ((self.pos.y - pt.y) ** 2)))
-                    if closest_obstacle is None:
-                        closest_obstacle = obstacle
-                        closest_distance = distance
-                        contact_point = pt
-                    else:
-                        if distance < closest_distance:
-                            closest_obstacle = obstacle
-                            closest_distance = distance
-                            contact_point = pt
-            result.append({
-                'contact_point':[contact_point.x,contact_point.y]if contact_point is not None else None,
-                "angle":ray.angle,
-                "obstacle":closest_obstacle.description if closest_obstacle is not None else None,
-                "distance":closest_distance
-            })
+        for idx,segment in enumerate(segments):
+            dx = max(min(segment.a.x,segment.b.x) - x,0,x - max(segment.a.x,segment.b.x))
+            dy = max(min(segment.a.y,segment.b.y) - y,0,y - max(segment.a.y,segment.b.y))
+            if (dx ** 2) + (dy ** 2) <= limit:
+                result.append(idx)
         return result
 
+    def scan(self,segments,indices=None,descriptions=None):
+        """
+        cast rays against a list of segments
+        :param segments: list of line segments
+        :param indices: indices of the rays to be cast (optional), all rays are cast if not given
+        :param descriptions: descriptions of the segments (optional), taken from the segments if not given
+        :return: View, obstacle indices refer to segments
+        """
+        if descriptions is None:
+            descriptions = [segment.description for segment in segments]
+        rays = self.rays if indices is None else [self.rays[idx] for idx in indices]
+        in_range = self.segments_in_range(segments)
+        x = self.pos.x
+        y = self.pos.y
+        distances = []
+        closest = []
+        contact_xs = []
+        contact_ys = []
+        for ray in rays:
+            closest_obstacle = -1
+            closest_distance = math.nan
+            contact_x = math.nan
+            contact_y = math.nan
+            for idx in in_range:
+                obstacle = segments[idx]
+                t = ray.intersect(obstacle)
+                if t is not None:
+                    pt_x = obstacle.a.x + (t * (obstacle.b.x - obstacle.a.x))
+                    pt_y = obstacle.a.y + (t * (obstacle.b.y - obstacle.a.y))
+                    distance = abs(math.sqrt(((x - pt_x) ** 2) + ((y - pt_y) ** 2)))
+                    if self.max_range is not None and distance > self.max_range:
+                        continue
+                    if closest_obstacle < 0 or distance < closest_distance:
+                        closest_obstacle = idx
+                        closest_distance = distance
+                        contact_x = pt_x
+                        contact_y = pt_y
+            distances.append(closest_distance)
+            closest.append(closest_obstacle)
+            contact_xs.append(contact_x)
+            contact_ys.append(contact_y)
+        return View(angle=self.angles if indices is None else self.angles[indices],
+                    distance=np.array(distances,dtype=np.float64),
+                    obstacle=np.array(closest,dtype=np.intp),
+                    contact_x=np.array(contact_xs,dtype=np.float64),
+                    contact_y=np.array(contact_ys,dtype=np.float64),
+                    descriptions=descriptions)
+
+    def rays_between(self,start_angle,stop_angle):
+        """
+        indices of the rays with start_angle <= angle <= stop_angle, found without visiting the other rays
+        :param start_angle: start angle in degrees
+        :param stop_angle: stop angle in degrees
+        :return: range of ray indices
+        """
+        first = max(0,math.ceil(start_angle / self.resolution - 1e-9))
+        last = min(self.num_of_rays - 1,math.floor(stop_angle / self.resolution + 1e-9))
+        return range(first,last + 1)
+
     def look_at_angle(self,segments,start_angle,stop_angle):
-        result = []
-        for ray in self.rays:
-            if start_angle <= ray.angle <= stop_angle:
-                closest_obstacle = None
-                closest_distance = None
-                for obstacle in segments:
-                    pt = ray.cast(obstacle)
-                    if pt is not None:
-                        distance = abs(math.sqrt(((self.pos.x - pt.x) ** 2) + ((self.pos.y - pt.y) ** 2)))
-                        if closest_obstacle is None:
-                            closest_obstacle = obstacle
-                            closest_distance = distance
-                        else:
-                            if distance < closest_distance:
-                                closest_obstacle = obstacle
-                                closest_distance = distance
-            result.append({
-                "angle":ray.angle,
-                "obstacle":closest_obstacle.description if closest_obstacle is not None else None,
-                "distance":closest_distance
-            })
+        indices = self.rays_between(start_angle=start_angle,stop_angle=stop_angle)
+        result = self.scan(segments=segments,indices=np.arange(indices.start,indices.stop)).to_list()
+        for item in result:
+            del item['contact_point']
         return result
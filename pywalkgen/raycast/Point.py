@@ -9,53 +9,30 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+# geometry primitives are slotted and do not validate their arguments, they are created in the innermost loops.
+# Points coming from configuration or telemetry are validated where they enter, see Obstacle.
+
+
 class Point:
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
-        try:
-            self.x = x
-            self.y = y
-        except AssertionError as e:
-            logging.critical(e)
-            exit()
-        except ValueError as e:
-            logging.critical(e)
-            exit()
-        except Exception as e:
-            logging.critical(e)
-            exit()
+        self.x = x
+        self.y = y
 
 
 class LineSegment:
+    __slots__ = ('a', 'b', 'description')
+
     def __init__(self, point1, point2, description=""):
-        try:
-            assert type(point1) == Point, "point1 must be of class Point"
-            assert type(point2) == Point, "point2 must be of class Point"
-            self.a = point1
-            self.b = point2
-            self.description = description
-        except AssertionError as e:
-            logging.critical(e)
-            exit()
-        except ValueError as e:
-            logging.critical(e)
-            exit()
-        except Exception as e:
-            logging.critical(e)
-            exit()
+        self.a = point1
+        self.b = point2
+        self.description = description
 
 
 class Dot:
+    __slots__ = ('a', 'description')
+
     def __init__(self, point, description=""):
-        try:
-            assert type(point) == Point, "point1 must be of class Point"
-            self.a = point
-            self.description = description
-        except AssertionError as e:
-            logging.critical(e)
-            exit()
-        except ValueError as e:
-            logging.critical(e)
-            exit()
-        except Exception as e:
-            logging.critical(e)
-            exit()
+        self.a = point
+        self.description = description
@@ -12,13 +12,28 @@ logger.addHandler(handler)
 
 
 class Ray:
-    def __init__(self,origin,angle):
-        if type(origin) == Point:
-            self.pos = origin
-            self.angle = angle
-            self.dir = Point(x=math.cos(math.radians(angle)),y=math.sin(math.radians(angle)))
+    __slots__ = ('pos', 'angle', 'dir')
 
-    def cast(self,segment):
+    def __init__(self,origin,angle,direction=None):
+        """
+        Initializes a ray
+        :param origin: start Point, shared with the particle
+        :param angle: angle in degrees
+        :param direction: unit direction Point (optional), computed from the angle if not given. It may be shared
+                          and must not be modified
+        """
+        self.pos = origin
+        self.angle = angle
+        if direction is None:
+            direction = Point(x=math.cos(math.radians(angle)),y=math.sin(math.radians(angle)))
+        self.dir = direction
+
+    def intersect(self,segment):
+        """
+        intersect the ray with a segment without allocating the contact point
+        :param segment: line segment
+        :return: position t along the segment (contact point is a + t * (b - a)), None if the ray misses it
+        """
         x1 = segment.a.x
         y1 = segment.a.y
         x2 = segment.b.x
@@ -41,8 +56,11 @@ class Ray:
         u = -(u1 - u2) / den
 
         if 0 < t < 1 and u > 0:
-            ptx = x1 + (t * (x2 - x1))
-            pty = y1 + (t * (y2 - y1))
-            pt = Point(ptx,pty)
-            return pt
+            return t
         return None
+
+    def cast(self,segment):
+        t = self.intersect(segment)
+        if t is None:
+            return None
+        return Point(segment.a.x + (t * (segment.b.x - segment.a.x)),segment.a.y + (t * (segment.b.y - segment.a.y)))
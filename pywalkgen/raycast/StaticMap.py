@@ -1,7 +1,10 @@
 import logging
+import math
 import sys
+import numpy as np
 from .Obstacle import Obstacle
 from .Point import Point
+from .UniformGrid import UniformGrid
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -11,6 +14,27 @@ formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(messa
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# maps shared by the walkers of this process, by map id
+_shared_maps = dict()
+
+
+def get_static_map(config_file):
+    """
+    map shared by all walkers walking in it. Walkers keep only their particles, the obstacles, including the robot
+    arms moved by telemetry, the acceleration structures and the distance fields exist once per map id
+    :param config_file: map configuration with key 'id'
+    :return: StaticMap
+    """
+    map_id = config_file["id"]
+    if map_id not in _shared_maps:
+        _shared_maps[map_id] = StaticMap(config_file=config_file)
+    return _shared_maps[map_id]
+
+
+def clear_static_maps():
+    """forget the shared maps, e.g. before the configuration is reloaded"""
+    _shared_maps.clear()
+
 
 class StaticMap:
     def __init__(self, config_file):
@@ -56,6 +80,26 @@ class StaticMap:
                                                obstacle_shape='line',
                                                obstacle_type='dynamic',
                                                description="robot_" + robot['id'] + "_elbow_wrist"))
+
+            # contiguous coordinate buffer of all segments, every obstacle owns a fixed slot which is
+            # overwritten in place on updates. version is bumped on every change for downstream caches
+            self.segments = []
+            self.descriptions = []
+            self.slots = dict()
+            self.segment_buffer = np.empty((0, 4), dtype=np.float64)
+            self.dynamic_segments = []
+            self.dynamic_rows = np.empty(0, dtype=np.intp)
+            self.static_rows = np.empty(0, dtype=np.intp)
+            self.version = 0
+            # coordinates of the dynamic segments, gathered again once the version changes
+            self.packed_dynamic_segments = None
+            self.packed_dynamic_version = None
+            self._pack()
+
+            # spatial index over all segments, cell size is derived from the map when not configured
+            self.grid = UniformGrid(cell_size=config_file.get("grid_cell_size", self._default_cell_size()))
+            for order, obstacle in enumerate(self.obstacles):
+                self.grid.insert(key=obstacle, segments=obstacle.line_segments, order=order)
         except AssertionError as e:
             logging.critical(e)
             sys.exit()
@@ -63,20 +107,131 @@ class StaticMap:
             logging.critical(e)
             sys.exit()
 
+    def _default_cell_size(self):
+        """
+        cell size giving about one segment per cell
+        :return: cell size
+        """
+        segments = self.get_segments()
+        if len(segments) == 0:
+            return 1.0
+        xs = [point.x for segment in segments for point in (segment.a, segment.b)]
+        ys = [point.y for segment in segments for point in (segment.a, segment.b)]
+        extent = max(max(xs) - min(xs), max(ys) - min(ys), 1.0)
+        return extent / math.ceil(math.sqrt(len(segments)))
+
+    def _pack(self):
+        """
+        assign slots to all obstacles and fill the segment buffer
+        :return:
+        """
+        self.segments = []
+        self.slots = dict()
+        self.dynamic_segments = []
+        dynamic_rows = []
+        static_rows = []
+        for obstacle in self.obstacles:
+            self.slots[obstacle] = (len(self.segments), len(obstacle.line_segments))
+            rows = range(len(self.segments), len(self.segments) + len(obstacle.line_segments))
+            if obstacle.type != 'static':
+                dynamic_rows.extend(rows)
+                self.dynamic_segments.extend(obstacle.line_segments)
+            else:
+                static_rows.extend(rows)
+            self.segments.extend(obstacle.line_segments)
+        self.descriptions = [segment.description for segment in self.segments]
+        self.dynamic_rows = np.array(dynamic_rows, dtype=np.intp)
+        self.static_rows = np.array(static_rows, dtype=np.intp)
+        self.segment_buffer = np.empty((len(self.segments), 4), dtype=np.float64)
+        for obstacle in self.obstacles:
+            self._write_slot(obstacle)
+        self.version += 1
+
+    def _write_slot(self, obstacle):
+        """
+        overwrite the slot of an obstacle with the coordinates of its segments
+        :param obstacle: obstacle whose segments fit its slot
+        :return:
+        """
+        start, count = self.slots[obstacle]
+        buffer = self.segment_buffer
+        for idx, segment in enumerate(obstacle.line_segments):
+            row = buffer[start + idx]
+            row[0] = segment.a.x
+            row[1] = segment.a.y
+            row[2] = segment.b.x
+            row[3] = segment.b.y
+
     def update(self, obstacle_id, corner_points, shape=None):
         try:
             assert type(corner_points) == tuple, "Corner points must be tuple of Points"
             for idx, obstacle in enumerate(self.obstacles):
                 if obstacle.id == obstacle_id:
                     obstacle.update(corner_points=corner_points, shape=shape)
+                    if len(obstacle.line_segments) == self.slots[obstacle][1]:
+                        self._write_slot(obstacle)
+                        self.version += 1
+                    else:
+                        # the obstacle changed its number of segments, slots are reassigned
+                        self._pack()
+                    self.grid.update(key=obstacle, segments=obstacle.line_segments)
                     break
         except Exception as e:
             logging.critical(e)
             sys.exit()
 
     def get_segments(self):
-        segments = []
-        for obstacle in self.obstacles:
-            for segment in obstacle.line_segments:
-                segments.append(segment)
-        return segments
+        """
+        segments of all obstacles in slot order, the list is kept by the map and must not be modified
+        :return: list of line segments
+        """
+        return self.segments
+
+    def get_descriptions(self):
+        """
+        descriptions of the segments in slot order, the list is kept by the map and must not be modified
+        :return: list of descriptions
+        """
+        return self.descriptions
+
+    def segment_index(self, rank):
+        """
+        slot order index of a segment registered in the grid
+        :param rank: tuple (obstacle order, segment index within the obstacle), see UniformGrid.insert
+        :return: index into get_segments
+        """
+        order, idx = rank
+        return self.slots[self.obstacles[order]][0] + idx
+
+    def get_static_segments(self):
+        """
+        segments of the obstacles which never move, in slot order (see static_rows)
+        :return: list of line segments
+        """
+        return [segment for obstacle in self.obstacles if obstacle.type == 'static'
+                for segment in obstacle.line_segments]
+
+    def get_dynamic_segments(self):
+        """
+        segments of the obstacles updated at run time, the list is kept by the map and must not be modified
+        :return: list of line segments
+        """
+        return self.dynamic_segments
+
+    def get_packed_dynamic_segments(self):
+        """
+        coordinates of the segments of the obstacles updated at run time, gathered from the segment buffer once per
+        version. The array is kept by the map and must not be modified
+        :return: array of shape (number of dynamic segments, 4)
+        """
+        if self.packed_dynamic_version != self.version:
+            self.packed_dynamic_segments = self.segment_buffer[self.dynamic_rows]
+            self.packed_dynamic_version = self.version
+        return self.packed_dynamic_segments
+
+    def get_packed_segments(self):
+        """
+        coordinates of all segments in slot order, the buffer is kept by the map and must not be modified
+        :return: array of shape (number of segments, 4) holding x1, y1, x2, y2 per row
+        """
+        return self.segment_buffer
@@ -0,0 +1,179 @@
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# tolerance used when rasterizing segments into cells, keeps segments on cell borders in both cells
+EPSILON = 1e-9
+
+
+class UniformGrid:
+    """Uniform grid over line segments, rays are traversed cell by cell (DDA)
+    and only tested against the segments registered in the cells they cross.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Initializes an empty grid
+        :param cell_size: edge length of a square cell
+        """
+        if cell_size <= 0:
+            raise ValueError("cell size must be positive")
+        self.cell_size = cell_size
+        self.cells = dict()
+        self.entries = dict()
+        self.min_cell = None
+        self.max_cell = None
+
+    def _cells_of(self, segment):
+        """
+        cells crossed by a segment (supercover rasterization)
+        :param segment: line segment
+        :return: list of (column, row) cells
+        """
+        cs = self.cell_size
+        x1, y1, x2, y2 = segment.a.x, segment.a.y, segment.b.x, segment.b.y
+        y_low, y_high = min(y1, y2), max(y1, y2)
+        cells = []
+        for row in range(math.floor((y_low - EPSILON) / cs), math.floor((y_high + EPSILON) / cs) + 1):
+            if y1 == y2:
+                x_low, x_high = min(x1, x2), max(x1, x2)
+            else:
+                row_low = max(row * cs, y_low)
+                row_high = min((row + 1) * cs, y_high)
+                x_at_low = x1 + (row_low - y1) * (x2 - x1) / (y2 - y1)
+                x_at_high = x1 + (row_high - y1) * (x2 - x1) / (y2 - y1)
+                x_low, x_high = min(x_at_low, x_at_high), max(x_at_low, x_at_high)
+            for column in range(math.floor((x_low - EPSILON) / cs), math.floor((x_high + EPSILON) / cs) + 1):
+                cells.append((column, row))
+        return cells
+
+    def insert(self, key, segments, order):
+        """
+        register the segments of one obstacle
+        :param key: obstacle the segments belong to
+        :param segments: list of line segments
+        :param order: rank of the obstacle in the scene, used to break ties between equally distant hits
+        :return:
+        """
+        registered = []
+        for idx, segment in enumerate(segments):
+            entry = ((order, idx), segment)
+            for cell in self._cells_of(segment):
+                self.cells.setdefault(cell, []).append(entry)
+                registered.append((cell, entry))
+                if self.min_cell is None:
+                    self.min_cell = list(cell)
+                    self.max_cell = list(cell)
+                else:
+                    self.min_cell[0] = min(self.min_cell[0], cell[0])
+                    self.min_cell[1] = min(self.min_cell[1], cell[1])
+                    self.max_cell[0] = max(self.max_cell[0], cell[0])
+                    self.max_cell[1] = max(self.max_cell[1], cell[1])
+        self.entries[key] = (order, registered)
+
+    def remove(self, key):
+        """
+        unregister the segments of one obstacle
+        :param key: obstacle the segments belong to
+        :return: rank of the removed obstacle, None if it was not registered
+        """
+        if key not in self.entries:
+            return None
+        order, registered = self.entries.pop(key)
+        for cell, entry in registered:
+            bucket = self.cells[cell]
+            bucket.remove(entry)
+            if len(bucket) == 0:
+                del self.cells[cell]
+        return order
+
+    def update(self, key, segments):
+        """
+        re-insert the segments of an obstacle which changed.
+        The occupied cell range only grows, which keeps the update cheap.
+        :param key: obstacle the segments belong to
+        :param segments: new list of line segments
+        :return:
+        """
+        order = self.remove(key)
+        self.insert(key=key, segments=segments, order=order if order is not None else len(self.entries))
+
+    def cast(self, ray, max_distance=None):
+        """
+        nearest hit of a ray, visiting cells in the order the ray crosses them
+        :param ray: ray to be cast
+        :param max_distance: hits further away are ignored and cells beyond it are not visited (optional)
+        :return: tuple (rank, contact x, contact y, distance) of the nearest hit, None if nothing is hit.
+                 The rank (obstacle order, segment index within the obstacle) identifies the segment
+        """
+        if self.min_cell is None:
+            return None
+        cs = self.cell_size
+        x = ray.pos.x
+        y = ray.pos.y
+        dx = ray.dir.x
+        dy = ray.dir.y
+        column = math.floor(x / cs)
+        row = math.floor(y / cs)
+
+        step_column = 1 if dx > 0 else -1
+        step_row = 1 if dy > 0 else -1
+        t_max_x = (((column + (dx > 0)) * cs) - x) / dx if dx != 0 else math.inf
+        t_max_y = (((row + (dy > 0)) * cs) - y) / dy if dy != 0 else math.inf
+        t_delta_x = cs / abs(dx) if dx != 0 else math.inf
+        t_delta_y = cs / abs(dy) if dy != 0 else math.inf
+
+        min_column, min_row = self.min_cell
+        max_column, max_row = self.max_cell
+        tested = set()
+        best = None
+        best_distance = None
+        best_x = None
+        best_y = None
+        best_rank = None
+        while True:
+            for rank, segment in self.cells.get((column, row), ()):
+                if rank in tested:
+                    continue
+                tested.add(rank)
+                t = ray.intersect(segment)
+                if t is not None:
+                    pt_x = segment.a.x + (t * (segment.b.x - segment.a.x))
+                    pt_y = segment.a.y + (t * (segment.b.y - segment.a.y))
+                    distance = abs(math.sqrt(((x - pt_x) ** 2) + ((y - pt_y) ** 2)))
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    if best is None or distance < best_distance or (distance == best_distance and rank < best_rank):
+                        best = segment
+                        best_distance = distance
+                        best_x = pt_x
+                        best_y = pt_y
+                        best_rank = rank
+
+            # a hit inside the cells visited so far can not be beaten by segments further along the ray
+            t_exit = min(t_max_x, t_max_y)
+            if best is not None and best_distance < t_exit:
+                break
+            if max_distance is not None and t_exit > max_distance:
+                break
+
+            if t_max_x < t_max_y:
+                column += step_column
+                t_max_x += t_delta_x
+                if (step_column > 0 and column > max_column) or (step_column < 0 and column < min_column):
+                    break
+            else:
+                row += step_row
+                t_max_y += t_delta_y
+                if (step_row > 0 and row > max_row) or (step_row < 0 and row < min_row):
+                    break
+        if best is None:
+            return None
+        return best_rank, best_x, best_y, best_distance
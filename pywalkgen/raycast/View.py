@@ -0,0 +1,88 @@
+import math
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+class View:
+    """Ranging result of a particle as parallel arrays, one entry per cast ray.
+    Rays without a hit have distance and contact point nan and obstacle index -1.
+    Obstacle indices refer to the descriptions table, which is shared and must not be modified.
+    """
+    __slots__ = ('angle', 'distance', 'obstacle', 'contact_x', 'contact_y', 'descriptions')
+
+    def __init__(self, angle, distance, obstacle, contact_x, contact_y, descriptions):
+        """
+        Initializes a view
+        :param angle: array of ray angles in degrees
+        :param distance: array of hit distances
+        :param obstacle: array of obstacle indices into descriptions
+        :param contact_x: array of contact point x coordinates
+        :param contact_y: array of contact point y coordinates
+        :param descriptions: list of obstacle descriptions
+        """
+        self.angle = angle
+        self.distance = distance
+        self.obstacle = obstacle
+        self.contact_x = contact_x
+        self.contact_y = contact_y
+        self.descriptions = descriptions
+
+    def __len__(self):
+        return len(self.angle)
+
+    def select(self, rays):
+        """
+        view of a subset of the rays
+        :param rays: boolean mask or index array of the rays
+        :return: View
+        """
+        return View(angle=self.angle[rays],
+                    distance=self.distance[rays],
+                    obstacle=self.obstacle[rays],
+                    contact_x=self.contact_x[rays],
+                    contact_y=self.contact_y[rays],
+                    descriptions=self.descriptions)
+
+    def merge(self, other, order):
+        """
+        view of the rays of two views sharing one descriptions table
+        :param other: View
+        :param order: index array putting the concatenated rays in order
+        :return: View
+        """
+        return View(angle=np.concatenate((self.angle, other.angle))[order],
+                    distance=np.concatenate((self.distance, other.distance))[order],
+                    obstacle=np.concatenate((self.obstacle, other.obstacle))[order],
+                    contact_x=np.concatenate((self.contact_x, other.contact_x))[order],
+                    contact_y=np.concatenate((self.contact_y, other.contact_y))[order],
+                    descriptions=self.descriptions)
+
+    def to_list(self):
+        """
+        list of view dicts in the format published in the "view" field
+        :return: list of dicts with keys contact_point, angle, obstacle and distance
+        """
+        result = []
+        descriptions = self.descriptions
+        for angle, distance, idx, x, y in zip(self.angle.tolist(), self.distance.tolist(), self.obstacle.tolist(),
+                                              self.contact_x.tolist(), self.contact_y.tolist()):
+            if idx < 0:
+                # rays without a hit may still carry a distance, e.g. the sensing range, see CollisionDetection
+                result.append({'contact_point': None,
+                               'angle': angle,
+                               'obstacle': None,
+                               'distance': None if math.isnan(distance) else distance})
+            else:
+                result.append({'contact_point': [x, y],
+                               'angle': angle,
+                               'obstacle': descriptions[idx],
+                               'distance': distance})
+        return result
@@ -2,17 +2,27 @@ from __future__ import generator_stop
 from __future__ import annotations
 
 from .Obstacle import Obstacle
+from .GridParticle import GridParticle
 from .Particle import Particle
 from .Point import Point, LineSegment, Dot
 from .Ray import Ray
-from .StaticMap import StaticMap
+from .StaticMap import StaticMap, get_static_map, clear_static_maps
+from .UniformGrid import UniformGrid
+from .VectorParticle import VectorParticle
+from .View import View
 
 __all__ = [
     'Obstacle',
+    'GridParticle',
     'Particle',
     'Point',
     'LineSegment',
     'Dot',
     'Ray',
-    'StaticMap'
+    'StaticMap',
+    'get_static_map',
+    'clear_static_maps',
+    'UniformGrid',
+    'VectorParticle',
+    'View'
 ]
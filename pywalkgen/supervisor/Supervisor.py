@@ -0,0 +1,174 @@
+import os
+import time
+import queue
+import signal
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+def shard_personnels(personnels, shard_index, shard_count):
+    """
+    personnels owned by one worker, assigned round robin
+    :param personnels: list of personnel configurations
+    :param shard_index: index of the worker
+    :param shard_count: number of workers
+    :return: list of personnel configurations
+    """
+    if shard_count <= 0 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"invalid shard {shard_index} of {shard_count}")
+    return personnels[shard_index::shard_count]
+
+
+class Supervisor:
+    """Runs the walkers in worker processes, each owning a shard of the personnels.
+    SIGHUP is forwarded to the workers, which reload the configuration. Crashed workers are restarted with an
+    increasing delay, which starts over once a restarted worker stays up longer than the maximum delay. SIGINT
+    and SIGTERM stop the workers. Workers report their metrics through a queue, see get_metrics.
+    """
+
+    def __init__(self, target, config, workers, metrics_interval=10, max_restart_delay=30):
+        """
+        Initializes the supervisor
+        :param target: worker entry point, called with config, shard_index, shard_count and metrics_queue
+        :param config: path of the configuration file
+        :param workers: number of worker processes
+        :param metrics_interval: time in seconds between the logged metric summaries
+        :param max_restart_delay: maximum delay in seconds before a crashed worker is restarted
+        """
+        if workers <= 0:
+            raise ValueError("number of workers must be positive")
+        self.target = target
+        self.config = config
+        self.workers = workers
+        self.metrics_interval = metrics_interval
+        self.max_restart_delay = max_restart_delay
+        self.context = multiprocessing.get_context()
+        self.metrics_queue = self.context.Queue()
+        self.processes = [None] * workers
+        # consecutive restarts, which set the restart delay, and restarts over the lifetime of the supervisor
+        self.restarts = [0] * workers
+        self.lifetime_restarts = [0] * workers
+        self.restart_at = [None] * workers
+        self.started_at = [None] * workers
+        self.worker_metrics = dict()
+        self.is_stopping = False
+        self.is_sighup_received = False
+
+    def _start(self, shard_index):
+        process = self.context.Process(target=self.target,
+                                       kwargs={"config": self.config,
+                                               "shard_index": shard_index,
+                                               "shard_count": self.workers,
+                                               "metrics_queue": self.metrics_queue},
+                                       name=f"walk-generator-{shard_index}",
+                                       daemon=False)
+        process.start()
+        self.processes[shard_index] = process
+        self.started_at[shard_index] = time.monotonic()
+        logger.debug(f'Started worker {shard_index} with pid {process.pid}')
+
+    def _signal_handler(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self.is_sighup_received = True
+        else:
+            self.is_stopping = True
+
+    def run(self):
+        """start the workers and supervise them until SIGINT or SIGTERM"""
+        signal.signal(signal.SIGHUP, self._signal_handler)
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+        for shard_index in range(self.workers):
+            self._start(shard_index)
+
+        last_report = time.monotonic()
+        while not self.is_stopping:
+            if self.is_sighup_received:
+                self.is_sighup_received = False
+                self._forward(signal.SIGHUP)
+            self._collect_metrics(timeout=0.5)
+            self._check_workers()
+            if time.monotonic() - last_report >= self.metrics_interval:
+                last_report = time.monotonic()
+                logger.debug(f'Worker metrics: {self.get_metrics()}')
+        self.stop()
+
+    def _forward(self, signum):
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signum)
+
+    def _collect_metrics(self, timeout):
+        try:
+            metrics = self.metrics_queue.get(timeout=timeout)
+            while True:
+                self.worker_metrics[metrics["worker"]] = metrics
+                metrics = self.metrics_queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for shard_index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                self.restarts[shard_index] += 1
+                self.lifetime_restarts[shard_index] += 1
+                delay = min(self.max_restart_delay, 2 ** (self.restarts[shard_index] - 1))
+                logger.error(f'Worker {shard_index} exited with code {process.exitcode}, '
+                             f'restart {self.restarts[shard_index]} in {delay} s')
+                process.close()
+                self.processes[shard_index] = None
+                self.worker_metrics.pop(shard_index, None)
+                self.restart_at[shard_index] = now + delay
+            elif process is None and self.restart_at[shard_index] is not None and now >= self.restart_at[shard_index]:
+                self.restart_at[shard_index] = None
+                self._start(shard_index)
+            elif process is not None and self.restarts[shard_index] > 0 and \
+                    now - self.started_at[shard_index] > self.max_restart_delay:
+                # the restarted worker is healthy, its next crash is restarted without delay again
+                logger.debug(f'Worker {shard_index} up for more than {self.max_restart_delay} s, restart delay reset')
+                self.restarts[shard_index] = 0
+
+    def stop(self, timeout=5):
+        """
+        stop all workers
+        :param timeout: time in seconds a worker may take to stop before it is killed
+        """
+        self.is_stopping = True
+        for process in self.processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+        self.processes = [None] * self.workers
+
+    def get_metrics(self):
+        """
+        metrics aggregated over the workers
+        :return: dict with the number of workers, running workers, restarts and walkers, summed ticks, overruns and
+                 missed ticks, the lowest achieved rate and the highest tick duration
+        """
+        reports = list(self.worker_metrics.values())
+        return {
+            "workers": self.workers,
+            "running": sum(1 for process in self.processes if process is not None and process.is_alive()),
+            "restarts": sum(self.lifetime_restarts),
+            "walkers": sum(report.get("walkers", 0) for report in reports),
+            "ticks": sum(report.get("ticks", 0) for report in reports),
+            "overruns": sum(report.get("overruns", 0) for report in reports),
+            "missed_ticks": sum(report.get("missed_ticks", 0) for report in reports),
+            "achieved_rate": min((report.get("achieved_rate", 0) for report in reports), default=0),
+            "max_tick_duration": max((report.get("max_tick_duration", 0) for report in reports), default=0)
+        }
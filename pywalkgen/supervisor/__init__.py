@@ -0,0 +1,9 @@
+from __future__ import generator_stop
+from __future__ import annotations
+
+from .Supervisor import Supervisor, shard_personnels
+
+__all__ = [
+    'Supervisor',
+    'shard_personnels'
+]
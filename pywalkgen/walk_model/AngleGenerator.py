@@ -1,5 +1,6 @@
 import numpy
 from .Sigmoid import Sigmoid
+from pywalkgen.random_stream import RandomStream
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +17,7 @@ class WalkAngleGenerator:
     """
 
     def __init__(self, mid_point=0, steepness=0.5, max_value=1, level_shift=0, walk_direction_factor=0.341,
-                 walk_angle_deviation_factor=1):
+                 walk_angle_deviation_factor=1, random_stream=None):
         """Initializes Walk Angle generator
 
         Args:
@@ -24,6 +25,7 @@ class WalkAngleGenerator:
             steepness (float, optional): Steepness of the the function. Defaults to 0.5.
             max_value (int, optional): Maximum value of the Sigmoid function. Defaults to 1.
             level_shift (int, optional): Minimum value of the Sigmoid function. Defaults to 0.
+            random_stream (RandomStream, optional): Stream of the random draws. Defaults to an unseeded stream.
         """
         self.sigmoid = Sigmoid(mid_point=mid_point,
                                steepness=steepness,
@@ -33,6 +35,7 @@ class WalkAngleGenerator:
         self.walk_angle = 0.0
         self.max_angle_deviation = 0.0
         self.walk_angle_deviation_factor = walk_angle_deviation_factor
+        self.random_stream = random_stream if random_stream is not None else RandomStream()
 
     def _get_max_angle_deviation(self, velocity):
         """Get max angle of deviation given velocity
@@ -46,13 +49,15 @@ class WalkAngleGenerator:
         self.max_angle_deviation = self.sigmoid.generate(-1.0 * velocity)
         return self.max_angle_deviation
 
-    def get_walk_angle(self, angle, ranging, velocity):
+    def get_walk_angle(self, angle, ranging, velocity, angle_tolerance=0):
         """Generates angle value for given velocity
 
         Args:
             angle (float): maximum angle of deviation in radians
-            ranging
+            ranging (View): rays which are free of obstacles, see CollisionDetection.ranging
             velocity (float): velocity in meter per second
+            angle_tolerance (float, optional): Largest difference between the walk angle and the angle of
+                the ray taken for it, ranging may hold rays of any angle in any order. Defaults to 0.
 
         Returns:
             [type]: [description]
@@ -63,24 +68,24 @@ class WalkAngleGenerator:
         max_angle_scale = max_angle_dev * self.walk_angle_deviation_factor
         is_in_collision_course = True
 
+        # one normal value is taken every call, whether it is used or not, see WalkFleet
+        deviation = self.random_stream.normal()
+
         # ranging
-        for item in ranging:
-            if item['angle'] == self.walk_angle:
-                new_angle = int(numpy.random.normal(loc=angle, scale=max_angle_scale))
-                new_angle = (new_angle * self.walk_direction_factor) + (
-                            self.walk_angle * (1 - self.walk_direction_factor))
-                self.walk_angle = int(new_angle)
-                is_in_collision_course = False
-                break
-
-        # collision detection
+        if numpy.any(numpy.abs(ranging.angle - self.walk_angle) <= angle_tolerance):
+            new_angle = int(angle + (max_angle_scale * deviation))
+            new_angle = (new_angle * self.walk_direction_factor) + (
+                        self.walk_angle * (1 - self.walk_direction_factor))
+            self.walk_angle = int(new_angle)
+            is_in_collision_course = False
+
+        # collision detection, head for the farthest free ray (the first one on ties)
         if is_in_collision_course:
-            max_dist = 0
             max_angle = 0
-            for item in ranging:
-                if item['distance'] > max_dist:
-                    max_angle = item['angle']
-                    max_dist = item['distance']
+            if len(ranging) > 0:
+                farthest = int(numpy.argmax(ranging.distance))
+                if ranging.distance[farthest] > 0:
+                    max_angle = ranging.angle[farthest].item()
             self.walk_angle = max_angle
 
         return self.walk_angle, is_in_collision_course
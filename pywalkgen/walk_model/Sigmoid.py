@@ -1,4 +1,4 @@
-import math
+import numpy
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,5 +37,6 @@ class Sigmoid:
         Returns:
             float: output(y-axis)
         """
-        denom = 1 + math.exp(-1.0 * self.steepness * (x - self.mid_point))
+        # numpy.exp as for a fleet of walkers, see WalkFleet, math.exp may differ in the last bit
+        denom = 1 + numpy.exp(-1.0 * self.steepness * (x - self.mid_point))
         return (self.max_value / denom) + self.level_shift
@@ -0,0 +1,152 @@
+import math
+import logging
+from shapely.geometry import box
+from .DataAggregator import DataAggregator
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# cells are rasterized slightly enlarged, a point rounded into a neighbouring cell is still classified correctly
+MARGIN = 1e-6
+
+# cell values of AreaIndex.cells below the area indexes
+OUTSIDE = -1
+
+# area indexes shared by the walkers of this process, by map id
+_shared_area_indexes = dict()
+
+
+def get_area_index(config_file):
+    """
+    area index shared by all walkers walking in a map
+    :param config_file: map configuration with keys 'id' and 'area_division'
+    :return: AreaIndex
+    """
+    map_id = config_file["id"]
+    if map_id not in _shared_area_indexes:
+        _shared_area_indexes[map_id] = AreaIndex(
+            data_aggregators=[DataAggregator(area_config=area) for area in config_file["area_division"]],
+            cell_size=config_file.get("area_cell_size"))
+    return _shared_area_indexes[map_id]
+
+
+def clear_area_indexes():
+    """forget the shared area indexes, e.g. before the configuration is reloaded"""
+    _shared_area_indexes.clear()
+
+
+class AreaIndex:
+    """Locates points in the areas of the data aggregators of a map. The bounds of the areas are rasterized into a
+    grid: a cell inside exactly one area resolves to it without a geometric test, a cell crossed by area boundaries
+    keeps the areas it touches, which are tested exactly with their prepared polygons.
+    """
+
+    def __init__(self, data_aggregators, cell_size=None):
+        """
+        Initializes the index
+        :param data_aggregators: list of DataAggregator, the first area containing a point wins unless the point is
+        still in its previous area, see locate
+        :param cell_size: edge length of a square cell, derived from the areas if not given
+        """
+        self.data_aggregators = data_aggregators
+        self.candidates = []
+        self.cells = []
+        self.columns = 0
+        self.rows = 0
+        self.origin = (0.0, 0.0)
+        self.cell_size = 1.0
+        if len(data_aggregators) == 0:
+            return
+
+        bounds = [data_aggregator.polygon.bounds for data_aggregator in data_aggregators]
+        min_x = min(bound[0] for bound in bounds)
+        min_y = min(bound[1] for bound in bounds)
+        max_x = max(bound[2] for bound in bounds)
+        max_y = max(bound[3] for bound in bounds)
+        if cell_size is None:
+            cell_size = self._default_cell_size(width=max_x - min_x, height=max_y - min_y,
+                                                count=len(data_aggregators))
+        if cell_size <= 0:
+            logger.error("area cell size must be positive")
+            raise AssertionError("area cell size must be positive")
+        self.cell_size = cell_size
+        self.origin = (min_x, min_y)
+        self.columns = max(1, math.ceil((max_x - min_x) / cell_size))
+        self.rows = max(1, math.ceil((max_y - min_y) / cell_size))
+
+        # areas touching every cell, in the order of the data aggregators
+        touching = [[] for _ in range(self.columns * self.rows)]
+        inside = [[] for _ in range(self.columns * self.rows)]
+        margin = cell_size * MARGIN
+        for index, data_aggregator in enumerate(data_aggregators):
+            first_column, first_row, last_column, last_row = self._cell_range(bounds[index])
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    cell = box(min_x + (column * cell_size) - margin, min_y + (row * cell_size) - margin,
+                               min_x + ((column + 1) * cell_size) + margin, min_y + ((row + 1) * cell_size) + margin)
+                    if data_aggregator.prepared_polygon.intersects(cell):
+                        touching[row * self.columns + column].append(index)
+                        if data_aggregator.prepared_polygon.contains(cell):
+                            inside[row * self.columns + column].append(index)
+
+        # cell value: index of the area covering the cell, OUTSIDE, or OUTSIDE - 1 - k for candidate list k
+        candidate_lists = dict()
+        for touched, covered in zip(touching, inside):
+            if len(touched) == 0:
+                self.cells.append(OUTSIDE)
+            elif len(touched) == 1 and len(covered) == 1:
+                self.cells.append(covered[0])
+            else:
+                key = tuple(touched)
+                if key not in candidate_lists:
+                    candidate_lists[key] = len(self.candidates)
+                    self.candidates.append(key)
+                self.cells.append(OUTSIDE - 1 - candidate_lists[key])
+
+    @staticmethod
+    def _default_cell_size(width, height, count):
+        """an eighth of the side of an average area, at most 512 cells along the larger side of the map"""
+        side = max(width, height)
+        if side <= 0:
+            return 1.0
+        return max(math.sqrt((width * height) / count) / 8, side / 512)
+
+    def _cell_range(self, bound):
+        """columns and rows of the cells overlapping a bounding box, clipped to the grid"""
+        min_x, min_y = self.origin
+        return (max(0, math.floor((bound[0] - min_x) / self.cell_size) - 1),
+                max(0, math.floor((bound[1] - min_y) / self.cell_size) - 1),
+                min(self.columns - 1, math.floor((bound[2] - min_x) / self.cell_size) + 1),
+                min(self.rows - 1, math.floor((bound[3] - min_y) / self.cell_size) + 1))
+
+    def locate(self, x, y, previous=None):
+        """
+        area containing a point
+        :param x: x coordinate
+        :param y: y coordinate
+        :param previous: index of the area the point was in before, tested first (optional)
+        :return: index of the data aggregator of the area, None if the point is in no area
+        """
+        column = math.floor((x - self.origin[0]) / self.cell_size)
+        row = math.floor((y - self.origin[1]) / self.cell_size)
+        if column < 0 or row < 0 or column >= self.columns or row >= self.rows:
+            return None
+        value = self.cells[row * self.columns + column]
+        if value > OUTSIDE:
+            return value
+        if value == OUTSIDE:
+            return None
+        candidates = self.candidates[OUTSIDE - 1 - value]
+        point = [x, y]
+        # walkers rarely change their area: near a boundary the previous area is tested first
+        if previous is not None and previous in candidates and self.data_aggregators[previous].locate(point=point):
+            return previous
+        for index in candidates:
+            if index != previous and self.data_aggregators[index].locate(point=point):
+                return index
+        return None
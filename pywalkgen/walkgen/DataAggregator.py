@@ -1,4 +1,5 @@
 from shapely.geometry import Point, Polygon
+from shapely.prepared import prep
 
 
 class DataAggregator:
@@ -8,9 +9,7 @@ class DataAggregator:
         for coordinate in area_config["boundary"]["coordinates"]:
             boundary.append(coordinate)
         self.polygon = Polygon(boundary)
+        self.prepared_polygon = prep(self.polygon)
 
     def locate(self,point):
-        p1 = Point(point[0], point[1])
-        return p1.within(self.polygon)
-
-
+        return self.prepared_polygon.contains(Point(point[0], point[1]))
@@ -1,30 +1,37 @@
+import numpy as np
 from pywalkgen.outliergen import OutlierGenerator
 
 
 class PositioningTag:
-    def __init__(self, config):
+    def __init__(self, config, random_streams=None):
         """
         Initializes Positioning Tag
         :param config: configuration file
+        :param random_streams: dict of the random streams of the outliers per axis x, y and z (optional)
         """
         outlier_config = config
+        if random_streams is None:
+            random_streams = dict()
         self.outlier_gen = []
         self.resident_area_id = None
         self.resident_map_id = None
         self.outlier_gen.append(OutlierGenerator(mean=outlier_config["x"]["mean"],
                                                  standard_deviation=outlier_config["x"]["standard_deviation"],
                                                  number_of_outliers=outlier_config["x"]["number_of_outlier"],
-                                                 sample_size=outlier_config["x"]["sample_size"]))
+                                                 sample_size=outlier_config["x"]["sample_size"],
+                                                 random_stream=random_streams.get("x")))
 
         self.outlier_gen.append(OutlierGenerator(mean=outlier_config["y"]["mean"],
                                                  standard_deviation=outlier_config["y"]["standard_deviation"],
                                                  number_of_outliers=outlier_config["y"]["number_of_outlier"],
-                                                 sample_size=outlier_config["y"]["sample_size"]))
+                                                 sample_size=outlier_config["y"]["sample_size"],
+                                                 random_stream=random_streams.get("y")))
 
         self.outlier_gen.append(OutlierGenerator(mean=outlier_config["z"]["mean"],
                                                  standard_deviation=outlier_config["z"]["standard_deviation"],
                                                  number_of_outliers=outlier_config["z"]["number_of_outlier"],
-                                                 sample_size=outlier_config["z"]["sample_size"]))
+                                                 sample_size=outlier_config["z"]["sample_size"],
+                                                 random_stream=random_streams.get("z")))
 
     def get_measurement(self, ref):
         """
@@ -36,3 +43,12 @@ class PositioningTag:
                       ref[2] + self.outlier_gen[2].generate()]
         return uwb_result
 
+    def get_measurements(self, ref):
+        """
+        Get UWB measurements of consecutive samples at once, the same values as calling get_measurement per sample
+        :param ref: array of reference true positions of shape (number of samples, 3)
+        :return: array of uwb measurements of shape (number of samples, 3)
+        """
+        ref = np.asarray(ref, dtype=np.float64)
+        noise = np.stack([outlier_gen.generate_batch(len(ref)) for outlier_gen in self.outlier_gen], axis=1)
+        return ref + noise
@@ -0,0 +1,104 @@
+import math
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+class TickScheduler:
+    """Fixed rate clock. Tick k is due at start + k * interval, so the rate does not drift with the duration of
+    the ticks. A tick which ends after the next one was due is an overrun, the ticks whose time has passed
+    are skipped and the clock continues with the next tick in the future.
+    """
+
+    def __init__(self, interval, report_interval=10):
+        """
+        Initializes the tick scheduler
+        :param interval: tick period in seconds, ticks run back to back if not positive
+        :param report_interval: minimum time in seconds between overrun warnings
+        """
+        self.interval = interval
+        self.report_interval = report_interval
+        # clock of the event loop running the ticks and the start time on it, set by run
+        self.loop = None
+        self.start_time = None
+        self.last_report = None
+        self.ticks = 0
+        self.overruns = 0
+        self.missed_ticks = 0
+        self.overruns_since_report = 0
+        self.last_tick_duration = 0
+        self.max_tick_duration = 0
+        self.total_tick_duration = 0
+
+    async def run(self, tick, is_running):
+        """
+        run ticks until is_running returns False
+        :param tick: coroutine function called with the tick index, indices of skipped ticks are left out
+        :param is_running: function returning False to stop
+        """
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.start_time = loop.time()
+        self.last_report = self.start_time
+        index = 0
+        while is_running():
+            started = loop.time()
+            await tick(index)
+            finished = loop.time()
+            self._record(duration=finished - started)
+
+            if self.interval <= 0:
+                index += 1
+                await asyncio.sleep(0)
+                continue
+
+            next_index = index + 1
+            if finished > self.start_time + (next_index * self.interval):
+                # skip the ticks whose time has passed
+                due = math.floor((finished - self.start_time) / self.interval) + 1
+                self.overruns += 1
+                self.overruns_since_report += 1
+                self.missed_ticks += due - next_index
+                next_index = due
+            index = next_index
+            self._report(now=finished)
+            await asyncio.sleep(max(0, self.start_time + (index * self.interval) - loop.time()))
+
+    def _record(self, duration):
+        self.ticks += 1
+        self.last_tick_duration = duration
+        self.max_tick_duration = max(self.max_tick_duration, duration)
+        self.total_tick_duration += duration
+
+    def _report(self, now):
+        if self.overruns_since_report > 0 and now - self.last_report >= self.report_interval:
+            logger.warning(f'{self.overruns_since_report} tick overruns in the last {now - self.last_report:.1f} s, '
+                           f'achieved rate {self.get_stats()["achieved_rate"]:.2f} Hz, '
+                           f'max tick duration {self.max_tick_duration:.3f} s')
+            self.overruns_since_report = 0
+            self.last_report = now
+
+    def get_stats(self):
+        """
+        scheduler statistics
+        :return: dict with the configured and achieved rate in Hz, number of ticks, overruns and skipped ticks,
+                 last, mean and maximum tick duration in seconds
+        """
+        elapsed = 0 if self.start_time is None else self.loop.time() - self.start_time
+        return {
+            "rate": 1 / self.interval if self.interval > 0 else math.inf,
+            "achieved_rate": self.ticks / elapsed if elapsed > 0 else 0,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "missed_ticks": self.missed_ticks,
+            "last_tick_duration": self.last_tick_duration,
+            "mean_tick_duration": self.total_tick_duration / self.ticks if self.ticks > 0 else 0,
+            "max_tick_duration": self.max_tick_duration
+        }
@@ -0,0 +1,94 @@
+import base64
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+VIEW_ENCODINGS = ('full', 'none', 'downsample', 'packed', 'changed')
+
+
+class ViewEncoder:
+    """Encodes the "view" field of the published walk message.
+
+    full:       list of view dicts (default)
+    none:       the field is omitted
+    downsample: list of view dicts of every step-th ray
+    packed:     dict with base64 encoded little endian float32 angle and distance arrays (nan where nothing is
+                hit), int16 indices into the list of obstacle descriptions (-1 where nothing is hit)
+    changed:    list of view dicts, omitted while no distance changed by more than threshold since the last sent view
+    """
+
+    def __init__(self, config=None):
+        """
+        Initializes the view encoder
+        :param config: view attribute with keys 'encoding', 'step' (downsample) and 'threshold' (changed),
+                       full encoding if not given
+        """
+        config = config if config is not None else {}
+        self.encoding = config.get("encoding", "full")
+        if self.encoding not in VIEW_ENCODINGS:
+            logger.error(f"Unknown view encoding: {self.encoding}")
+            raise AssertionError(f"Unknown view encoding: {self.encoding}")
+        self.step = config.get("step", 10)
+        self.threshold = config.get("threshold", 0.5)
+        if self.step <= 0:
+            raise ValueError("downsampling step must be positive")
+        self.last_sent = None
+
+    def encode(self, view):
+        """
+        encode a view
+        :param view: View
+        :return: value of the "view" field, None if the field is to be omitted
+        """
+        if self.encoding == 'full':
+            return view.to_list()
+        if self.encoding == 'none':
+            return None
+        if self.encoding == 'downsample':
+            return view.select(slice(None, None, self.step)).to_list()
+        if self.encoding == 'packed':
+            return self._pack(view)
+        if self._changed(view):
+            self.last_sent = view
+            return view.to_list()
+        return None
+
+    def _changed(self, view):
+        """
+        check whether a view differs from the last sent one
+        :param view: View
+        :return: True if the rays, the seen obstacles or any distance by more than threshold changed
+        """
+        last = self.last_sent
+        if last is None or not np.array_equal(last.angle, view.angle) or \
+                not np.array_equal(last.obstacle, view.obstacle):
+            return True
+        with np.errstate(invalid='ignore'):
+            moved = np.abs(last.distance - view.distance) > self.threshold
+        return bool(np.any(moved | (np.isnan(last.distance) != np.isnan(view.distance))))
+
+    @staticmethod
+    def _pack(view):
+        """
+        pack a view into arrays, only the descriptions of the obstacles seen are sent
+        :param view: View
+        :return: dict with keys encoding, angle, distance, obstacle and obstacles
+        """
+        seen = view.obstacle >= 0
+        used, inverse = np.unique(view.obstacle[seen], return_inverse=True)
+        obstacle = np.full(len(view), -1, dtype='<i2')
+        obstacle[seen] = inverse
+        return {
+            "encoding": "packed",
+            "angle": base64.b64encode(view.angle.astype('<f4').tobytes()).decode(),
+            "distance": base64.b64encode(view.distance.astype('<f4').tobytes()).decode(),
+            "obstacle": base64.b64encode(obstacle.tobytes()).decode(),
+            "obstacles": [view.descriptions[idx] for idx in used.tolist()]
+        }
@@ -0,0 +1,277 @@
+import time
+import logging
+import numpy as np
+
+from pywalkgen.raycast import View
+from pywalkgen.raycast.VectorParticle import cast_rays_batch
+from pywalkgen.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.FileHandler('/tmp/walkgen.log')
+handler.setLevel(logging.ERROR)
+formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(message)s')
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# walk dimensions the fleet advances, see WalkPatternGenerator._update3d
+FLEET_WALK_DIMENSIONS = (1, 2)
+
+
+class WalkFleet:
+    """Walk state of many personnel in one map as NumPy arrays, one entry per walker (struct of arrays).
+    A step ranges all walkers in one cast_rays_batch call and advances their walk angles, step sizes and
+    positions with vectorized random draws and trigonometry, following WalkPatternGenerator._update3d, which
+    stays the reference for a single walker. The walkers still take the measurements (UWB, IMU, area) of
+    their samples and publish them.
+    The random values of every walker are taken in blocks from the random stream of the walker, in the order
+    the walker takes them, so a walker walks the same in a fleet as on its own.
+    """
+
+    def __init__(self, walkers, block_size=256):
+        """
+        Initializes the fleet with the current state of the walkers
+        :param walkers: list of walk pattern generators sharing the map, rays and range
+        :param block_size: number of steps the random values are taken for at once
+        """
+        if len(walkers) == 0:
+            logger.error("a fleet needs at least one walker")
+            raise AssertionError("a fleet needs at least one walker")
+        particle = walkers[0].collision.particle
+        for walker in walkers:
+            if walker.map_id != walkers[0].map_id or \
+                    walker.collision.particle.num_of_rays != particle.num_of_rays or \
+                    walker.collision.particle.max_range != particle.max_range:
+                logger.error("walkers of a fleet must share the map, rays and range")
+                raise AssertionError("walkers of a fleet must share the map, rays and range")
+            if walker.walk_dimension not in FLEET_WALK_DIMENSIONS:
+                logger.error(f"Walk dimension {walker.walk_dimension} is not supported by the fleet")
+                raise AssertionError(f"Walk dimension {walker.walk_dimension} is not supported by the fleet")
+
+        self.walkers = walkers
+        self.scene = walkers[0].collision.scene
+        # stage timings of the whole fleet, None while metrics are disabled
+        self.metrics = get_metrics()
+        self.angles = particle.angles
+        self.dir_x = particle.dir_x
+        self.dir_y = particle.dir_y
+        self.max_range = particle.max_range
+        self.angle_tolerance = particle.resolution / 2
+
+        # random values of the next steps, one normal and two uniform values per walker and step
+        self.block_size = block_size
+        self.block_index = block_size
+        self.normals = None
+        self.uniforms = None
+
+        # walk state
+        self.x = np.array([walker.pos['x'] for walker in walkers], dtype=np.float64)
+        self.y = np.array([walker.pos['y'] for walker in walkers], dtype=np.float64)
+        self.z = np.array([walker.pos['z'] for walker in walkers], dtype=np.float64)
+        self.walk_angle = np.array([walker.walk_angle for walker in walkers], dtype=np.float64)
+        self.net_step_size = np.array([walker.net_step_size for walker in walkers], dtype=np.float64)
+        self.distance_in_sample_time = np.array([walker.distance_in_sample_time for walker in walkers],
+                                                dtype=np.float64)
+
+        # walk attributes
+        self.max_walk_speed = np.array([walker.max_walk_speed for walker in walkers], dtype=np.float64)
+        self.distance_factor = np.array([walker.distance_factor for walker in walkers], dtype=np.float64)
+        self.walk_dimension = np.array([walker.walk_dimension for walker in walkers], dtype=np.int8)
+        self.env_collision_distance = np.array([walker.collision.env_collision_distance for walker in walkers],
+                                               dtype=np.float64)
+
+        # walk angle attributes, see WalkAngleGenerator and Sigmoid
+        self.mid_point = np.array([walker.walk_angle_gen.sigmoid.mid_point for walker in walkers], dtype=np.float64)
+        self.steepness = np.array([walker.walk_angle_gen.sigmoid.steepness for walker in walkers], dtype=np.float64)
+        self.max_value = np.array([walker.walk_angle_gen.sigmoid.max_value for walker in walkers], dtype=np.float64)
+        self.level_shift = np.array([walker.walk_angle_gen.sigmoid.level_shift for walker in walkers],
+                                    dtype=np.float64)
+        self.walk_direction_factor = np.array([walker.walk_angle_gen.walk_direction_factor for walker in walkers],
+                                              dtype=np.float64)
+        self.walk_angle_deviation_factor = np.array([walker.walk_angle_gen.walk_angle_deviation_factor
+                                                     for walker in walkers], dtype=np.float64)
+
+        # result of the last step
+        self.on_course = np.zeros(len(walkers), dtype=bool)
+        self.has_heading = np.zeros(len(walkers), dtype=bool)
+        self.farthest = np.zeros(len(walkers), dtype=np.intp)
+        self.x_step_length = np.zeros(len(walkers), dtype=np.float64)
+        self.y_step_length = np.zeros(len(walkers), dtype=np.float64)
+        self.ranging = None
+
+        # time stamp information
+        self.time_now = 0
+        self.time_past = 0
+
+    def __len__(self):
+        return len(self.walkers)
+
+    def _timedelta(self, tdelta):
+        if tdelta > 0:
+            return tdelta
+        if self.time_now == 0 and self.time_past == 0:
+            # time delta calculation for first update cycle
+            self.time_now = time.time()
+            self.time_past = self.time_now
+            return 0.01
+        self.time_now = time.time()
+        timedelta = self.time_now - self.time_past
+        self.time_past = self.time_now
+        return timedelta
+
+    def _draws(self):
+        """
+        random values of the next step, see WalkAngleGenerator.get_walk_angle and WalkPatternGenerator._update3d
+        :return: arrays of the normal value and of the two uniform values of every walker
+        """
+        if self.block_index >= self.block_size:
+            self.normals = np.stack([walker.random_stream.normals(self.block_size) for walker in self.walkers])
+            self.uniforms = np.stack([walker.random_stream.uniforms(2 * self.block_size).reshape(self.block_size, 2)
+                                      for walker in self.walkers])
+            self.block_index = 0
+        index = self.block_index
+        self.block_index += 1
+        return self.normals[:, index], self.uniforms[:, index, 0], self.uniforms[:, index, 1]
+
+    def _range(self):
+        """
+        range all walkers and keep the rays which are free of obstacles, see CollisionDetection.avoidance
+        :return: tuple of arrays (free, distance, obstacle, contact x, contact y) of shape
+                 (number of walkers, number of rays)
+        """
+        distance, obstacle, contact_x, contact_y = cast_rays_batch(xs=self.x,
+                                                                   ys=self.y,
+                                                                   dir_x=self.dir_x,
+                                                                   dir_y=self.dir_y,
+                                                                   packed_segments=self.scene.get_packed_segments(),
+                                                                   max_range=self.max_range)
+        with np.errstate(invalid='ignore'):
+            free = distance > self.env_collision_distance[:, np.newaxis]
+        if self.max_range is not None:
+            # nothing within the sensing range, the direction is free up to the range
+            unseen = np.isnan(distance) & (self.max_range > self.env_collision_distance)[:, np.newaxis]
+            free |= unseen
+            distance = np.where(unseen, self.max_range, distance)
+        return free, distance, obstacle, contact_x, contact_y
+
+    def advance(self, tdelta=-1):
+        """
+        advance every walker by one step
+        :param tdelta: time duration since the last step, measured with the wall clock if not positive
+        :return: time duration of the step
+        """
+        timedelta = self._timedelta(tdelta)
+        assert (timedelta >= 0), f"Time delta: {timedelta},  can't be negative"
+        count = len(self.walkers)
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        self.ranging = self._range()
+        if metrics is not None:
+            started = metrics.observe('fleet_ranging', started)
+        free, distance = self.ranging[0], self.ranging[1]
+
+        deviation, distance_draw, step_draw = self._draws()
+
+        # walk angle, kept if a free ray points along it, see WalkAngleGenerator.get_walk_angle
+        velocity = self.net_step_size / timedelta
+        max_angle_dev = (self.max_value / (1 + np.exp(-1.0 * self.steepness * ((-1.0 * velocity) - self.mid_point)))) \
+            + self.level_shift
+        max_angle_scale = max_angle_dev * self.walk_angle_deviation_factor
+        on_course = np.any(free & (np.abs(self.angles - self.walk_angle[:, np.newaxis]) <= self.angle_tolerance),
+                           axis=1)
+        # truncated as int() does, adding zero turns the negative zeros of trunc into zeros
+        new_angle = np.trunc(self.walk_angle + (max_angle_scale * deviation)) + 0.0
+        new_angle = np.trunc((new_angle * self.walk_direction_factor)
+                             + (self.walk_angle * (1 - self.walk_direction_factor))) + 0.0
+
+        # in collision course, head for the farthest free ray (the first one on ties)
+        free_distance = np.where(free, distance, -np.inf)
+        farthest = np.argmax(free_distance, axis=1)
+        self.has_heading = free_distance[np.arange(count), farthest] > 0
+        self.walk_angle = np.where(on_course, new_angle, np.where(self.has_heading, self.angles[farthest], 0.0))
+        self.on_course = on_course
+        self.farthest = farthest
+
+        # step size decision as random.uniform, the distance in sample time is only updated by walkers which walk on
+        new_distance_in_sample_time = self.distance_in_sample_time + \
+            (((self.max_walk_speed * timedelta * 0.6134) - self.distance_in_sample_time) * distance_draw)
+        self.distance_in_sample_time = np.where(on_course,
+                                                (self.distance_in_sample_time * (1 - self.distance_factor))
+                                                + (new_distance_in_sample_time * self.distance_factor),
+                                                self.distance_in_sample_time)
+        self.net_step_size = self.net_step_size + \
+            (((self.distance_in_sample_time * 0.6134) - self.net_step_size) * step_draw)
+
+        # step length in each of the axis, walkers in collision course stand still.
+        # The walk angle is taken as is in one dimension and in degrees in two, as by the single walker
+        heading = np.where(self.walk_dimension == 2, np.radians(self.walk_angle), self.walk_angle)
+        self.x_step_length = np.where(on_course, self.net_step_size * np.cos(heading), 0.0)
+        self.y_step_length = np.where(on_course & (self.walk_dimension == 2), self.net_step_size * np.sin(heading), 0.0)
+        self.x = self.x + self.x_step_length
+        self.y = self.y + self.y_step_length
+        if metrics is not None:
+            metrics.observe('fleet_walk_angle', started)
+        return timedelta
+
+    def get_view(self, index):
+        """
+        rays of a walker which were free of obstacles in the last step
+        :param index: index of the walker
+        :return: View
+        """
+        free, distance, obstacle, contact_x, contact_y = self.ranging
+        rays = free[index]
+        return View(angle=self.angles[rays],
+                    distance=distance[index][rays],
+                    obstacle=obstacle[index][rays],
+                    contact_x=contact_x[index][rays],
+                    contact_y=contact_y[index][rays],
+                    descriptions=self.scene.get_descriptions())
+
+    def get_states(self):
+        """
+        positions of all walkers
+        :return: dict of arrays x_ref_pos, y_ref_pos and z_ref_pos
+        """
+        return {"x_ref_pos": self.x, "y_ref_pos": self.y, "z_ref_pos": self.z}
+
+    async def step(self, outboxes=None, tdelta=-1):
+        """
+        advance every walker by one step, then let each walker measure and publish its sample
+        :param outboxes: dictionary of outboxes per walker, see WalkPatternGenerator.publish_batch (optional)
+        :param tdelta: time duration since the last step, measured with the wall clock if not positive
+        :return:
+        """
+        timedelta = self.advance(tdelta=tdelta)
+        angles = self.angles.tolist()
+        rows = zip(self.x.tolist(), self.y.tolist(), self.walk_angle.tolist(), self.on_course.tolist(),
+                   self.has_heading.tolist(), self.farthest.tolist(), self.net_step_size.tolist(),
+                   self.distance_in_sample_time.tolist(), self.x_step_length.tolist(), self.y_step_length.tolist())
+        for index, (walker, row) in enumerate(zip(self.walkers, rows)):
+            x, y, walk_angle, on_course, has_heading, farthest, net_step_size, distance_in_sample_time, \
+                x_step, y_step = row
+
+            # hand the state back to the walker, it stays usable on its own. Values the single walker keeps as
+            # they are, or as int, are handed back the same way, so the messages are the same
+            if not on_course:
+                x_step = 0
+            else:
+                walker.pos['x'] = x
+            if not on_course or walker.walk_dimension != 2:
+                y_step = 0
+            else:
+                walker.pos['y'] = y
+            if on_course or not has_heading:
+                walker.walk_angle = int(walk_angle)
+            else:
+                walker.walk_angle = angles[farthest]
+            walker.walk_angle_gen.walk_angle = walker.walk_angle
+            walker.net_step_size = net_step_size
+            walker.distance_in_sample_time = distance_in_sample_time
+
+            ranging = None if walker.view_encoder.encoding == 'none' else self.get_view(index)
+            result, plm_result = walker._sample(step_length={'x': x_step, 'y': y_step, 'z': 0},
+                                                ranging=ranging,
+                                                timedelta=timedelta)
+            await walker.deliver(result=result, outbox=None if outboxes is None else outboxes.get(walker))
@@ -1,20 +1,22 @@
 # Python code for 2D random walk.
-import json
 import sys
-import random
 import time
 import math
 import logging
 import asyncio
+import numpy as np
 
-from .DataAggregator import DataAggregator
+from .AreaIndex import get_area_index
 from .PositioningTag import PositioningTag
+from .ViewEncoder import ViewEncoder
 
 from pywalkgen.walk_model import WalkAngleGenerator
 from pywalkgen.pub_sub import PubSubAMQP
 from pywalkgen.imu import IMU
-from pywalkgen.raycast import Particle, StaticMap
+from pywalkgen.random_stream import RandomStream, seed_sequence
+from pywalkgen.raycast import Particle, VectorParticle, GridParticle, get_static_map
 from pywalkgen.collision_detection import CollisionDetection
+from pywalkgen.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -24,22 +26,38 @@ formatter = logging.Formatter('%(levelname)-8s-[%(filename)s:%(lineno)d]-%(messa
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# ray casting engines selectable with the 'engine' key of the collision attribute
+PARTICLE_ENGINES = {
+    'reference': Particle,
+    'vectorized': VectorParticle,
+    'grid': GridParticle
+}
+
+# telemetry subscribers connected per map id and exchange, shared by all walkers of the map in this process.
+# Every subscriber queue gets all messages of its fanout exchange, so with one subscriber per map every robot
+# update is applied once to the shared map
+_map_subscribers = dict()
+
 
 # ========================================= WALK PATTERN GENERATOR ===================================================
 
 class WalkPatternGenerator:
 
-    def __init__(self, eventloop, config_file):
+    def __init__(self, eventloop, config_file, seed=None):
         """
         Initialize walk pattern generator
         Walk pattern generator consists of
         :param eventloop: event loop for amqp pub sub
         :param config_file: config file
+        :param seed: run seed the random streams of the personnel are derived from, unseeded if not given
         """
         try:
             # id assigned to the personnel.
             self.walker_id = config_file["id"]
 
+            # id of the map the personnel walks in, walkers sharing a map can be ranged in one batch
+            self.map_id = config_file["map"]["id"]
+
             # initialize the start coordinates of the personnel
             self.pos = {'x': config_file["start_coordinates"]["x"],
                         'y': config_file["start_coordinates"]["y"],
@@ -47,6 +65,9 @@ class WalkPatternGenerator:
 
             walk_attribute = config_file["attribute"]["walk"]
 
+            # random streams of the personnel, the same run seed and id give the same walk in any process
+            self.random_stream = RandomStream(seed_sequence=seed_sequence(seed, self.walker_id, "walk"))
+
             # Walk angle generator for the personnel walk
             self.walk_angle_gen = WalkAngleGenerator(mid_point=walk_attribute["sigmoid_attributes"]["mid_point"],
                                                      steepness=walk_attribute["sigmoid_attributes"]["steepness"],
@@ -56,26 +77,45 @@ class WalkPatternGenerator:
                                                          walk_attribute["sigmoid_attributes"]["max_angle"]),
                                                      walk_direction_factor=walk_attribute["direction_factor"],
                                                      walk_angle_deviation_factor=walk_attribute[
-                                                         "angle_deviation_factor"])
+                                                         "angle_deviation_factor"],
+                                                     random_stream=self.random_stream)
             # IMU tag
-            self.imu_tag = IMU(config_file=config_file)
-
-            # Collision detection for static and dynamic obstacles
-            self.collision = CollisionDetection(scene=StaticMap(config_file=config_file["map"]),
-                                                particle=Particle(particle_id=config_file["id"],
-                                                                  x=config_file["start_coordinates"]["x"],
-                                                                  y=config_file["start_coordinates"]["y"]),
-                                                env_collision_distance=config_file["attribute"]["collision"][
-                                                    "distance"]["environment"],
-                                                robot_collision_distance=config_file["attribute"]["collision"][
-                                                    "distance"]["robot"])
+            self.imu_tag = IMU(config_file=config_file,
+                               random_streams={axis: RandomStream(seed_sequence=seed_sequence(seed, self.walker_id,
+                                                                                              "imu", axis),
+                                                                  block_size=32) for axis in ('x', 'y', 'z')})
+
+            # Collision detection for static and dynamic obstacles, the map is shared with the other walkers in it
+            collision_attribute = config_file["attribute"]["collision"]
+            engine = collision_attribute.get("engine", "reference")
+            if engine not in PARTICLE_ENGINES:
+                logger.error(f"Unknown ray casting engine: {engine}")
+                raise AssertionError(f"Unknown ray casting engine: {engine}")
+            self.collision = CollisionDetection(scene=get_static_map(config_file=config_file["map"]),
+                                                particle=PARTICLE_ENGINES[engine](
+                                                    particle_id=config_file["id"],
+                                                    x=config_file["start_coordinates"]["x"],
+                                                    y=config_file["start_coordinates"]["y"],
+                                                    num_of_rays=collision_attribute.get("rays", 360),
+                                                    max_range=collision_attribute.get("range")),
+                                                env_collision_distance=collision_attribute["distance"][
+                                                    "environment"],
+                                                robot_collision_distance=collision_attribute["distance"]["robot"],
+                                                sensing=collision_attribute.get("sensing"))
+
+            # encoding of the published view
+            self.view_encoder = ViewEncoder(config=collision_attribute.get("view"))
 
             # UWB tag
-            self.uwb_tag = PositioningTag(config=config_file["attribute"]["positioning"]["outliers"])
+            self.uwb_tag = PositioningTag(config=config_file["attribute"]["positioning"]["outliers"],
+                                          random_streams={axis: RandomStream(seed_sequence=seed_sequence(
+                                              seed, self.walker_id, "uwb", axis), block_size=32)
+                                              for axis in ('x', 'y', 'z')})
 
-            self.data_aggregators = []
-            for area in config_file["map"]["area_division"]:
-                self.data_aggregators.append(DataAggregator(area_config=area))
+            # areas are shared by all walkers of the map, the index of the current area is kept per walker
+            self.area_index = get_area_index(config_file=config_file["map"])
+            self.data_aggregators = self.area_index.data_aggregators
+            self.area = None
 
             # set Walk attributes and angle generators
             self.max_walk_speed = walk_attribute["max_walk_speed"]
@@ -86,9 +126,13 @@ class WalkPatternGenerator:
             self.pos_prev = {'x': self.pos['x'], 'y': self.pos['y'], 'z': self.pos['z']}
             self.net_step_size = 0
 
-            # time stamp information
+            # time stamp information, the clock of the published time stamps is replaced in offline generation
             self.time_now = 0
             self.time_past = 0
+            self.clock_ns = time.time_ns
+
+            # stage timings, None while metrics are disabled
+            self.metrics = get_metrics()
 
             # sample time information
             self.interval = config_file['attribute']['other']['interval']
@@ -114,8 +158,9 @@ class WalkPatternGenerator:
                         logger.error("Provide protocol amq config")
                         raise AssertionError("Provide protocol amq config")
 
-            # Subscriber
+            # Subscriber, only the first walker of the map connects its subscribers, see connect
             self.subscribers = []
+            self.subscriptions = []
             if protocol["subscribers"] is not None:
                 for subscriber in protocol["subscribers"]:
                     if subscriber["type"] == "amq":
@@ -152,13 +197,13 @@ class WalkPatternGenerator:
         :param kwargs: must contain following information
                        1.   exchange_name
                        2.   binding_name
-                       3.   message_body
+                       3.   message_body, decoded by the codec of the subscriber
         :return: none
         """
         # extract message attributes from message
         exchange_name = kwargs["exchange_name"]
         binding_name = kwargs["binding_name"]
-        message_body = json.loads(kwargs["message_body"])
+        message_body = kwargs["message_body"]
 
         # check for matching subscriber with exchange and binding name in all subscribers
         for subscriber in self.subscribers:
@@ -183,7 +228,7 @@ class WalkPatternGenerator:
                             elbow_wrist = [message_body["elbow"], message_body["wrist"]]
                             prefix = "robot_" + message_body["id"]
 
-                            # update robot in scene for collision detection
+                            # update robot in the shared scene for collision detection, all walkers in the map see it
                             self.collision.update_scene(obstacle_id=prefix + "_base_shoulder",
                                                         points=base_shoulder,
                                                         shape="line")
@@ -195,10 +240,11 @@ class WalkPatternGenerator:
                                                         shape="line")
                             return
 
-    async def _update3d(self, tdelta=-1):
+    async def _update3d(self, tdelta=-1, views=None):
         """
         update walker position in 3D
         :param tdelta: time duration between successive updates
+        :param views: views precomputed by CollisionDetection.batch_views (optional)
         :return:
         """
         try:
@@ -219,36 +265,47 @@ class WalkPatternGenerator:
 
             assert (timedelta >= 0), f"Time delta: {timedelta},  can't be negative"
 
+            metrics = self.metrics
+            if metrics is not None:
+                started = time.perf_counter()
+
             # Calculate Walk angle for next step, and also check if walker is in collision course
-            ranging, collision_avoidance_msg = self.collision.ranging()
+            ranging, collision_avoidance_msg = self.collision.ranging(views=views, heading=self.walk_angle)
+            if metrics is not None:
+                started = metrics.observe('ranging', started)
             self.walk_angle, collision_decision = \
                 self.walk_angle_gen.get_walk_angle(angle=self.walk_angle,
                                                    ranging=ranging,
-                                                   velocity=self.net_step_size / timedelta)
+                                                   velocity=self.net_step_size / timedelta,
+                                                   angle_tolerance=self.collision.particle.resolution / 2)
 
             step_length = {'x': 0, 'y': 0, 'z': 0}
 
             if collision_decision:
                 # self.net_step_size = self.net_step_size * 0.2
-                self.net_step_size = random.uniform(self.net_step_size, self.distance_in_sample_time * 0.6134)
+                # the draw of the distance in sample time is skipped, every step takes two uniform values
+                self.random_stream.uniform()
+                self.net_step_size = self.random_stream.uniform(self.net_step_size,
+                                                                self.distance_in_sample_time * 0.6134)
             else:
                 # step size decision
-                new_distance_in_sample_time = random.uniform(self.distance_in_sample_time,
-                                                             self.max_walk_speed * timedelta * 0.6134)
+                new_distance_in_sample_time = self.random_stream.uniform(self.distance_in_sample_time,
+                                                                         self.max_walk_speed * timedelta * 0.6134)
 
                 self.distance_in_sample_time = (self.distance_in_sample_time * (1 - self.distance_factor)) \
                                                + (new_distance_in_sample_time * self.distance_factor)
 
-                self.net_step_size = random.uniform(self.net_step_size, self.distance_in_sample_time * 0.6134)
+                self.net_step_size = self.random_stream.uniform(self.net_step_size,
+                                                                self.distance_in_sample_time * 0.6134)
 
-                # step length in each of the axis
+                # step length in each of the axis, with the trigonometry of NumPy as for a fleet of walkers
                 if self.walk_dimension == 1:
-                    step_length['x'] = self.net_step_size * math.cos(self.walk_angle)
+                    step_length['x'] = float(self.net_step_size * np.cos(self.walk_angle))
                     step_length['y'] = 0
                     step_length['z'] = 0
                 elif self.walk_dimension == 2:
-                    step_length['x'] = self.net_step_size * math.cos(math.radians(self.walk_angle))
-                    step_length['y'] = self.net_step_size * math.sin(math.radians(self.walk_angle))
+                    step_length['x'] = float(self.net_step_size * np.cos(np.radians(self.walk_angle)))
+                    step_length['y'] = float(self.net_step_size * np.sin(np.radians(self.walk_angle)))
                     step_length['z'] = 0
                 else:
                     step_length['x'] = self.net_step_size * math.cos(self.walk_angle)
@@ -260,61 +317,82 @@ class WalkPatternGenerator:
             self.pos['x'] = self.pos_prev['x'] + step_length['x']
             self.pos['y'] = self.pos_prev['y'] + step_length['y']
             self.pos['z'] = self.pos_prev['z'] + step_length['z']
+            if metrics is not None:
+                metrics.observe('walk_angle', started)
 
-            # update particle's position
-            self.collision.update_particles(x=self.pos['x'], y=self.pos['y'])
-
-            heading = {'ref_heading': {'end': (self.pos['x'], self.pos['y']),
-                                       'start': (self.pos_prev['x'], self.pos_prev['y'])}}
-
-            # prepare for next iteration
-            self.pos_prev['x'] = self.pos['x']
-            self.pos_prev['y'] = self.pos['y']
-            self.pos_prev['z'] = self.pos['z']
-
-            uwb_measurement = self.uwb_tag.get_measurement(ref=[self.pos['x'], self.pos['y'], self.pos['z']])
-            data_aggregator_id = self.get_area_information(ref=[self.pos['x'], self.pos['y']])
-            result = {
-                "measurement": "walk",
-                "time": time.time_ns(),
-                "id": self.walker_id,
-                "data_aggregator_id": data_aggregator_id,
-                "walk_angle": self.walk_angle,
-                "x_step_length": step_length['x'],
-                "y_step_length": step_length['y'],
-                "z_step_length": step_length['z'],
-                "x_ref_pos": self.pos['x'],
-                "y_ref_pos": self.pos['y'],
-                "z_ref_pos": self.pos['z'],
-                "x_uwb_pos": uwb_measurement[0],
-                "y_uwb_pos": uwb_measurement[1],
-                "z_uwb_pos": uwb_measurement[2],
-                "view": ranging
-            }
-            result.update(heading)
-
-            imu_result = self.imu_tag.update(cur_position=result, tdelta=timedelta)
-            result.update(imu_result)
-
-            result.update({"timestamp": round(time.time() * 1000)})
-
-            plm_result = {
-                "id": result["id"],
-                "data_aggregator_id": result["data_aggregator_id"],
-                "x_uwb_pos": result["x_uwb_pos"],
-                "y_uwb_pos": result["y_uwb_pos"],
-                "z_uwb_pos": result["z_uwb_pos"],
-                'x_imu_vel': result['x_imu_vel'],
-                'y_imu_vel': result['y_imu_vel'],
-                'z_imu_vel': result['z_imu_vel'],
-                "timestamp": result['timestamp']
-            }
-
-            return result, plm_result
+            return self._sample(step_length=step_length, ranging=ranging, timedelta=timedelta)
         except Exception as e:
             logger.critical("unhandled exception", e)
             sys.exit(-1)
 
+    def _sample(self, step_length, ranging, timedelta):
+        """
+        measure the walker at its new position, see WalkFleet for walkers advanced in bulk
+        :param step_length: dict of the step length per axis
+        :param ranging: View of the rays which are free of obstacles, None if the view is not published
+        :param timedelta: time duration since the last update
+        :return: walk message and positioning message
+        """
+        # update particle's position
+        self.collision.update_particles(x=self.pos['x'], y=self.pos['y'])
+
+        heading = {'ref_heading': {'end': (self.pos['x'], self.pos['y']),
+                                   'start': (self.pos_prev['x'], self.pos_prev['y'])}}
+
+        # prepare for next iteration
+        self.pos_prev['x'] = self.pos['x']
+        self.pos_prev['y'] = self.pos['y']
+        self.pos_prev['z'] = self.pos['z']
+
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        uwb_measurement = self.uwb_tag.get_measurement(ref=[self.pos['x'], self.pos['y'], self.pos['z']])
+        if metrics is not None:
+            started = metrics.observe('uwb', started)
+        data_aggregator_id = self.get_area_information(ref=[self.pos['x'], self.pos['y']])
+        if metrics is not None:
+            started = metrics.observe('area', started)
+        result = {
+            "measurement": "walk",
+            "time": self.clock_ns(),
+            "id": self.walker_id,
+            "data_aggregator_id": data_aggregator_id,
+            "walk_angle": self.walk_angle,
+            "x_step_length": step_length['x'],
+            "y_step_length": step_length['y'],
+            "z_step_length": step_length['z'],
+            "x_ref_pos": self.pos['x'],
+            "y_ref_pos": self.pos['y'],
+            "z_ref_pos": self.pos['z'],
+            "x_uwb_pos": uwb_measurement[0],
+            "y_uwb_pos": uwb_measurement[1],
+            "z_uwb_pos": uwb_measurement[2],
+            "view": ranging
+        }
+        result.update(heading)
+
+        self.imu_tag.update(cur_position=result, tdelta=timedelta, out=result)
+        if metrics is not None:
+            metrics.observe('imu', started)
+            metrics.count_sample(self.walker_id)
+
+        result.update({"timestamp": round(self.clock_ns() / 1000000)})
+
+        plm_result = {
+            "id": result["id"],
+            "data_aggregator_id": result["data_aggregator_id"],
+            "x_uwb_pos": result["x_uwb_pos"],
+            "y_uwb_pos": result["y_uwb_pos"],
+            "z_uwb_pos": result["z_uwb_pos"],
+            'x_imu_vel': result['x_imu_vel'],
+            'y_imu_vel': result['y_imu_vel'],
+            'z_imu_vel': result['z_imu_vel'],
+            "timestamp": result['timestamp']
+        }
+
+        return result, plm_result
+
     async def publish(self, exchange_name, msg, external_binding_suffix=None):
         '''
         publishes amqp message
@@ -328,31 +406,77 @@ class WalkPatternGenerator:
                 await publisher.publish(message_content=msg, external_binding_suffix=external_binding_suffix)
                 logger.debug(f'Pub: exchange: {exchange_name} msg {msg}')
 
+    async def publish_batch(self, exchange_name, msgs):
+        '''
+        publishes the messages of several walkers in batch messages
+        :param exchange_name: name of amqp exchange
+        :param msgs: list of messages to be published
+        :return:
+        '''
+        for publisher in self.publishers:
+            if exchange_name == publisher.exchange_name:
+                await publisher.publish_batch(messages=msgs)
+                logger.debug(f'Pub: exchange: {exchange_name} batch of {len(msgs)} msgs')
+
+    def get_batch_key(self, exchange_name):
+        '''
+        walkers with the same batch key publish their messages of one tick together
+        :param exchange_name: name of amqp exchange
+        :return: batch key, None if the publisher of the exchange does not batch
+        '''
+        for publisher in self.publishers:
+            if exchange_name == publisher.exchange_name and publisher.batching:
+                return (publisher.broker_info["address"], publisher.broker_info["port"], publisher.exchange_name,
+                        tuple(publisher.binding_keys), publisher.batch_suffix, publisher.codec.name)
+        return None
+
     async def connect(self):
         """
-        connects amqp publishers and subscribers
+        connects amqp publishers and subscribers, the subscribers only if no other walker of the map connected
+        subscribers to the same exchange
         :return:
         """
         for publisher in self.publishers:
             await publisher.connect()
 
         for subscriber in self.subscribers:
+            key = (self.map_id, subscriber.exchange_name)
+            shared = _map_subscribers.get(key)
+            self.subscriptions.append(key)
+            if shared is not None:
+                # the map already receives the telemetry of this exchange
+                shared["walkers"] += 1
+                continue
+            _map_subscribers[key] = {"subscriber": subscriber, "walkers": 1}
             await subscriber.connect(mode="subscriber")
 
-    async def update(self):
+    async def terminate(self):
         """
-        update walk generator.
-        Note This function need to be called in a loop every update cycle
-        :param binding_key: binding key name (optional) used when other than default binding key
+        cancels the amqp subscribers once the last walker of the map terminates, so no telemetry reaches the
+        shared map any more, and gives the channels of the subscribers and publishers back to the connection pool
         :return:
         """
+        # a subscriber shared by the walkers of the map is cancelled by the last of them
+        for key in self.subscriptions:
+            shared = _map_subscribers[key]
+            shared["walkers"] -= 1
+            if shared["walkers"] == 0:
+                del _map_subscribers[key]
+                await shared["subscriber"].terminate()
+        self.subscriptions.clear()
 
-        result = dict()
-        if self.interval >= 0:
-            all_result, plm_result = await self._update3d()
-            result.update(all_result)
+        for publisher in self.publishers:
+            await publisher.terminate()
 
-        await self.publish(exchange_name='generator_personnel', msg=json.dumps(result).encode())
+    async def update(self, views=None, outbox=None):
+        """
+        update walk generator and sleep for the interval.
+        Note This function need to be called in a loop every update cycle
+        :param views: views precomputed by CollisionDetection.batch_views (optional)
+        :param outbox: list the message is appended to instead of being published, see publish_batch (optional)
+        :return:
+        """
+        await self.step(views=views, outbox=outbox)
 
         # sleep until its time for next sample
         if self.interval >= 0:
@@ -360,11 +484,47 @@ class WalkPatternGenerator:
         else:
             await asyncio.sleep(delay=0)
 
+    async def step(self, views=None, outbox=None, tdelta=-1):
+        """
+        update walk generator once without sleeping, the update cycle is timed by the caller, see TickScheduler
+        :param views: views precomputed by CollisionDetection.batch_views (optional)
+        :param outbox: list the message is appended to instead of being published, see publish_batch (optional)
+        :param tdelta: time duration since the last update, measured with the wall clock if not positive
+        :return:
+        """
+        result = dict()
+        if self.interval >= 0:
+            # the message itself is delivered, its IMU channels may still be filled in later, see DeferredIMU
+            result, plm_result = await self._update3d(tdelta=tdelta, views=views)
+        await self.deliver(result=result, outbox=outbox)
+
+    async def deliver(self, result, outbox=None):
+        """
+        encode the view of a walk message and publish it
+        :param result: walk message, see _sample
+        :param outbox: list the message is appended to instead of being published, see publish_batch (optional)
+        :return:
+        """
+        if "view" in result:
+            if self.metrics is not None:
+                started = time.perf_counter()
+            # the view is kept as arrays until it is serialized
+            view = None if result["view"] is None else self.view_encoder.encode(result["view"])
+            if view is None:
+                del result["view"]
+            else:
+                result["view"] = view
+            if self.metrics is not None:
+                self.metrics.observe('view_encoding', started)
+
+        if outbox is not None:
+            outbox.append(result)
+        else:
+            await self.publish(exchange_name='generator_personnel', msg=result)
+
     def get_states(self):
         return {"x_ref_pos": self.pos['x'], "y_ref_pos ": self.pos['y'], "z_ref_pos": self.pos['z']}
 
     def get_area_information(self, ref):
-        for data_aggregator in self.data_aggregators:
-            if data_aggregator.locate(point=[ref[0], ref[1]]):
-                return data_aggregator.id
-        return None
+        self.area = self.area_index.locate(x=ref[0], y=ref[1], previous=self.area)
+        return None if self.area is None else self.data_aggregators[self.area].id
@@ -4,9 +4,19 @@ from __future__ import annotations
 from .PositioningTag import PositioningTag
 from .WalkGenerator import WalkPatternGenerator
 from .DataAggregator import DataAggregator
+from .AreaIndex import AreaIndex, get_area_index, clear_area_indexes
+from .ViewEncoder import ViewEncoder
+from .TickScheduler import TickScheduler
+from .WalkFleet import WalkFleet
 
 __all__ = [
     'PositioningTag',
     'WalkPatternGenerator',
-    'DataAggregator'
+    'DataAggregator',
+    'AreaIndex',
+    'get_area_index',
+    'clear_area_indexes',
+    'ViewEncoder',
+    'TickScheduler',
+    'WalkFleet'
 ]
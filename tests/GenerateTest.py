@@ -0,0 +1,48 @@
+import os
+import json
+import asyncio
+import tempfile
+
+import numpy as np
+
+from pywalkgen.cli import generate
+from ReproducibilityTest import read_config, run
+
+# run seed of the compared runs
+SEED = 7
+
+# IMU channels exported by the offline generation
+IMU_COLUMNS = ('x_imu_vel', 'y_imu_vel', 'z_imu_vel', 'x_imu_acc', 'y_imu_acc', 'z_imu_acc',
+               'imu_roll', 'imu_pitch', 'imu_yaw')
+
+# largest relative difference of the batched IMU update to the live one, the orientation is computed with
+# numpy.arctan2 in a batch and math.atan2 live
+RELATIVE_TOLERANCE = 1e-12
+
+
+def generate_test(steps=200, seed=SEED):
+    config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config.yaml")
+    walk_config = read_config(yaml_file=config_file, rootkey="walk_generator")
+
+    # the offline generation defers the IMU updates and computes them in batches
+    with tempfile.TemporaryDirectory() as output:
+        eventloop = asyncio.new_event_loop()
+        eventloop.run_until_complete(generate(eventloop, config_file, output=output, steps=steps, formats=("npz",),
+                                              seed=seed, imu_batch=64))
+        eventloop.close()
+        with np.load(os.path.join(output, "imu.npz")) as imu:
+            generated = {column: imu[column] for column in ("id",) + IMU_COLUMNS}
+
+    # the same personnels updating their IMU live on every step
+    live = run(walk_config=walk_config, personnels=walk_config["personnels"], seed=seed, steps=steps)
+    assert len(generated["id"]) == sum(len(messages) for messages in live.values()) > 0
+    for column in IMU_COLUMNS:
+        assert np.all(np.isfinite(generated[column])), f"{column} is not finite"
+        expected = np.array([json.loads(message)[column] for walker_id in sorted(live) for message in live[walker_id]])
+        actual = np.concatenate([generated[column][generated["id"] == walker_id] for walker_id in sorted(live)])
+        assert np.allclose(actual, expected, rtol=RELATIVE_TOLERANCE, atol=0), column
+    print(f"{len(generated['id'])} generated IMU samples match the live IMU updates")
+
+
+if __name__ == "__main__":
+    generate_test()
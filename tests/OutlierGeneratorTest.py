@@ -0,0 +1,70 @@
+import math
+
+import numpy as np
+
+from pywalkgen.outliergen import OutlierGenerator
+from pywalkgen.random_stream import RandomStream, seed_sequence
+
+# run seed of the outlier streams
+SEED = 5
+
+# largest deviation of the estimated statistics, in standard errors
+STANDARD_ERRORS = 5
+
+
+def outlier_generator(seed=SEED, mean=3.0, standard_deviation=2.0, number_of_outliers=20, sample_size=100):
+    return OutlierGenerator(mean=mean,
+                            standard_deviation=standard_deviation,
+                            number_of_outliers=number_of_outliers,
+                            sample_size=sample_size,
+                            random_stream=RandomStream(seed_sequence=seed_sequence(seed, "outlier"), block_size=32))
+
+
+def statistics_test(number_of_windows=2000, mean=3.0, standard_deviation=2.0, number_of_outliers=20,
+                    sample_size=100):
+    generator = outlier_generator(mean=mean, standard_deviation=standard_deviation,
+                                  number_of_outliers=number_of_outliers, sample_size=sample_size)
+    windows = generator.generate_batch(number_of_windows * sample_size).reshape(number_of_windows, sample_size)
+
+    # positions are drawn with replacement, a position drawn more than once holds one outlier
+    counts = np.count_nonzero(windows, axis=1)
+    assert counts.min() >= 1 and counts.max() <= number_of_outliers, (counts.min(), counts.max())
+    expected_count = sample_size * (1 - (1 - 1 / sample_size) ** number_of_outliers)
+    assert abs(counts.mean() - expected_count) <= STANDARD_ERRORS * counts.std() / math.sqrt(number_of_windows), \
+        (counts.mean(), expected_count)
+
+    outliers = windows[windows != 0]
+    standard_error = standard_deviation / math.sqrt(len(outliers))
+    assert abs(outliers.mean() - mean) <= STANDARD_ERRORS * standard_error, (outliers.mean(), mean)
+    assert abs(outliers.std() - standard_deviation) <= STANDARD_ERRORS * standard_error, \
+        (outliers.std(), standard_deviation)
+    print(f"{counts.mean():.2f} outliers per window of {sample_size} (expected {expected_count:.2f}), "
+          f"mean {outliers.mean():.3f}, standard deviation {outliers.std():.3f}")
+
+
+def no_repeat_test(sample_size=100):
+    generator = outlier_generator(sample_size=sample_size)
+    values = [generator.generate(repeat=False) for _ in range(3 * sample_size)]
+    assert any(value != 0 for value in values[:sample_size])
+    assert all(value == 0 for value in values[sample_size:])
+
+    generator = outlier_generator(sample_size=sample_size)
+    values = generator.generate_batch(3 * sample_size, repeat=False)
+    assert np.any(values[:sample_size] != 0)
+    assert np.all(values[sample_size:] == 0)
+
+
+def batch_test(sizes=(1, 7, 99, 100, 101, 250, 0, 33, 1000), sample_size=100):
+    for repeat in (True, False):
+        single = outlier_generator(sample_size=sample_size)
+        batched = outlier_generator(sample_size=sample_size)
+        for size in sizes:
+            expected = [single.generate(repeat=repeat) for _ in range(size)]
+            actual = batched.generate_batch(size, repeat=repeat)
+            assert len(actual) == size and actual.tolist() == expected, (repeat, size)
+
+
+if __name__ == "__main__":
+    statistics_test()
+    no_repeat_test()
+    batch_test()
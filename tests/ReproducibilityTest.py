@@ -0,0 +1,112 @@
+import os
+import copy
+import json
+import asyncio
+
+import yaml
+
+from pywalkgen.cli import tick_divisors, split_fleets, group_walkers_by_map, due_steps
+from pywalkgen.supervisor import shard_personnels
+from pywalkgen.walkgen import WalkPatternGenerator
+
+# run seed of the compared runs
+SEED = 11
+
+# number of personnels walking in the map of config.yaml
+NUMBER_OF_PERSONNELS = 6
+
+
+def read_config(yaml_file, rootkey):
+    """Parse the given Configuration File"""
+    if os.path.exists(yaml_file):
+        with open(yaml_file, 'r') as config_file:
+            yaml_as_dict = yaml.load(config_file, Loader=yaml.FullLoader)
+        return yaml_as_dict[rootkey]
+    else:
+        raise FileNotFoundError
+
+
+def personnels_of(walk_config, number_of_personnels):
+    """copies of the first personnel with their own ids, ranged with the batched 'vectorized' engine"""
+    personnels = []
+    for idx in range(number_of_personnels):
+        personnel = copy.deepcopy(walk_config["personnels"][0])
+        personnel["id"] = str(idx + 1)
+        personnel["attribute"]["collision"]["engine"] = "vectorized"
+        personnels.append(personnel)
+    return personnels
+
+
+def run(walk_config, personnels, seed, steps, fleet=False):
+    """
+    step the personnels on simulated time like one worker does and collect their messages
+    :return: dict of the messages per personnel id, serialized as JSON
+    """
+    eventloop = asyncio.new_event_loop()
+    walkers = [WalkPatternGenerator(eventloop=eventloop, config_file=personnel, seed=seed)
+               for personnel in personnels]
+    for walker in walkers:
+        walker.clock_ns = lambda: 0
+    interval = walkers[0].interval
+    divisors = tick_divisors(walkers=walkers, interval=interval)
+    fleets, single_walkers = split_fleets(walk_config=dict(walk_config, fleet=fleet), walkers=walkers,
+                                          divisors=divisors)
+    walker_groups = group_walkers_by_map(single_walkers)
+    last_ticks = {walker: -divisors[walker] for walker in single_walkers}
+    last_ticks.update({walker_fleet: -divisor for walker_fleet, divisor in fleets})
+    outbox = []
+    outboxes = {walker: outbox for walker in walkers}
+
+    async def simulate():
+        for index in range(steps):
+            for step in due_steps(index=index, walkers=single_walkers, walker_groups=walker_groups,
+                                  divisors=divisors, last_ticks=last_ticks, interval=interval,
+                                  outboxes=outboxes, fleets=fleets):
+                await step
+
+    eventloop.run_until_complete(simulate())
+    eventloop.close()
+    messages = dict()
+    for message in outbox:
+        messages.setdefault(message["id"], []).append(json.dumps(message, sort_keys=True))
+    return messages
+
+
+def run_sharded(walk_config, personnels, seed, steps, shard_count, fleet=False):
+    """run every shard of personnels on its own like the worker processes and merge their messages"""
+    messages = dict()
+    for shard_index in range(shard_count):
+        messages.update(run(walk_config=walk_config,
+                            personnels=shard_personnels(personnels, shard_index, shard_count),
+                            seed=seed, steps=steps, fleet=fleet))
+    return messages
+
+
+def reproducibility_test(steps=100, seed=SEED):
+    config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "config.yaml")
+    walk_config = read_config(yaml_file=config_file, rootkey="walk_generator")
+    personnels = personnels_of(walk_config=walk_config, number_of_personnels=NUMBER_OF_PERSONNELS)
+
+    # every personnel in a worker of its own, ranged alone
+    alone = run_sharded(walk_config=walk_config, personnels=personnels, seed=seed, steps=steps,
+                        shard_count=len(personnels))
+    assert len(alone) == len(personnels) and all(len(messages) > 0 for messages in alone.values())
+    runs = {
+        "single process, batched ranging": run(walk_config=walk_config, personnels=personnels, seed=seed,
+                                               steps=steps),
+        "3 shards": run_sharded(walk_config=walk_config, personnels=personnels, seed=seed, steps=steps,
+                                shard_count=3),
+        "fleet": run(walk_config=walk_config, personnels=personnels, seed=seed, steps=steps, fleet=True),
+        "fleet, 2 shards": run_sharded(walk_config=walk_config, personnels=personnels, seed=seed, steps=steps,
+                                       shard_count=2, fleet=True)
+    }
+    for name, messages in runs.items():
+        assert messages == alone, f"{name} differs from personnels run alone"
+        print(f"{name}: identical messages")
+
+    other_seed = run(walk_config=walk_config, personnels=personnels, seed=seed + 1, steps=steps)
+    assert all(other_seed[walker_id] != alone[walker_id] for walker_id in alone), "seed has no effect"
+
+
+if __name__ == "__main__":
+    reproducibility_test()